@@ -0,0 +1,310 @@
+"""Async JSON HTTP API for the KvK Helper calculators.
+
+    python api.py --port 8765
+
+or, next to the Streamlit app, set `KVK_API_PORT` and the app starts it on
+a background thread of its own process. Every endpoint takes one player
+record in the same flat format as the CLI and roster files
+(`<name>_current`, `<name>_target`, budget fields) and returns the same
+result dict the matching `cli.py` command prints:
+
+    POST /targets           hero shards, charm and gov gear costs and points
+    POST /charms/optimize   best charm levels for `designs` / `guides`
+    POST /gear/optimize     best gov gear for `threads` / `satins` / `papers`
+    GET  /health
+    GET  /stats             cache and concurrency counters
+
+Records are normalized to the fields each calculation reads, and identical
+normalized requests are served from a bounded LRU cache (or share the
+in-flight computation). Optimizer calls run on a small thread pool behind a
+semaphore, and once too many are queued the server answers 503 instead of
+letting them pile up behind the event loop. Any other failure is logged and
+answered with a 500 JSON error.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import engine
+from engine import (
+    CHARM_TABLE, GEAR_TABLE, HERO_TABLE,
+    charm_names, gov_gear_items, hero_names,
+)
+from cli import ID_FIELD, optimize_charms, optimize_gear, plan_targets, read_amount, read_level
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY = 64 * 1024
+
+logger = logging.getLogger("kvk.api")
+
+
+# --------------------------
+# Request normalization
+# --------------------------
+def _normalize_targets(record):
+    out = {}
+    for names, table in ((hero_names(), HERO_TABLE), (charm_names(), CHARM_TABLE), (gov_gear_items, GEAR_TABLE)):
+        for name in names:
+            cur = read_level(record, f"{name}_current", table.index, table.levels[0])
+            out[f"{name}_current"] = cur
+            out[f"{name}_target"] = read_level(record, f"{name}_target", table.index, cur)
+    return out
+
+
+def _normalize_charms(record):
+    out = {f"{name}_current": read_level(record, f"{name}_current", CHARM_TABLE.index, CHARM_TABLE.levels[0])
+           for name in charm_names()}
+    out["designs"] = read_amount(record, "designs")
+    out["guides"] = read_amount(record, "guides")
+    return out
+
+
+def _normalize_gear(record):
+    out = {f"{item}_current": read_level(record, f"{item}_current", GEAR_TABLE.index, GEAR_TABLE.levels[0])
+           for item in gov_gear_items}
+    for key in ("threads", "satins", "papers"):
+        out[key] = read_amount(record, key)
+    return out
+
+
+# path: (normalizer, calculation, runs on the optimizer pool)
+ROUTES = {
+    "/targets": (_normalize_targets, plan_targets, False),
+    "/charms/optimize": (_normalize_charms, optimize_charms, True),
+    "/gear/optimize": (_normalize_gear, optimize_gear, True),
+}
+
+
+# --------------------------
+# Service
+# --------------------------
+class Busy(Exception):
+    pass
+
+
+class CalculatorService:
+    """Cached, concurrency-limited calculations; one instance per event loop."""
+
+    def __init__(self, cache_size=4096, workers=2, max_pending=64):
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.inflight = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kvk-api")
+        self.slots = asyncio.Semaphore(workers)
+        self.max_pending = max_pending
+        self.pending = 0
+        self.stats = {"requests": 0, "hits": 0, "misses": 0, "shared": 0, "rejected": 0, "errors": 0}
+
+    async def handle(self, path, record):
+        normalize, func, heavy = ROUTES[path]
+        normalized = normalize(record)
+        # Answers differ between game versions, so the version is part of the key
+        key = (engine.active_version(), path, tuple(sorted(normalized.items())))
+        self.stats["requests"] += 1
+
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            self.stats["hits"] += 1
+        elif key in self.inflight:
+            # Same request already being computed: wait for it instead
+            self.stats["shared"] += 1
+            result = await asyncio.shield(self.inflight[key])
+        else:
+            self.stats["misses"] += 1
+            future = asyncio.get_running_loop().create_future()
+            self.inflight[key] = future
+            try:
+                result = await self._compute(func, normalized, heavy)
+            except BaseException as exc:
+                future.set_exception(exc)
+                # Nobody else may be waiting; don't warn about it
+                future.exception()
+                raise
+            else:
+                future.set_result(result)
+                self._store(key, result)
+            finally:
+                del self.inflight[key]
+
+        # The player ID is not part of the cache key
+        result = dict(result)
+        result[ID_FIELD] = record.get(ID_FIELD, "")
+        return result
+
+    async def _compute(self, func, normalized, heavy):
+        if not heavy:
+            return func(normalized)
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise Busy()
+        self.pending += 1
+        try:
+            async with self.slots:
+                loop = asyncio.get_running_loop()
+                # In this task's context, so the worker calculates on the
+                # game version the cache key was made with
+                return await loop.run_in_executor(self.pool, contextvars.copy_context().run, func, normalized)
+        finally:
+            self.pending -= 1
+
+    def _store(self, key, result):
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def snapshot(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(
+            self.stats,
+            cached=len(self.cache),
+            pending=self.pending,
+            hit_rate=self.stats["hits"] / lookups if lookups else 0.0,
+        )
+
+
+# --------------------------
+# HTTP
+# --------------------------
+def _response(writer, status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    status = HTTPStatus(status)
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+async def _read_request(reader):
+    """(method, path, headers, body) of the next request, or None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise ValueError("Malformed request line")
+    method, path, version = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    if version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive":
+        headers["connection"] = "close"
+    return method, path.split("?", 1)[0], headers, body
+
+
+async def _dispatch(service, method, path, body):
+    """(status, payload) for one request."""
+    if method == "GET" and path == "/health":
+        return 200, {"status": "ok"}
+    if method == "GET" and path == "/stats":
+        return 200, service.snapshot()
+    if path not in ROUTES:
+        return 404, {"error": f"No route for {path}"}
+    if method != "POST":
+        return 405, {"error": "Use POST with a JSON player record"}
+    try:
+        record = json.loads(body or b"{}")
+        if not isinstance(record, dict):
+            raise ValueError("Body must be a JSON object")
+        return 200, await service.handle(path, record)
+    except Busy:
+        return 503, {"error": "Too many optimizer requests queued, retry shortly"}
+    except ValueError as exc:
+        service.stats["errors"] += 1
+        return 400, {"error": str(exc)}
+    except Exception:
+        # A bug in a calculator must not take the connection down with it
+        logger.exception("Request to %s failed", path)
+        service.stats["errors"] += 1
+        return 500, {"error": "Internal server error"}
+
+
+async def _serve_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError) as exc:
+                _response(writer, 400, {"error": str(exc) or "Bad request"}, False)
+                break
+            if request is None:
+                break
+            method, path, headers, body = request
+            status, payload = await _dispatch(service, method, path, body)
+            keep_alive = headers.get("connection", "").lower() != "close"
+            _response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None, **service_options):
+    """Run the API until cancelled; `ready` (a threading.Event) is set once listening."""
+    service = CalculatorService(**service_options)
+    server = await asyncio.start_server(
+        lambda r, w: _serve_connection(service, r, w), host, port
+    )
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def start_in_background(host=DEFAULT_HOST, port=DEFAULT_PORT, **service_options):
+    """Start the API on a daemon thread of the current process and wait until it listens."""
+    ready = threading.Event()
+    thread = threading.Thread(
+        target=lambda: asyncio.run(serve(host, port, ready, **service_options)),
+        name="kvk-api",
+        daemon=True,
+    )
+    thread.start()
+    if not ready.wait(10):
+        raise RuntimeError(f"API server did not start on {host}:{port}")
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the KvK Helper calculators as a JSON HTTP API.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=int(os.environ.get("KVK_API_PORT", DEFAULT_PORT)))
+    parser.add_argument("--cache-size", type=int, default=4096, help="cached responses to keep")
+    parser.add_argument("--workers", type=int, default=2, help="optimizer calls run at once")
+    parser.add_argument("--max-pending", type=int, default=64, help="optimizer calls queued before 503s")
+    args = parser.parse_args(argv)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(
+            args.host, args.port,
+            cache_size=args.cache_size, workers=args.workers, max_pending=args.max_pending,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,253 @@
+import os
+import re
+import time
+from functools import wraps
+
 import streamlit as st
-import pandas as pd
 
+import engine
+from engine import (
+    CHARM_TABLE, GEAR_TABLE, HERO_TABLE,
+    categories, shared_pool_excluded, hero_names, charm_names,
+    charm_categories, charm_priority, items_needed,
+    gov_gear_items, materials_needed,
+)
+from optimizer import (
+    charm_frontier, compare_charm_optimizers, compare_gear_optimizers, frontier_charm_levels,
+    frontier_curve, frontier_is_cached, optimal_charm_levels,
+)
+from diagnostics import render_panel, section, session_id, timed
+import background
+from shard_pool import OBJECTIVES as POOL_OBJECTIVES
+from planner import RESOURCES
+from profiles import PROFILE_KEYS, load_profile, save_profile
+from reactive import calculator_graph
+from result_cache import timed_cached_call
+from urlstate import FIELDS as STATE_FIELDS, decode_state, encode_state
+from gamedata import GameDataError, available_versions
+
+st.set_page_config(layout="wide")
 st.title("KvK Helper")
 
-tab_heroes, tab_charms, tab_gov_gear = st.tabs(["Hero Calculator", "Charm Calculator", "Gov Gear Calculator"])
-
-with tab_heroes:
-    st.set_page_config(layout="wide")
+# --------------------------
+# Game version
+# --------------------------
+# Every session calculates on its own game version, picked in the sidebar
+# (the operator's `KVK_GAME_VERSION` or the latest one by default), and
+# sessions on different versions never see each other's tables. When a
+# session moves to another version, levels the new tables don't have go
+# back to their defaults and everything derived from the old tables is
+# rebuilt.
+def sync_game_version():
+    version = st.session_state.setdefault("game_version", engine.DEFAULT_VERSION)
+    try:
+        engine.use_game_version(version)
+    except GameDataError as exc:
+        # The data file went away or broke since it was picked
+        st.session_state["game_version_status"] = str(exc)
+        version = st.session_state["game_version"] = engine.DEFAULT_VERSION
+        engine.use_game_version(version)
+    if st.session_state.get("_game_version") == version:
+        return
+    for key, kind, table in STATE_FIELDS:
+        if kind == "level" and st.session_state.get(key) is not None and st.session_state[key] not in table.index:
+            del st.session_state[key]
+    for key in [key for key in st.session_state if key.startswith("_job_")]:
+        del st.session_state[key]
+    for key in ("_derived", "_upgrade_index", "_leaderboard", "_forecast"):
+        st.session_state.pop(key, None)
+    st.session_state["_game_version"] = version
+
+
+def on_session_version(func):
+    """
+    Run `func` on the session's game version. Fragment reruns skip the top
+    of the script, where a full run sets it.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        engine.use_game_version(st.session_state.get("_game_version") or engine.DEFAULT_VERSION)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _switch_game_version():
+    version = st.session_state["game_version"]
+    try:
+        engine.game_tables(version)
+    except GameDataError as exc:
+        st.session_state["game_version"] = st.session_state.get("_game_version") or engine.DEFAULT_VERSION
+        st.session_state["game_version_status"] = str(exc)
+    else:
+        st.session_state["game_version_status"] = f"Switched this session to game version {version}."
+
+
+sync_game_version()
+
+
+# --------------------------
+# Background optimizer jobs
+# --------------------------
+# Optimizers run on a shared worker pool. A render waits briefly so quick
+# answers still appear in the same run; slower ones leave a placeholder and
+# a poller that reruns the app once they finish. New input replaces any
+# stale job for the session.
+JOB_WAIT_SECONDS = 0.15
+
+
+def background_result(name, key, func, *args, **kwargs):
+    """Result of the session's latest `name` job for `key`, or None while it runs."""
+    state_key = f"_job_{name}"
+    job = st.session_state.get(state_key)
+    if job is None or job["key"] != key:
+        future = background.submit(session_id(), name, key, func, *args, **kwargs)
+        job = {"key": key, "future": future}
+        st.session_state[state_key] = job
+    return background.wait(job["future"], JOB_WAIT_SECONDS)
+
+
+def optimizer_timing(call):
+    """
+    Caption prefix for a `timed_cached_call` report: its solver times are
+    from whichever run filled the cache, so a hit says so.
+    """
+    if call["cached"]:
+        return f"Cached result (looked up in {call['seconds'] * 1000:.1f} ms), computed earlier. "
+    return f"Computed in {call['seconds'] * 1000:.1f} ms. "
+
+
+@st.fragment(run_every=0.3)
+@on_session_version
+def await_background(name):
+    """Rerun the app once the session's `name` job has finished."""
+    job = st.session_state.get(f"_job_{name}")
+    if job is None or job["future"].done():
+        st.rerun()
+
+
+# --------------------------
+# JSON API
+# --------------------------
+@st.cache_resource
+def start_api(host, port):
+    """Serve the calculators over HTTP from this process, once per process."""
+    from api import start_in_background
+
+    return start_in_background(host, port)
+
+
+if os.environ.get("KVK_API_PORT"):
+    start_api(os.environ.get("KVK_API_HOST", "127.0.0.1"), int(os.environ["KVK_API_PORT"]))
+
+# --------------------------
+# State carried in the page link
+# --------------------------
+# A `?s=` token restores every input, so a fresh or expired session (or an
+# officer opening a shared link) picks up exactly where the link left off.
+# Tokens this session wrote itself are skipped.
+state_token = st.query_params.get("s")
+if state_token and state_token != st.session_state.get("_state_token"):
+    try:
+        st.session_state.update(decode_state(state_token))
+        # Stay in link mode so further changes keep the link current
+        st.session_state["url_state"] = True
+    except ValueError as exc:
+        st.warning(f"Ignoring the state in this link: {exc}")
+    st.session_state["_state_token"] = state_token
+
+
+def sync_link():
+    """Rewrite the `?s=` token from the current inputs when link mode is on."""
+    if not st.session_state.get("url_state"):
+        return
+    token = encode_state(st.session_state)
+    if token != st.query_params.get("s"):
+        st.query_params["s"] = token
+    st.session_state["_state_token"] = token
+
+
+def derived(name):
+    """
+    Node `name` of this session's calculator graph, for the current inputs.
+
+    Recomputed only when one of the session-state keys it depends on changed
+    since the last time anything asked for it.
+    """
+    graph = st.session_state.get("_derived")
+    if graph is None:
+        graph = st.session_state["_derived"] = calculator_graph()
+    return graph.get(name, st.session_state)
+
+
+def kept(key):
+    """
+    Widget key `key`, recorded so the navigation keeps its value while the
+    page showing it is hidden.
+    """
+    st.session_state.setdefault("_kept_keys", set()).add(key)
+    return key
+
+
+def _keep_upload(key):
+    uploaded = st.session_state.get(key)
+    if uploaded is None:
+        st.session_state.pop(f"_{key}", None)
+    else:
+        st.session_state[f"_{key}"] = (uploaded.file_id, uploaded.name, uploaded.getvalue())
+
+
+def kept_upload(label, types, key):
+    """
+    File uploader whose file outlives visits to other pages, which reset the
+    widget itself. Returns (file_id, name, bytes) of the file, or None.
+    """
+    st.file_uploader(label, type=types, key=key, on_change=_keep_upload, args=(key,))
+    upload = st.session_state.get(f"_{key}")
+    if upload is not None and st.session_state.get(key) is None:
+        st.caption(f"Using {upload[1]}, uploaded earlier.")
+    return upload
+
+
+# --------------------------
+# Light summary tables
+# --------------------------
+def _cell(value):
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return f"{value:,}"
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value).replace("|", "\\|")
+
+
+def summary_table(rows, columns, key):
+    """
+    Rows as a Markdown table, or as a sortable dataframe on request.
+
+    The dataframe needs pandas, which is the slowest import in the app, so
+    it is only loaded once someone actually asks for sorting.
+    """
+    if st.toggle("Sortable table", key=kept(f"{key}_sortable")):
+        st.dataframe({col: [row.get(col, 0) for row in rows] for col in columns})
+        return
+    lines = ["| " + " | ".join(columns) + " |", "|" + " --- |" * len(columns)]
+    for row in rows:
+        lines.append("| " + " | ".join(_cell(row.get(col, 0)) for col in columns) + " |")
+    st.markdown("\n".join(lines))
+
+
+# Each calculator is a fragment: interacting with a widget inside one tab
+# reruns only that tab's function instead of the whole script.
+
+@st.fragment
+@on_session_version
+@timed("Hero tab")
+def hero_calculator():
+    """Hero tab: category expanders plus the points summary."""
     st.title("Hero Level Calculator")
     st.write("Use the expanders to open each category. Results appear under each character.")
 
-    # --------------------------
-    # Hero Categories
-    # --------------------------
-    categories = {
-        "Mythic": ["Jabel", "Zoe", "Marlin", "Amadeus", "Hilde", "Helga", "Saul"],
-        "Epic":   ["Diana", "Quinn", "Howard", "Chenko", "Gordon", "Amane", "Yeonwoo", "Fahd"],
-        "Rare":   ["Forrest", "Olive", "Seth", "Edwin"]
-    }
-
-    # --------------------------
-    # Per-step shard costs
-    # --------------------------
-    step_costs = {
-        "Not recruited":0,"0-0": 10, "0-1": 1, "0-2": 1, "0-3": 2, "0-4": 2, "0-5": 2,
-        "1-0": 2, "1-1": 5, "1-2": 5, "1-3": 5, "1-4": 5, "1-5": 15,
-        "2-0": 15, "2-1": 15, "2-2": 15, "2-3": 15, "2-4": 15, "2-5": 40,
-        "3-0": 40, "3-1": 40, "3-2": 40, "3-3": 40, "3-4": 40, "3-5": 100,
-        "4-0": 100, "4-1": 100, "4-2": 100, "4-3": 100, "4-4": 100, "4-5": 100,
-        "5-0": 100
-    }
-
-    # Ordered list of levels
-    levels_ordered = [
-        "Not recruited","0-0","0-1","0-2","0-3","0-4","0-5",
-        "1-0","1-1","1-2","1-3","1-4","1-5",
-        "2-0","2-1","2-2","2-3","2-4","2-5",
-        "3-0","3-1","3-2","3-3","3-4","3-5",
-        "4-0","4-1","4-2","4-3","4-4","4-5","5-0"
-    ]
-
-    # Cumulative total shards for each level
-    cumulative_cost = {}
-    running = 0
-    for lvl in levels_ordered:
-        running += step_costs.get(lvl, 0)
-        cumulative_cost[lvl] = running
-
-    # Helper: get highest level reachable from total shards
-    def get_level_from_total_shards(total_shards):
-        for lvl in reversed(levels_ordered):
-            if cumulative_cost[lvl] <= total_shards:
-                return lvl
-        return "Not recruited"
-
     # --------------------------
     # CSS for visual styling
     # --------------------------
@@ -77,288 +271,158 @@ with tab_heroes:
     # --------------------------
     # Main UI
     # --------------------------
-    for category, heroes in categories.items():
+    with section("Hero UI loop"):
+        for category, heroes in categories.items():
 
-        with st.expander(f"{category} ({len(heroes)} heroes)", expanded=False):
+            with st.expander(f"{category} ({len(heroes)} heroes)", expanded=False):
 
-            st.markdown(
-                f"<div class='category-box' style='background:{category_color_map.get(category,'#eee')};'>",
-                unsafe_allow_html=True,
-            )
-
-            # Mode toggle
-            mode_by_shards = st.checkbox(
-                f"Instead input number of shards",
-                key=f"{category}_mode",
-            )
-
-            if mode_by_shards:
-                # Show shared pool input for this category
-                shared_pool = st.number_input(
-                    f"General {category} shards available",
-                    min_value=0,
-                    step=1,
-                    value=0,
-                    key=f"{category}_shared",
+                st.markdown(
+                    f"<div class='category-box' style='background:{category_color_map.get(category,'#eee')};'>",
+                    unsafe_allow_html=True,
                 )
-            else:
-                # If not in shard mode, set shared_pool to 0 so it won't affect calculations
-                shared_pool = 0
-
-            cols = st.columns(3)
-            shared_requested_count = 0
 
-            for idx, hero in enumerate(heroes):
-                col = cols[idx % 3]
-                with col:
-                    st.subheader(hero)
+                # Mode toggle
+                mode_by_shards = st.checkbox(
+                    f"Instead input number of shards",
+                    key=f"{category}_mode",
+                )
 
-                    # Current level
-                    cur_key = f"{hero}_current"
-                    current = st.select_slider(
-                        f"Current level",
-                        options=levels_ordered,
-                        key=cur_key,
+                if mode_by_shards:
+                    # Show shared pool input for this category
+                    shared_pool = st.number_input(
+                        f"General {category} shards available",
+                        min_value=0,
+                        step=1,
+                        key=f"{category}_shared",
                     )
-                    current_cum = cumulative_cost[current]
-
-                    # Only show "Use shared pool" if shard input mode is active
-                    if mode_by_shards and hero not in ('Helga', 'Amadeus'):
-                        use_shared = st.checkbox(
-                            "Use general shards",
-                            value=False,
-                            key=f"{hero}_use_shared",
-                        )
-                        if use_shared:
-                            shared_requested_count += 1
-                    else:
-                        # In target mode, shared pool is not used
-                        use_shared = False
-
-                    # --- SHARD INPUT MODE ---
-                    if mode_by_shards:
-                        hero_shards = st.number_input(
-                            f"General shards to add",
-                            min_value=0,
-                            step=1,
-                            value=0,
-                            key=f"{hero}_personal_shards",
+                    pool_objective = st.radio(
+                        "Split general shards to",
+                        options=list(POOL_OBJECTIVES),
+                        format_func=POOL_OBJECTIVES.get,
+                        horizontal=True,
+                        key=f"{category}_pool_objective",
+                    )
+                else:
+                    # If not in shard mode, set shared_pool to 0 so it won't affect calculations
+                    shared_pool = 0
+
+                cols = st.columns(3)
+                result_slots = {}
+
+                for idx, hero in enumerate(heroes):
+                    col = cols[idx % 3]
+                    with col:
+                        st.subheader(hero)
+
+                        # Current level
+                        cur_key = f"{hero}_current"
+                        current = st.select_slider(
+                            f"Current level",
+                            options=HERO_TABLE.levels,
+                            key=cur_key,
                         )
 
-                        # Total shards including shared pool if allowed
-                        total_shards = current_cum + hero_shards + (shared_pool if use_shared else 0)
-                        resulting_level = get_level_from_total_shards(total_shards)
+                        # Only show "Use shared pool" if shard input mode is active
+                        if mode_by_shards and hero not in shared_pool_excluded:
+                            use_shared = st.checkbox(
+                                "Use general shards",
+                                key=f"{hero}_use_shared",
+                            )
+                        else:
+                            # In target mode, shared pool is not used
+                            use_shared = False
+
+                        # --- SHARD INPUT MODE ---
+                        if mode_by_shards:
+                            st.number_input(
+                                f"General shards to add",
+                                min_value=0,
+                                step=1,
+                                key=f"{hero}_personal_shards",
+                            )
 
-                        st.markdown(
-                            f"<div class='result-box'>→ resulting level <b>{resulting_level}</b></div>",
-                            unsafe_allow_html=True,
-                        )
+                            if use_shared and pool_objective == "targets":
+                                st.select_slider(
+                                    "Target level",
+                                    options=HERO_TABLE.levels[HERO_TABLE.levels.index(current):],
+                                    key=f"{hero}_pool_target",
+                                )
 
-                    # --- TARGET SLIDER MODE ---
-                    else:
-                        cur_index = levels_ordered.index(current)
-                        allowed_targets = levels_ordered[cur_index:]
+                            # Filled in once the pool has been split
+                            result_slots[hero] = st.empty()
 
-                        if not allowed_targets:
-                            st.info("Already at max level — no higher target possible.")
-                            st.markdown(
-                                f"<div class='result-box'>At max level — 0 shards needed</div>",
+                        # --- TARGET SLIDER MODE ---
+                        else:
+                            cur_index = HERO_TABLE.levels.index(current)
+                            allowed_targets = HERO_TABLE.levels[cur_index:]
+
+                            if not allowed_targets:
+                                st.info("Already at max level — no higher target possible.")
+                                st.markdown(
+                                    f"<div class='result-box'>At max level — 0 shards needed</div>",
+                                    unsafe_allow_html=True,
+                                )
+                            else:
+                                st.select_slider(
+                                    f"Target level",
+                                    options=allowed_targets,
+                                    key=f"{hero}_target",
+                                )
+                                row = derived(f"hero:{hero}")
+
+                                st.markdown(
+                                    f"<div class='result-box'>→ <b>{row['Shards Needed']}</b> shards needed "
+                                    f"to reach {row['Target Level']}</div>",
+                                    unsafe_allow_html=True,
+                                )
+
+                if mode_by_shards:
+                    split = derived(f"pool:{category}")
+
+                    for hero, slot in result_slots.items():
+                        alloc = split["allocation"].get(hero)
+                        if alloc:
+                            slot.markdown(
+                                f"<div class='result-box'>→ +{alloc['pool']:,} general shards, "
+                                f"resulting level <b>{alloc['level']}</b></div>",
                                 unsafe_allow_html=True,
                             )
                         else:
-                            target = st.select_slider(
-                                f"Target level",
-                                options=allowed_targets,
-                                key=f"{hero}_target",
-                            )
-                            target_cum = cumulative_cost[target]
-                            shards_needed = target_cum - current_cum
-
-                            st.markdown(
-                                f"<div class='result-box'>→ <b>{shards_needed}</b> shards needed to reach {target}</div>",
+                            slot.markdown(
+                                f"<div class='result-box'>→ resulting level "
+                                f"<b>{derived(f'hero:{hero}')['Target Level']}</b></div>",
                                 unsafe_allow_html=True,
                             )
 
-            # Warning if shared pool over-allocated
-            if shared_requested_count > shared_pool:
-                deficit = shared_requested_count - shared_pool
-                st.markdown(
-                    f"<div class='warn'>⚠ Shared pool over-allocated!<br>"
-                    f"Requested by {shared_requested_count} heroes, available: {shared_pool}<br>"
-                    f"Short by: {deficit}</div>",
-                    unsafe_allow_html=True,
-                )
-            elif shared_requested_count > 0:
-                st.success(f"Shared pool sufficient: requested {shared_requested_count}, available {shared_pool}.")
-
-            st.markdown("</div>", unsafe_allow_html=True)
-
-            # --------------------------
-            # Define points per shard by category
-            # --------------------------
-    points_per_shard = { "Rare": 350,"Epic": 1220,"Mythic": 3040}
-
-    # Prepare summary data
-    summary_data = []
-
-    for category, heroes in categories.items():
-        for hero in heroes:
-            # Get current and target levels from session state
-            cur_level = st.session_state.get(f"{hero}_current", "0-0")
-            cur_cum = cumulative_cost[cur_level]
-
-            if st.session_state.get(f"{category}_mode", False):
-                # Shard input mode
-                hero_shards = st.session_state.get(f"{hero}_personal_shards", 0)
-                use_shared = st.session_state.get(f"{hero}_use_shared", False)
-                shared_pool = st.session_state.get(f"{category}_shared", 0)
-
-                # Total shards including shared if ticked
-                total_shards = cur_cum + hero_shards + (shared_pool if use_shared else 0)
-                resulting_level = get_level_from_total_shards(total_shards)
-
-                # Shards needed = total added shards
-                shards_needed = total_shards - cur_cum
-                target_level = resulting_level
-
-            else:
-                # Target slider mode
-                target_level = st.session_state.get(f"{hero}_target", cur_level)
-                target_cum = cumulative_cost.get(target_level, cur_cum)
-                shards_needed = target_cum - cur_cum
-
-            # Points
-            points = shards_needed * points_per_shard.get(category, 0)
-
-            # Append row
-            summary_data.append({
-                "Hero": hero,
-                "Category": category,
-                "Current Level": cur_level,
-                "Target Level": target_level,
-                "Shards Needed": shards_needed,
-                "KvK Prep Points": points
-            })
-
-    # Create DataFrame
-    df_summary = pd.DataFrame(summary_data)
+                    if split["allocation"]:
+                        message = f"General pool: {split['used']:,} of {shared_pool:,} shards allocated"
+                        if pool_objective == "targets":
+                            message += f", {split['targets_hit']} of {len(split['allocation'])} targets reached"
+                        st.success(message + ".")
+                    elif shared_pool:
+                        st.info("Tick \"Use general shards\" on the heroes that should share the pool.")
 
-    # Calculate total points
-    total_points = df_summary["KvK Prep Points"].sum()
+                st.markdown("</div>", unsafe_allow_html=True)
 
     # Display table
     st.markdown("## Total Points")
-    st.dataframe(df_summary[["Hero", "Current Level", "Target Level", "Shards Needed", "KvK Prep Points"]])
+    with section("Hero summary table"):
+        summary_table(
+            derived("hero_rows"), ["Hero", "Current Level", "Target Level", "Shards Needed", "KvK Prep Points"],
+            "hero_summary",
+        )
 
-    st.markdown(f"**Total Points:** {total_points:,}")
+    st.markdown(f"**Total Points:** {derived('hero_total'):,}")
+    sync_link()
 
-with tab_charms:
+@st.fragment
+@on_session_version
+@timed("Charm tab")
+def charm_calculator():
+    """Charm tab: target sliders or the resource optimizer."""
 
     st.title("Charm Calculator")
 
-    # --------------------------
-    # Charm categories
-    # --------------------------
-    charm_categories = {
-        "Infantry": ["Charm I", "Charm II", "Charm III", "Charm IV", "Charm V", "Charm VI"],
-        "Archer": ["Charm I", "Charm II", "Charm III", "Charm IV", "Charm V", "Charm VI"],
-        "Cavalry": ["Charm I", "Charm II", "Charm III", "Charm IV", "Charm V", "Charm VI"],
-    }
-
-    # Charm levels
-    levels = [str(i) for i in range(12)]
-
-    # --------------------------
-    # Items needed per level up
-    # --------------------------
-    level_requirements = {
-        "0→1": {"designs": 5, "guides": 5},
-        "1→2": {"designs": 15, "guides": 40},
-        "2→3": {"designs": 40, "guides": 60},
-        "3→4": {"designs": 100, "guides": 80},
-        "4→5": {"designs": 200, "guides": 100},
-        "5→6": {"designs": 300, "guides": 120},
-        "6→7": {"designs": 400, "guides": 140},
-        "7→8": {"designs": 400, "guides": 200},
-        "8→9": {"designs": 400, "guides": 300},
-        "9→10": {"designs": 420, "guides": 420},
-        "10→11": {"designs": 420, "guides": 560}
-    }
-
-    # --------------------------
-    # Points per level up
-    # --------------------------
-    points_per_level = {
-        1: 625, 2: 1250, 3: 3125, 4: 8750, 5: 11250,
-        6: 12500, 7: 12500, 8: 13000, 9: 14000,
-        10: 15000, 11: 16000
-    }
-
-    # --------------------------
-    # Helper functions
-    # --------------------------
-    def items_needed(current, target):
-        current_idx = int(current)
-        target_idx = int(target)
-        total = {"designs": 0, "guides": 0, "points": 0}
-        for lvl in range(current_idx, target_idx):
-            key = f"{lvl}→{lvl + 1}"
-            req = level_requirements[key]
-            total["designs"] += req["designs"]
-            total["guides"] += req["guides"]
-            total["points"] += points_per_level[lvl + 1]
-        return total
-
-
-    def max_levels_global(current_levels_all, total_designs, total_guides, charm_categories_priority):
-        """
-        Allocate resources across all charms to maximize points:
-        - Always upgrade the globally lowest-level charms first
-        - Tie-breaker: category priority (Infantry > Archer > Cavalry)
-        """
-        final_levels = current_levels_all.copy()
-        resources_left = {"designs": total_designs, "guides": total_guides}
-        total_points = 0
-
-        def category_index(cat):
-            return charm_categories_priority.index(cat)
-
-        upgrade_possible = True
-        while upgrade_possible:
-            upgrade_possible = False
-
-            # Find the minimum level among all charms
-            min_level = min(int(final_levels[f"{cat}_{charm}"])
-                            for cat in charm_categories_priority
-                            for charm in charm_categories[cat])
-
-            # Build a list of all charms at this min_level
-            candidates = []
-            for cat in charm_categories_priority:
-                for charm in charm_categories[cat]:
-                    key_name = f"{cat}_{charm}"
-                    if int(final_levels[key_name]) == min_level and min_level < 11:
-                        candidates.append((cat, charm, key_name))
-
-            # Sort candidates by category priority
-            candidates.sort(key=lambda x: category_index(x[0]))
-
-            # Try upgrading each candidate if resources allow
-            for cat, charm, key_name in candidates:
-                cur_level = int(final_levels[key_name])
-                next_level = str(cur_level + 1)
-                req = level_requirements[f"{cur_level}→{cur_level + 1}"]
-
-                if resources_left["designs"] >= req["designs"] and resources_left["guides"] >= req["guides"]:
-                    final_levels[key_name] = next_level
-                    resources_left["designs"] -= req["designs"]
-                    resources_left["guides"] -= req["guides"]
-                    total_points += points_per_level[cur_level + 1]
-                    upgrade_possible = True
-
-        return final_levels, resources_left, total_points
-
-
     # --------------------------
     # UI
     # --------------------------
@@ -380,35 +444,27 @@ with tab_charms:
                     # Current level
                     current_levels_all[key_name] = st.select_slider(
                         "Current Level",
-                        options=levels,
+                        options=CHARM_TABLE.levels,
                         key=f"{category}_{charm}_current"
                     )
 
                     if not mode_by_items:
                         # Target level slider directly below current level
                         cur_idx = int(current_levels_all[key_name])
-                        allowed_targets = levels[cur_idx:]
-                        target_level = st.select_slider(
+                        allowed_targets = CHARM_TABLE.levels[cur_idx:]
+                        st.select_slider(
                             "Target Level",
                             options=allowed_targets,
                             key=f"{category}_{charm}_target"
                         )
-                        needed = items_needed(current_levels_all[key_name], target_level)
+                        row = derived(f"charm:{key_name}")
                         st.markdown(
                             f"<div style='background:#333;color:white;padding:6px;border-radius:5px;'>"
-                            f"→ Designs: <b>{needed['designs']}</b>, Guides: <b>{needed['guides']}</b>, Points: <b>{needed['points']}</b>"
+                            f"→ Designs: <b>{row['Designs Needed']}</b>, Guides: <b>{row['Guides Needed']}</b>, "
+                            f"Points: <b>{row['Points']}</b>"
                             f"</div>",
                             unsafe_allow_html=True
                         )
-                        results.append({
-                            "Category": category,
-                            "Charm": charm,
-                            "Current Level": current_levels_all[key_name],
-                            "Target Level": target_level,
-                            "Designs Needed": needed["designs"],
-                            "Guides Needed": needed["guides"],
-                            "Points": needed["points"]
-                        })
 
     # --------------------------
     # Resource input mode
@@ -418,185 +474,176 @@ with tab_charms:
         total_designs = st.number_input("Total Designs", min_value=0, step=1, key="charms_total_designs")
         total_guides = st.number_input("Total Guides", min_value=0, step=1, key="charms_total_guides")
 
-        if st.button("Calculate Optimal Upgrades", key="charms_calc_button"):
-            priority_list = ["Infantry", "Archer", "Cavalry"]
-            final_levels, remaining, total_points = max_levels_global(
-                current_levels_all, total_designs, total_guides, priority_list
+        show_curve = st.checkbox(
+            "Show points-vs-budget curve (precomputes every optimal plan for these charm levels)",
+            key=kept("charms_show_frontier"),
+        )
+        # Once the frontier for these levels exists, budget changes are a
+        # lookup on it; otherwise the search is fast enough to run each time
+        levels_key = tuple(current_levels_all.items())
+        frontier = None
+        if frontier_is_cached(current_levels_all, charm_priority):
+            frontier = charm_frontier(current_levels_all, charm_priority)
+        elif show_curve:
+            with section("Charm frontier"):
+                frontier = background_result(
+                    "charm_frontier", levels_key, charm_frontier, dict(current_levels_all), charm_priority
+                )
+            if frontier is None:
+                st.info("Precomputing optimal plans for these charm levels; the exact solver answers meanwhile.")
+                await_background("charm_frontier")
+        solver = frontier_charm_levels if frontier else optimal_charm_levels
+
+        with section("Charm optimizer"):
+            result = background_result(
+                "charms",
+                (levels_key, total_designs, total_guides, solver.__name__),
+                timed_cached_call, compare_charm_optimizers,
+                dict(current_levels_all), total_designs, total_guides, charm_priority, exact=solver,
             )
+        if result is None:
+            st.info("Optimizing...")
+            await_background("charms")
+            sync_link()
+            return
+        report, call = result
+        final_levels = report["exact"]["final_levels"]
+        remaining = report["exact"]["remaining"]
+        total_points = report["exact"]["points"]
+
+        st.subheader("Final Levels per Charm")
+        for key, level in final_levels.items():
+            category, charm = key.split("_")
+            st.write(f"{category} {charm}: {level}")
+
+        st.subheader("Resources Left Over")
+        st.write(f"Designs: {remaining['designs']}, Guides: {remaining['guides']}")
+        st.subheader("Total Points Gained")
+        st.write(f"{total_points:,}")
+
+        greedy = report["greedy"]
+        st.caption(
+            optimizer_timing(call)
+            + f"{'Frontier lookup' if frontier else 'Exact solver'}: {report['exact']['seconds'] * 1000:.1f} ms. "
+            f"Lowest-level-first greedy: {greedy['points']:,} points in {greedy['seconds'] * 1000:.1f} ms "
+            f"(exact gains {report['gain']:,})."
+        )
 
-            st.subheader("Final Levels per Charm")
-            for key, level in final_levels.items():
-                category, charm = key.split("_")
-                st.write(f"{category} {charm}: {level}")
-
-            st.subheader("Resources Left Over")
-            st.write(f"Designs: {remaining['designs']}, Guides: {remaining['guides']}")
-            st.subheader("Total Points Gained")
-            st.write(f"{total_points:,}")
-
-            # Build summary table
-            for key, level in final_levels.items():
-                category, charm = key.split("_")
-                cur_level = int(current_levels_all[key])
-                target_level = int(level)
-                needed = items_needed(cur_level, target_level)
-                results.append({
-                    "Category": category,
-                    "Charm": charm,
-                    "Current Level": cur_level,
-                    "Target Level": target_level,
-                    "Designs Needed": needed["designs"],
-                    "Guides Needed": needed["guides"],
-                    "Points": needed["points"]
-                })
+        if show_curve and frontier:
+            st.subheader("Points vs Budget")
+            chart_cols = st.columns(2)
+            for col, axis, fixed, label in (
+                (chart_cols[0], "designs", total_guides, f"Designs (guides fixed at {total_guides:,})"),
+                (chart_cols[1], "guides", total_designs, f"Guides (designs fixed at {total_designs:,})"),
+            ):
+                curve = frontier_curve(frontier, axis, fixed)
+                with col:
+                    st.line_chart(
+                        {label: [x for x, _ in curve], "Max Points": [y for _, y in curve]},
+                        x=label,
+                        y="Max Points",
+                    )
+                    st.caption(f"Beyond {curve[-1][0]:,} {axis}, more {axis} add no points.")
+
+        # Build summary table
+        for key, level in final_levels.items():
+            category, charm = key.split("_")
+            cur_level = int(current_levels_all[key])
+            target_level = int(level)
+            needed = items_needed(cur_level, target_level)
+            results.append({
+                "Category": category,
+                "Charm": charm,
+                "Current Level": cur_level,
+                "Target Level": target_level,
+                "Designs Needed": needed["designs"],
+                "Guides Needed": needed["guides"],
+                "Points": needed["points"]
+            })
 
     # --------------------------
     # Summary table
     # --------------------------
+    if not mode_by_items:
+        results = derived("charm_rows")
     if results:
         st.markdown("## Summary Table")
-        df_summary = pd.DataFrame(results)
-        st.dataframe(df_summary[
-            ["Category", "Charm", "Current Level", "Target Level", "Designs Needed", "Guides Needed", "Points"]
-        ])
-        st.markdown(f"**Total Points:** {df_summary['Points'].sum():,}")
-
-with tab_gov_gear:
-    st.title("Gov Gear Calculator")
+        with section("Charm summary table"):
+            summary_table(
+                results,
+                ["Category", "Charm", "Current Level", "Target Level", "Designs Needed", "Guides Needed", "Points"],
+                "charm_summary",
+            )
+        total = sum(row["Points"] for row in results) if mode_by_items else derived("charm_total")
+        st.markdown(f"**Total Points:** {total:,}")
+    sync_link()
 
-    # --------------------------
-    # Gov Gear Items
-    # --------------------------
-    gov_gear_items = ["Cap", "Watch", "Coat", "Trousers", "Belt", "Weapon"]
-
-    # Levels / rarities
-    rarities = [
-        "None","Uncommon", "Uncommon (1-Star)", "Rare", "Rare (1-Star)", "Rare (2-Star)", "Rare (3-Star)",
-        "Epic", "Epic (1-Star)", "Epic (2-Star)", "Epic (3-Star)",
-        "Epic T1", "Epic T1 (1-Star)", "Epic T1 (2-Star)", "Epic T1 (3-Star)",
-        "Mythic", "Mythic (1-Star)", "Mythic (2-Star)", "Mythic (3-Star)"
-    ]
+def gear_budget_sweep(current_levels):
+    """Heatmap of the gear optimum over a threads × satins grid at one papers budget."""
+    import numpy as np
+    import pandas as pd
 
-    # --------------------------
-    # Materials needed per level up
-    # --------------------------
-    # Example structure: 'current→next': {"threads": X, "satins": Y, "papers": Z}
-    # Fill in the real numbers for each level
-    gov_gear_requirements = gov_gear_requirements = {
-        "None→Uncommon": {"threads": 15, "satins": 1500, "papers": 0},
-        # Uncommon
-        "Uncommon→Uncommon (1-Star)": {"threads": 40, "satins": 3800, "papers": 0},
-
-        # Rare
-        "Uncommon (1-Star)→Rare": {"threads": 70, "satins": 7000, "papers": 0},
-        "Rare→Rare (1-Star)": {"threads": 95, "satins": 9700, "papers": 0},
-        "Rare (1-Star)→Rare (2-Star)": {"threads": 10, "satins": 1000, "papers": 45},
-        "Rare (2-Star)→Rare (3-Star)": {"threads": 10, "satins": 1000, "papers": 50},
-
-        # Epic
-        "Rare (3-Star)→Epic": {"threads": 15, "satins": 1500, "papers": 60},
-        "Epic→Epic (1-Star)": {"threads": 15, "satins": 1500, "papers": 70},
-        "Epic (1-Star)→Epic (2-Star)": {"threads": 65, "satins": 6500, "papers": 40},
-        "Epic (2-Star)→Epic (3-Star)": {"threads": 80, "satins": 8000, "papers": 50},
-
-        # Epic T1
-        "Epic (3-Star)→Epic T1": {"threads": 95, "satins": 10000, "papers": 60},
-        "Epic T1→Epic T1 (1-Star)": {"threads": 110, "satins": 11000, "papers": 70},
-        "Epic T1 (1-Star)→Epic T1 (2-Star)": {"threads": 130, "satins": 13000, "papers": 85},
-        "Epic T1 (2-Star)→Epic T1 (3-Star)": {"threads": 160, "satins": 15000, "papers": 100},
-
-        # Mythic
-        "Epic T1 (3-Star)→Mythic": {"threads": 220, "satins": 22000, "papers": 40},
-        "Mythic→Mythic (1-Star)": {"threads": 230, "satins": 23000, "papers": 45},
-        "Mythic (1-Star)→Mythic (2-Star)": {"threads": 250, "satins": 25000, "papers": 45},
-        "Mythic (2-Star)→Mythic (3-Star)": {"threads": 260, "satins": 26000, "papers": 45},
-    }
+    from gear_sweep import rarity_grid, sweep
 
+    # Budgets beyond what maxes every item change nothing
+    maxed = {"threads": 0, "satins": 0, "papers": 0}
+    for item, level in current_levels.items():
+        needed = materials_needed(level, GEAR_TABLE.levels[-1])
+        for res in maxed:
+            maxed[res] += needed[res]
 
-    # --------------------------
-    # Points per level
-    # --------------------------
-    points_per_rarity = {
-        "Uncommon": 1125,
-        "Uncommon (1-Star)": 1875,
-        "Rare": 3000,
-        "Rare (1-Star)": 4500,
-        "Rare (2-Star)": 5100,
-        "Rare (3-Star)": 5400,
-        "Epic": 3230,
-        "Epic (1-Star)": 3230,
-        "Epic (2-Star)": 3225,
-        "Epic (3-Star)": 3225,
-        "Epic T1": 3440,
-        "Epic T1 (1-Star)": 3440,
-        "Epic T1 (2-Star)": 4085,
-        "Epic T1 (3-Star)": 4085,
-        "Mythic": 6250,
-        "Mythic (1-Star)": 6250,
-        "Mythic (2-Star)": 6250,
-        "Mythic (3-Star)": 6250
-    }
+    cols = st.columns(3)
+    papers = cols[0].slider("Papers", 0, max(maxed["papers"], 1), key=kept("gear_sweep_papers"))
+    st.session_state.setdefault("gear_sweep_size", 100)
+    size = cols[1].select_slider("Grid size", options=[25, 50, 100, 150], key=kept("gear_sweep_size"))
+    color_by = cols[2].selectbox(
+        "Color by", ["KvK points"] + [f"{item} rarity" for item in gov_gear_items], key=kept("gear_sweep_color")
+    )
 
+    threads_grid = np.unique(np.linspace(0, maxed["threads"], size).round().astype(np.int64))
+    satins_grid = np.unique(np.linspace(0, maxed["satins"], size).round().astype(np.int64))
+    with section("Gear sweep"):
+        start = time.perf_counter()
+        result = sweep(current_levels, threads_grid, satins_grid, papers)
+        elapsed = time.perf_counter() - start
+
+    if color_by == "KvK points":
+        values, label = result["points"], "Points"
+    else:
+        item = color_by[: -len(" rarity")]
+        values, label = rarity_grid(current_levels, result, item), "Rarity"
+    satins_idx, threads_idx = np.meshgrid(np.arange(len(satins_grid)), np.arange(len(threads_grid)), indexing="ij")
+    data = pd.DataFrame({
+        "Threads": threads_grid[threads_idx.ravel()],
+        "Satins": satins_grid[satins_idx.ravel()],
+        label: values.ravel(),
+    })
+    if label == "Rarity":
+        data["Rarity Name"] = [GEAR_TABLE.levels[i] for i in data["Rarity"]]
+    st.vega_lite_chart(
+        data,
+        {
+            "mark": "rect",
+            "encoding": {
+                "x": {"field": "Threads", "type": "ordinal", "axis": {"labelOverlap": True}},
+                "y": {"field": "Satins", "type": "ordinal", "sort": "descending", "axis": {"labelOverlap": True}},
+                "color": {"field": label, "type": "quantitative", "scale": {"scheme": "viridis"}},
+                "tooltip": [{"field": c} for c in data.columns],
+            },
+        },
+    )
+    st.caption(
+        f"{len(threads_grid) * len(satins_grid):,} budgets solved exactly in {elapsed * 1000:.0f} ms "
+        f"with {papers:,} papers."
+    )
 
-    # --------------------------
-    # Helper functions
-    # --------------------------
-    def materials_needed(current, target):
-        cur_idx = rarities.index(current)
-        target_idx = rarities.index(target)
-        total = {"threads": 0, "satins": 0, "papers": 0, "points": 0}
-        for idx in range(cur_idx, target_idx):
-            key = f"{rarities[idx]}→{rarities[idx + 1]}"
-            req = gov_gear_requirements.get(key, {"threads": 0, "satins": 0, "papers": 0})
-            total["threads"] += req["threads"]
-            total["satins"] += req["satins"]
-            total["papers"] += req["papers"]
-            total["points"] += points_per_rarity[rarities[idx + 1]]
-        return total
-
-
-    def max_rarity_from_resources(current, threads, satins, papers):
-        final_levels = {}
-        resources_left = {"threads": threads, "satins": satins, "papers": papers}
-        total_points = 0
-
-        # Start with current levels
-        for item, cur in current.items():
-            final_levels[item] = cur
-
-        # Greedy allocation: upgrade item that gives most points per resource
-        upgrade_possible = True
-        while upgrade_possible:
-            upgrade_possible = False
-            best_item = None
-            best_value = 0
-            for item, cur in final_levels.items():
-                cur_idx = rarities.index(cur)
-                if cur_idx >= len(rarities) - 1:
-                    continue
-                next_level = rarities[cur_idx + 1]
-                key = f"{cur}→{next_level}"
-                req = gov_gear_requirements.get(key, {"threads": 0, "satins": 0, "papers": 0})
-                if (resources_left["threads"] >= req["threads"] and
-                        resources_left["satins"] >= req["satins"] and
-                        resources_left["papers"] >= req["papers"]):
-                    total_req = req["threads"] + req["satins"] + req["papers"]
-                    value = points_per_rarity[next_level] / (total_req if total_req > 0 else 1)
-                    if value > best_value:
-                        best_value = value
-                        best_item = item
-                        best_req = req
-                        best_next_level = next_level
-            if best_item:
-                final_levels[best_item] = best_next_level
-                resources_left["threads"] -= best_req["threads"]
-                resources_left["satins"] -= best_req["satins"]
-                resources_left["papers"] -= best_req["papers"]
-                total_points += points_per_rarity[best_next_level]
-                upgrade_possible = True
-
-        return final_levels, resources_left, total_points
 
+@st.fragment
+@on_session_version
+@timed("Gov gear tab")
+def gov_gear_calculator():
+    """Gov gear tab: target sliders or the resource optimizer."""
+    st.title("Gov Gear Calculator")
 
     # --------------------------
     # UI
@@ -607,10 +654,11 @@ with tab_gov_gear:
     # --------------------------
     # Mode selection
     # --------------------------
-    mode_by_resources = st.checkbox("Resource Input Mode (maximize points with total resources)")
+    mode_by_resources = st.checkbox(
+        "Resource Input Mode (maximize points with total resources)", key="gear_resource_mode"
+    )
 
     current_levels = {}
-    results = []
 
     # --------------------------
     # Current + Target sliders for each item
@@ -622,95 +670,677 @@ with tab_gov_gear:
             # Current level slider
             current_levels[item] = st.select_slider(
                 f"{item} Current Level",
-                options=rarities,
+                options=GEAR_TABLE.levels,
                 key=f"{item}_current"
             )
 
             if not mode_by_resources:
                 # Target-level mode
-                cur_idx = rarities.index(current_levels[item])
-                allowed_targets = rarities[cur_idx:]
+                cur_idx = GEAR_TABLE.levels.index(current_levels[item])
+                allowed_targets = GEAR_TABLE.levels[cur_idx:]
                 if allowed_targets:
-                    target = st.select_slider(
+                    st.select_slider(
                         f"{item} Target Level",
                         options=allowed_targets,
                         key=f"{item}_target"
                     )
-                    needed = materials_needed(current_levels[item], target)
+                    row = derived(f"gear:{item}")
                     st.markdown(
                         f"<div style='background:#333;color:white;padding:6px;border-radius:5px;'>"
-                        f"→ Threads: <b>{needed['threads']}</b>, "
-                        f"Satins: <b>{needed['satins']}</b>, "
-                        f"Artisans: <b>{needed['papers']}</b>, "
-                        f"Points: <b>{needed['points']}</b>"
+                        f"→ Threads: <b>{row['Threads Needed']}</b>, "
+                        f"Satins: <b>{row['Satins Needed']}</b>, "
+                        f"Artisans: <b>{row['Papers Needed']}</b>, "
+                        f"Points: <b>{row['Points']}</b>"
                         f"</div>",
                         unsafe_allow_html=True
                     )
-                    results.append({
-                        "Item": item,
-                        "Current": current_levels[item],
-                        "Target": target,
-                        "Threads Needed": needed["threads"],
-                        "Satins Needed": needed["satins"],
-                        "Papers Needed": needed["papers"],
-                        "Points": needed["points"]
-                    })
                 else:
                     st.info("Already at max rarity.")
-                    results.append({
-                        "Item": item,
-                        "Current": current_levels[item],
-                        "Target": current_levels[item],
-                        "Threads Needed": 0,
-                        "Satins Needed": 0,
-                        "Papers Needed": 0,
-                        "Points": 0
-                    })
 
     # --------------------------
     # Resource-input mode
     # --------------------------
     if mode_by_resources:
         st.header("Total Available Resources")
-        total_threads = st.number_input("Threads", min_value=0, step=1)
-        total_satins = st.number_input("Satins", min_value=0, step=1)
-        total_papers = st.number_input("Papers", min_value=0, step=1)
-
-        if st.button("Calculate Optimal Upgrades"):
-            final_levels, remaining, total_points = max_rarity_from_resources(
-                current_levels, total_threads, total_satins, total_papers
-            )
-            st.subheader("Final Levels per Item")
-            for item, level in final_levels.items():
-                st.write(f"{item}: {level}")
-            st.subheader("Resources Left Over")
-            st.write(
-                f"Threads: {remaining['threads']}, Satins: {remaining['satins']}, Papers: {remaining['papers']}"
+        total_threads = st.number_input("Threads", min_value=0, step=1, key="gear_total_threads")
+        total_satins = st.number_input("Satins", min_value=0, step=1, key="gear_total_satins")
+        total_papers = st.number_input("Papers", min_value=0, step=1, key="gear_total_papers")
+
+        with section("Gear optimizer"):
+            result = background_result(
+                "gear",
+                (tuple(current_levels.items()), total_threads, total_satins, total_papers),
+                timed_cached_call, compare_gear_optimizers,
+                dict(current_levels), total_threads, total_satins, total_papers,
             )
-            st.subheader("Total Points Gained")
-            st.write(f"{total_points:,}")
+        if result is None:
+            st.info("Optimizing...")
+            await_background("gear")
+            sync_link()
+            return
+        report, call = result
+        final_levels = report["exact"]["final_levels"]
+        remaining = report["exact"]["remaining"]
+        total_points = report["exact"]["points"]
+
+        st.subheader("Final Levels per Item")
+        for item, level in final_levels.items():
+            st.write(f"{item}: {level}")
+        st.subheader("Resources Left Over")
+        st.write(
+            f"Threads: {remaining['threads']}, Satins: {remaining['satins']}, Papers: {remaining['papers']}"
+        )
+        st.subheader("Total Points Gained")
+        st.write(f"{total_points:,}")
+
+        greedy = report["greedy"]
+        st.caption(
+            optimizer_timing(call)
+            + f"Exact solver: {report['exact']['seconds'] * 1000:.1f} ms. "
+            f"Points-per-material greedy: {greedy['points']:,} points in {greedy['seconds'] * 1000:.1f} ms "
+            f"(exact gains {report['gain']:,})."
+        )
+
+    # --------------------------
+    # Budget sweep
+    # --------------------------
+    if st.checkbox("Show budget sweep heatmap (optimal plan for every threads × satins budget)", key=kept("gear_sweep")):
+        gear_budget_sweep(current_levels)
 
     # --------------------------
     # Summary Table for Target Mode
     # --------------------------
-    if results:
+    if not mode_by_resources:
         st.markdown("## Summary Table")
-        import pandas as pd
-        df_summary = pd.DataFrame(results)
-        st.dataframe(
-            df_summary[["Item", "Current", "Target", "Threads Needed", "Satins Needed", "Papers Needed", "Points"]]
+        with section("Gear summary table"):
+            summary_table(
+                derived("gear_rows"),
+                ["Item", "Current", "Target", "Threads Needed", "Satins Needed", "Papers Needed", "Points"],
+                "gear_summary",
+            )
+        st.markdown(f"**Total Points:** {derived('gear_total'):,}")
+    sync_link()
+
+def all_current_levels():
+    """Current level of every hero, charm and gov gear item, as set in their tabs."""
+    current = {}
+    for name in hero_names():
+        current[name] = st.session_state.get(f"{name}_current", HERO_TABLE.levels[0])
+    for name in charm_names():
+        current[name] = st.session_state.get(f"{name}_current", CHARM_TABLE.levels[0])
+    for item in gov_gear_items:
+        current[item] = st.session_state.get(f"{item}_current", GEAR_TABLE.levels[0])
+    return current
+
+
+@st.fragment
+@on_session_version
+@timed("Goal planner tab")
+def goal_planner():
+    """Goal planner tab: cheapest upgrades from the current levels to a points goal."""
+    st.title("KvK Goal Planner")
+    st.write(
+        "Find the cheapest hero, charm and gov gear upgrades that reach a KvK prep points goal, "
+        "starting from the current levels set in the other tabs."
+    )
+
+    from planner import DEFAULT_WEIGHTS, RESOURCES, max_goal, plan_for_goal
+
+    current = all_current_levels()
+
+    ceiling = max_goal(current)
+    goal = st.number_input(
+        f"Points goal (at most {ceiling:,} from the current levels)",
+        min_value=0,
+        step=10_000,
+        key="planner_goal",
+    )
+
+    with st.expander("Resource exchange weights", expanded=False):
+        st.caption("What one unit of each resource is worth to you; the plan minimizes the weighted total.")
+        weights = {}
+        cols = st.columns(4)
+        for idx, (res, label) in enumerate(RESOURCES.items()):
+            # Seeded through session state so a loaded profile can override it
+            st.session_state.setdefault(f"planner_weight_{res}", DEFAULT_WEIGHTS[res])
+            with cols[idx % 4]:
+                weights[res] = st.number_input(
+                    label,
+                    min_value=0.0,
+                    step=0.01,
+                    format="%.2f",
+                    key=f"planner_weight_{res}",
+                )
+
+    # Levels changed in another tab only rerun that tab
+    st.button("Refresh from current levels", key="planner_refresh")
+
+    with section("Goal planner"):
+        plan = plan_for_goal(current, goal, weights)
+
+    if not plan["reachable"]:
+        st.warning(f"The goal is out of reach: maxing everything gives {plan['points']:,} points.")
+
+    st.subheader("Resources Needed")
+    st.write(", ".join(f"{label}: {plan['resources'][res]:,}" for res, label in RESOURCES.items()))
+    st.subheader("Points Gained")
+    st.write(f"{plan['points']:,}")
+    st.caption(
+        f"Weighted cost {plan['cost']:,.2f}; no plan can cost less than {plan['lower_bound']:,.2f}."
+    )
+
+    if plan["upgrades"]:
+        st.markdown("## Upgrades")
+        labels = {"name": "Item", "kind": "Type", "current": "Current", "target": "Target",
+                  "points": "Points", "cost": "Weighted Cost", **RESOURCES}
+        rows = [{labels[k]: v for k, v in upgrade.items()} for upgrade in plan["upgrades"]]
+        with section("Goal planner table"):
+            summary_table(rows, list(labels.values()), "planner_upgrades")
+    sync_link()
+
+
+@st.fragment
+@on_session_version
+@timed("Next upgrades")
+def next_upgrades():
+    """Ranked single-step upgrades across all three calculators."""
+    from planner import RESOURCES, weights_key
+    from upgrade_index import UpgradeIndex
+
+    st.markdown("## What to Upgrade Next")
+    st.caption("Single level-ups ranked by points per weighted resource, using the weights above.")
+
+    weights = weights_key({res: st.session_state.get(f"planner_weight_{res}") for res in RESOURCES
+                           if st.session_state.get(f"planner_weight_{res}") is not None})
+    index = st.session_state.get("_upgrade_index")
+    if index is None or tuple(sorted(index.weights.items())) != weights:
+        index = UpgradeIndex(all_current_levels(), dict(weights))
+        st.session_state["_upgrade_index"] = index
+    else:
+        # Synced once per render: levels only change on the calculator pages,
+        # and only items whose level moved since then touch the heap
+        index.sync(all_current_levels())
+
+    st.session_state.setdefault("next_upgrades_count", 10)
+    count = st.number_input("Upgrades to show", min_value=1, max_value=200, key=kept("next_upgrades_count"))
+    ranked = index.ranked(count)
+    if not ranked:
+        st.info("Everything is maxed.")
+        return
+    rows = []
+    for upgrade in ranked:
+        row = {
+            "Item": upgrade["name"].replace("_", " "),
+            "Type": upgrade["kind"],
+            "From": upgrade["from"],
+            "To": upgrade["to"],
+            "Points": upgrade["points"],
+            "Points per Cost": round(upgrade["points_per_cost"], 2),
+        }
+        for res, label in RESOURCES.items():
+            if upgrade.get(res):
+                row[label] = upgrade[res]
+        rows.append(row)
+    columns = ["Item", "Type", "From", "To", "Points", "Points per Cost"]
+    columns += [label for label in RESOURCES.values() if any(label in row for row in rows)]
+    summary_table(rows, columns, "next_upgrades")
+
+
+def all_target_levels():
+    """Target level of every hero, charm and gov gear item, as planned in their tabs."""
+    target = {row["Hero"]: row["Target Level"] for row in derived("hero_rows")}
+    target.update((f"{row['Category']}_{row['Charm']}", row["Target Level"]) for row in derived("charm_rows"))
+    target.update((row["Item"], row["Target"]) for row in derived("gear_rows"))
+    return target
+
+
+MAX_PREP_DAYS = 7
+
+
+@st.fragment
+@on_session_version
+@timed("Prep days tab")
+def prep_days():
+    """Prep days tab: the planned upgrades spread over the days that score them."""
+    st.title("KvK Prep Days")
+    st.write(
+        "Each prep day scores one kind of upgrade. Schedule the upgrades planned in the hero, charm and "
+        "gov gear tabs onto the days that score them, and see what is worth holding back."
+    )
+
+    from scheduler import CATEGORIES, DEFAULT_CALENDAR, OBJECTIVES, schedule
+
+    st.session_state.setdefault("prep_days", len(DEFAULT_CALENDAR))
+    count = st.number_input("Prep days", min_value=1, max_value=MAX_PREP_DAYS, step=1, key=kept("prep_days"))
+    calendar = []
+    for i in range(count):
+        default = DEFAULT_CALENDAR[i]["category"] if i < len(DEFAULT_CALENDAR) else None
+        st.session_state.setdefault(f"prep_day_{i}_category", default)
+        st.session_state.setdefault(f"prep_day_{i}_thresholds", "")
+        cat_col, milestone_col = st.columns([1, 2])
+        category = cat_col.selectbox(
+            f"Day {i + 1} scores",
+            [None, *CATEGORIES],
+            format_func=lambda c: CATEGORIES.get(c, "None of these"),
+            key=kept(f"prep_day_{i}_category"),
+        )
+        text = milestone_col.text_input(
+            f"Day {i + 1} point milestones",
+            key=kept(f"prep_day_{i}_thresholds"),
+            placeholder="e.g. 500000, 1500000, 3000000",
         )
-        st.markdown(f"**Total Points:** {df_summary['Points'].sum():,}")
+        if re.search(r"[^\d,;\s]", text):
+            milestone_col.warning("Milestones must be whole numbers separated by commas.")
+            thresholds = []
+        else:
+            # "1,500,000" is one milestone, "500000, 1500000" two
+            thresholds = [int(v.replace(",", "")) for v in re.findall(r"\d{1,3}(?:,\d{3})+(?!\d)|\d+", text)]
+        calendar.append({"name": f"Day {i + 1}", "category": category, "thresholds": thresholds})
+
+    st.session_state.setdefault("prep_objective", next(iter(OBJECTIVES)))
+    objective = st.radio(
+        "Goal", list(OBJECTIVES), format_func=OBJECTIVES.get, horizontal=True, key=kept("prep_objective")
+    )
 
+    with section("Prep day schedule"):
+        plan = schedule(all_current_levels(), all_target_levels(), calendar, objective)
 
+    cols = st.columns(3)
+    cols[0].metric("Event Points", f"{plan['points']:,}")
+    cols[1].metric("Milestones Reached", f"{plan['reached']:,} of {plan['milestones']:,}")
+    cols[2].metric("Upgrades Held Back", f"{len(plan['held']):,}")
+
+    days = [
+        {
+            "Day": day["name"],
+            "Scores": CATEGORIES.get(day["category"], "-"),
+            "Points": day["points"],
+            "Milestones": f"{day['reached']} of {len(day['milestones'])}",
+            "Next Milestone": day["milestones"][day["reached"]] if day["reached"] < len(day["milestones"]) else "-",
+        }
+        for day in plan["days"]
+    ]
+    summary_table(days, ["Day", "Scores", "Points", "Milestones", "Next Milestone"], "prep_days_summary")
 
+    labels = {"name": "Item", "kind": "Type", "current": "Current", "target": "Target", "points": "Points", **RESOURCES}
+    rows = [
+        {"Day": day["name"], **{labels[k]: v for k, v in upgrade.items()}}
+        for day in plan["days"]
+        for upgrade in day["upgrades"]
+    ]
+    if rows:
+        st.markdown("## Upgrades by Day")
+        summary_table(rows, ["Day", *labels.values()], "prep_upgrades")
+    if plan["held"]:
+        st.markdown("## Hold Back")
+        st.caption("No prep day scores these, or the goal is met without them.")
+        rows = [{labels[k]: v for k, v in upgrade.items()} for upgrade in plan["held"]]
+        summary_table(rows, list(labels.values()), "prep_held")
+
+
+@st.fragment
+@on_session_version
+@timed("Forecast tab")
+def income_forecast():
+    """Forecast tab: when the planned targets are reached from daily income."""
+    st.title("Target Forecast")
+    st.write(
+        "Enter what you earn per day and how much it varies. Thousands of income trajectories are "
+        "simulated to estimate when each target set in the hero, charm and gov gear tabs is reached, "
+        "paying for them in tab order."
+    )
 
+    from datetime import date, timedelta
+
+    from forecast import DEFAULT_DAYS, DEFAULT_TRIALS, PERCENTILES, forecast, target_costs
+
+    with st.expander("Daily income", expanded=True):
+        income = {}
+        stock = {}
+        cols = st.columns(4)
+        for idx, (res, label) in enumerate(RESOURCES.items()):
+            with cols[idx % 4]:
+                st.markdown(f"**{label}**")
+                mean = st.number_input("Per day", min_value=0.0, step=1.0, key=kept(f"forecast_income_{res}"))
+                spread = st.number_input("Spread (±)", min_value=0.0, step=1.0, key=kept(f"forecast_spread_{res}"))
+                stock[res] = st.number_input("On hand", min_value=0, step=1, key=kept(f"forecast_stock_{res}"))
+                income[res] = (mean, spread)
+    st.session_state.setdefault("forecast_trials", DEFAULT_TRIALS)
+    st.session_state.setdefault("forecast_days", DEFAULT_DAYS)
+    trials_col, days_col = st.columns(2)
+    trials = trials_col.number_input("Trials", min_value=100, max_value=50_000, step=1000, key=kept("forecast_trials"))
+    days = days_col.number_input("Days ahead", min_value=7, max_value=730, step=30, key=kept("forecast_days"))
+
+    targets = target_costs(all_current_levels(), all_target_levels())
+    if not targets:
+        st.info("Every target is already reached; set targets in the calculator tabs.")
+        return
+
+    # Re-simulate only when an input changes; a fixed seed keeps the bands steady
+    key = (repr(targets), tuple(sorted(income.items())), tuple(sorted(stock.items())), trials, days)
+    cached = st.session_state.get("_forecast")
+    if cached is None or cached[0] != key:
+        start = time.perf_counter()
+        with section("Forecast"):
+            result = forecast(targets, income, stock, trials, days, seed=0)
+        cached = (key, result, time.perf_counter() - start)
+        st.session_state["_forecast"] = cached
+    _, result, elapsed = cached
+
+    today = date.today()
+
+    def when(day):
+        return "-" if day is None else str(today + timedelta(days=day))
+
+    low, mid, high = PERCENTILES
+    everything = result["all"]
+    cols = st.columns(3)
+    cols[0].metric(f"All Targets ({mid}th percentile)", when(everything["percentiles"][mid]))
+    cols[1].metric(f"Chance Within {days:,} Days", f"{everything['chance']:.0%}")
+    cols[2].metric("Targets", f"{len(targets):,}")
+    st.caption(f"{trials:,} trials × {days:,} days simulated in {elapsed * 1000:.0f} ms.")
+
+    st.line_chart(
+        {
+            "Date": [today + timedelta(days=day) for day in range(days + 1)],
+            "Chance All Targets Done %": (result["finished"] * 100).tolist(),
+        },
+        x="Date",
+    )
 
+    rows = []
+    for target in result["targets"]:
+        rows.append({
+            "Item": target["name"].replace("_", " "),
+            "Type": target["kind"],
+            "Needs": ", ".join(f"{amount:,} {RESOURCES[res]}" for res, amount in target["cost"].items()),
+            f"P{low}": when(target["percentiles"][low]),
+            f"P{mid}": when(target["percentiles"][mid]),
+            f"P{high}": when(target["percentiles"][high]),
+            "Chance %": 100 * target["chance"],
+        })
+    st.markdown("## Targets")
+    st.caption(f"P{low}/P{mid}/P{high}: reached by then in {low}%, {mid}% and {high}% of trials; - is past the forecast.")
+    summary_table(rows, ["Item", "Type", "Needs", f"P{low}", f"P{mid}", f"P{high}", "Chance %"], "forecast_targets")
+
+
+@st.fragment
+@on_session_version
+@timed("Alliance batch tab")
+def alliance_batch():
+    """Alliance batch tab: roster upload and results."""
+    st.title("Alliance Batch Mode")
+    st.write(
+        "Upload a roster with one row per player and a current/target column for every hero, "
+        "charm and gov gear item. Start from the template below."
+    )
 
+    from batch import evaluate_roster, read_roster, roster_template
 
+    st.download_button(
+        "Download roster template (CSV)",
+        data=roster_template().to_csv(index=False).encode("utf-8"),
+        file_name="roster_template.csv",
+        mime="text/csv",
+        key="batch_template",
+    )
 
+    uploaded = kept_upload("Roster file", ["csv", "parquet"], "batch_upload")
+
+    if uploaded is not None:
+        _, name, data = uploaded
+        try:
+            roster = read_roster(data, name)
+            with section("Batch evaluation"):
+                batch_results = evaluate_roster(roster)
+        except (ValueError, ImportError) as exc:
+            st.error(f"Could not evaluate roster: {exc}")
+        else:
+            st.markdown(f"## Results for {len(batch_results):,} players")
+            st.dataframe(batch_results)
+            st.markdown(f"**Alliance Total Points:** {batch_results['KvK Prep Points'].sum():,}")
+            st.download_button(
+                "Download results (CSV)",
+                data=batch_results.to_csv(index=False).encode("utf-8"),
+                file_name="roster_results.csv",
+                mime="text/csv",
+                key="batch_download",
+            )
+            season = st.session_state.get("history_season", 1)
+            if st.button(f"Record a season {season} progress snapshot for every player", key="batch_snapshot"):
+                from history import record_roster
+
+                try:
+                    with section("Roster snapshot"):
+                        recorded = record_roster(roster.to_dict("records"), season)
+                except ValueError as exc:
+                    st.error(f"Could not record snapshot: {exc}")
+                else:
+                    st.success(f"Recorded {recorded:,} snapshots.")
+
+
+@st.fragment
+@on_session_version
+@timed("Leaderboard tab")
+def alliance_leaderboard():
+    """Leaderboard tab: top players and category totals of a kingdom export."""
+    st.title("Alliance Leaderboard")
+    st.write(
+        "Upload an export with one player per line (JSON Lines) or row (CSV), in the roster format. "
+        "Players are ranked by the KvK prep points their targets are worth; the file is read one "
+        "player at a time, so whole-kingdom exports are fine."
+    )
 
+    from leaderboard import CATEGORY_COLUMNS, ID_FIELD, TOTAL_COLUMN, leaderboard_from_upload
+
+    uploaded = kept_upload("Player export", ["jsonl", "json", "csv"], "leaderboard_upload")
+    st.session_state.setdefault("leaderboard_top", 10)
+    top = st.number_input("Players to rank", min_value=1, max_value=1000, step=5, key=kept("leaderboard_top"))
+    if uploaded is None:
+        return
+    file_id, name, data = uploaded
+
+    # Re-rank only when the file or K changes, not on every rerun
+    cached = st.session_state.get("_leaderboard")
+    if cached is None or cached[:2] != (file_id, top):
+        start = time.perf_counter()
+        try:
+            with section("Leaderboard"):
+                board = leaderboard_from_upload(data, name, top)
+        except ValueError as exc:
+            st.error(f"Could not read the export: {exc}")
+            return
+        cached = (file_id, top, board, time.perf_counter() - start)
+        st.session_state["_leaderboard"] = cached
+    _, _, board, elapsed = cached
+
+    summary = board.summary()
+    cols = st.columns(3)
+    cols[0].metric("Players", f"{summary['players']:,}")
+    cols[1].metric("Alliance Points", f"{summary['totals'][TOTAL_COLUMN]:,}")
+    cols[2].metric("Average per Player", f"{summary['averages'][TOTAL_COLUMN]:,.0f}")
+    st.caption(f"Ranked in {elapsed:.2f} s.")
+    if board.skipped:
+        st.warning(
+            f"Skipped {board.skipped:,} players with unknown levels, e.g. "
+            + "; ".join(f"record {position}: {message}" for position, message in board.errors[:3])
+        )
 
+    st.markdown(f"## Top {len(board.heap):,}")
+    summary_table(board.top(), ["Rank", ID_FIELD, TOTAL_COLUMN] + CATEGORY_COLUMNS, "leaderboard_top_table")
+
+    st.markdown("## By Category")
+    total = summary["totals"][TOTAL_COLUMN] or 1
+    breakdown = [
+        {
+            "Category": column,
+            "Alliance Points": summary["totals"][column],
+            "Average per Player": summary["averages"][column],
+            "Share %": 100 * summary["totals"][column] / total,
+        }
+        for column in CATEGORY_COLUMNS
+    ]
+    summary_table(breakdown, ["Category", "Alliance Points", "Average per Player", "Share %"], "leaderboard_categories")
+
+
+@st.fragment
+@on_session_version
+@timed("Progress tab")
+def progress_history():
+    """Progress tab: one player's points over time and the alliance-wide trend."""
+    st.title("Progress History")
+    st.write(
+        "KvK prep points of the current levels, from snapshots recorded in the sidebar "
+        "or for a whole roster in Alliance Batch."
+    )
 
+    from datetime import datetime, timezone
+
+    from history import alliance_progress, player_history
+
+    season = st.number_input("Season (0 for every season)", min_value=0, step=1, key=kept("progress_season")) or None
+
+    def dates(times):
+        return [datetime.fromtimestamp(int(t), tz=timezone.utc) for t in times]
+
+    player = st.session_state.get("profile_player", "").strip()
+    st.subheader(f"Player {player}" if player else "Player")
+    if not player:
+        st.info("Enter a player ID in the sidebar to see their progress.")
+    else:
+        with section("Player history"):
+            series = player_history(player, season)
+        if len(series["time"]):
+            st.line_chart(
+                {
+                    "Date": dates(series["time"]),
+                    "Heroes": series["hero_points"].tolist(),
+                    "Charms": series["charm_points"].tolist(),
+                    "Gov Gear": series["gear_points"].tolist(),
+                    "Total": series["total"].tolist(),
+                },
+                x="Date",
+            )
+        else:
+            st.info(f"No snapshots recorded for {player} yet.")
+
+    st.subheader("Alliance")
+    start = time.perf_counter()
+    with section("Alliance history"):
+        progress = alliance_progress(season)
+    elapsed = time.perf_counter() - start
+    if len(progress["day"]):
+        st.line_chart({"Date": dates(progress["day"]), "Alliance Points": progress["total"].tolist()}, x="Date")
+        st.caption(
+            f"{len(progress['day']):,} days, {int(progress['players'][-1]):,} players, "
+            f"aggregated in {elapsed * 1000:.1f} ms."
+        )
+    else:
+        st.info("No snapshots recorded yet.")
+
+
+# --------------------------
+# Player profiles
+# --------------------------
+def _save_profile():
+    player = st.session_state.get("profile_player", "").strip()
+    if not player:
+        st.session_state["profile_status"] = "Enter a player ID first."
+        return
+    with section("Profile save"):
+        saved = save_profile(player, st.session_state)
+    st.session_state["profile_status"] = f"Saved {saved} values for {player}."
+
+
+def _load_profile():
+    player = st.session_state.get("profile_player", "").strip()
+    with section("Profile load"):
+        values = load_profile(player) if player else None
+    if values is None:
+        st.session_state["profile_status"] = f"No saved profile for '{player}'."
+        return
+    # Callbacks run before the script, so every widget picks these up this run
+    st.session_state.update(values)
+    st.session_state["profile_status"] = f"Loaded {player}."
+
+
+def _record_snapshot():
+    player = st.session_state.get("profile_player", "").strip()
+    if not player:
+        st.session_state["profile_status"] = "Enter a player ID first."
+        return
+    from history import record_snapshot
+
+    season = st.session_state.get("history_season", 1)
+    with section("Progress snapshot"):
+        record_snapshot(player, st.session_state, season)
+    st.session_state["profile_status"] = f"Recorded a season {season} snapshot for {player}."
+
+
+def _drop_link():
+    if not st.session_state.get("url_state"):
+        st.query_params.pop("s", None)
+        st.session_state.pop("_state_token", None)
+
+
+with st.sidebar:
+    st.header("Player Profile")
+    st.text_input("Player ID", key="profile_player")
+    save_col, load_col = st.columns(2)
+    save_col.button("Save", on_click=_save_profile, key="profile_save")
+    load_col.button("Load", on_click=_load_profile, key="profile_load")
+    st.number_input("KvK season", min_value=1, step=1, key="history_season")
+    st.button("Record progress snapshot", on_click=_record_snapshot, key="history_snapshot")
+    if st.session_state.get("profile_status"):
+        st.caption(st.session_state["profile_status"])
+
+    st.header("Game Data")
+    st.selectbox(
+        "Game version",
+        available_versions(),
+        key="game_version",
+        on_change=_switch_game_version,
+        help="Cost and points tables of a game patch, for this session only.",
+    )
+    if st.session_state.get("game_version_status"):
+        st.caption(st.session_state["game_version_status"])
+
+    st.header("Share")
+    st.checkbox(
+        "Keep inputs in the page link",
+        key="url_state",
+        on_change=_drop_link,
+        help="Copy the address bar to share this exact plan, or bookmark it to come back later.",
+    )
 
 
+# --------------------------
+# Calculator navigation
+# --------------------------
+# A radio instead of st.tabs: tabs run every calculator on every rerun even
+# though only one is visible, the radio runs just the selected one.
+CALCULATORS = {
+    "Hero Calculator": [hero_calculator],
+    "Charm Calculator": [charm_calculator],
+    "Gov Gear Calculator": [gov_gear_calculator],
+    "Goal Planner": [goal_planner, next_upgrades],
+    "Prep Days": [prep_days],
+    "Forecast": [income_forecast],
+    "Progress": [progress_history],
+    "Leaderboard": [alliance_leaderboard],
+    "Alliance Batch": [alliance_batch],
+}
+# Streamlit forgets a widget's value after a full run that doesn't render
+# it, so re-assign the profile inputs and every key recorded by `kept` to
+# keep the inputs of the hidden calculators
+for key in [*PROFILE_KEYS, *st.session_state.get("_kept_keys", ())]:
+    if key in st.session_state:
+        st.session_state[key] = st.session_state[key]
+
+active = st.radio(
+    "Calculator", list(CALCULATORS), horizontal=True, key="active_tab", label_visibility="collapsed"
+)
+for calculator in CALCULATORS[active]:
+    calculator()
+
+render_panel()
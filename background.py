@@ -0,0 +1,102 @@
+"""Shared worker pool for optimizer runs, latest input wins.
+
+Every job belongs to a slot, one per (owner, name) pair: in the app the
+owner is the browser session and the name is the calculation ("charms",
+"gear", ...). A slot runs at most one job at a time. Submitting new input
+while a job is running queues it, replacing and cancelling whatever was
+queued before, so a burst of keystrokes costs at most the job already
+running plus the newest one. A job that is already running cannot be
+interrupted, but its result is only used if its input is still current.
+
+Nothing in here depends on Streamlit; callers keep the returned future
+(with the input key it was started for) wherever they keep their state.
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+_pool = ThreadPoolExecutor(
+    max_workers=max(2, min(8, os.cpu_count() or 2)),
+    thread_name_prefix="kvk-optimizer",
+)
+_slots = {}
+_lock = threading.Lock()
+
+
+def submit(owner, name, key, func, *args, **kwargs):
+    """
+    Future for `func(*args, **kwargs)` as the latest job of its slot.
+
+    `key` identifies the input; submitting the key that is already running
+    or queued returns that job's future instead of starting another.
+    """
+    slot_id = (owner, name)
+    with _lock:
+        slot = _slots.setdefault(slot_id, {"running": None, "queued": None})
+        for job in (slot["running"], slot["queued"]):
+            if job is not None and job["key"] == key:
+                return job["future"]
+        # Jobs run in the submitter's context, so they see its game version
+        job = {"key": key, "future": Future(), "call": (contextvars.copy_context(), func, args, kwargs)}
+        if slot["running"] is None:
+            slot["running"] = job
+            start = True
+        else:
+            if slot["queued"] is not None:
+                # Superseded before it ever started
+                slot["queued"]["future"].cancel()
+            slot["queued"] = job
+            start = False
+    if start:
+        _start(slot_id, job)
+    return job["future"]
+
+
+def _start(slot_id, job):
+    if not job["future"].set_running_or_notify_cancel():
+        _finished(slot_id)
+        return
+    _pool.submit(_run, slot_id, job)
+
+
+def _run(slot_id, job):
+    context, func, args, kwargs = job["call"]
+    try:
+        result = context.run(func, *args, **kwargs)
+    except BaseException as exc:
+        job["future"].set_exception(exc)
+    else:
+        job["future"].set_result(result)
+    finally:
+        _finished(slot_id)
+
+
+def _finished(slot_id):
+    """Start the slot's queued job, or drop the slot once it is idle."""
+    with _lock:
+        slot = _slots.get(slot_id)
+        if slot is None:
+            return
+        job = slot["queued"]
+        slot["queued"] = None
+        slot["running"] = job
+        if job is None:
+            del _slots[slot_id]
+    if job is not None:
+        _start(slot_id, job)
+
+
+def wait(future, timeout):
+    """The job's result if it finishes within `timeout` seconds, else None."""
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        return None
+
+
+def pending(owner=None):
+    """Number of slots with a job running, optionally for one owner."""
+    with _lock:
+        return sum(1 for (o, _) in _slots if owner is None or o == owner)
@@ -0,0 +1,132 @@
+"""Alliance batch mode: evaluate a whole roster of players in one pass.
+
+A roster has one row per player and a `<name>_current` / `<name>_target`
+column pair for every hero, charm and gov gear item, using the same names
+as the session-state keys in the app (e.g. `Jabel_current`,
+`Infantry_Charm I_target`, `Cap_current`). Level names are converted to
+table indices once per column, after which every cost is a fancy-indexed
+difference of the engine's prefix-sum arrays.
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    CHARM_TABLE, GEAR_TABLE, HERO_TABLE,
+    categories, game_tables, gov_gear_items, hero_names, charm_names,
+)
+
+ID_COLUMN = "Player"
+
+RESULT_COLUMNS = [
+    ID_COLUMN,
+    "Mythic Shards", "Epic Shards", "Rare Shards",
+    "Designs", "Guides",
+    "Threads", "Satins", "Papers",
+    "Hero Points", "Charm Points", "Gear Points",
+    "KvK Prep Points",
+]
+
+
+def roster_columns():
+    """Every column a roster file is expected to have, in template order."""
+    columns = [ID_COLUMN]
+    for name in hero_names() + charm_names() + gov_gear_items:
+        columns += [f"{name}_current", f"{name}_target"]
+    return columns
+
+
+def roster_template(players=1):
+    """A roster with every level at its lowest value, to fill in and upload."""
+    row = {ID_COLUMN: ""}
+    for names, table in ((hero_names(), HERO_TABLE), (charm_names(), CHARM_TABLE), (gov_gear_items, GEAR_TABLE)):
+        for name in names:
+            row[f"{name}_current"] = table.levels[0]
+            row[f"{name}_target"] = table.levels[0]
+    return pd.DataFrame([row] * players, columns=roster_columns())
+
+
+def read_roster(data, filename):
+    """Read an uploaded CSV or Parquet roster into a DataFrame."""
+    if filename.lower().endswith(".parquet"):
+        return pd.read_parquet(io.BytesIO(data))
+    # Keep level names such as "1-0" and "5" as text
+    return pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+
+
+def _level_indices(roster, names, table, suffix):
+    """(players × names) array of level indices for one column suffix."""
+    out = np.empty((len(roster), len(names)), dtype=np.int64)
+    for j, name in enumerate(names):
+        column = f"{name}_{suffix}"
+        if column not in roster:
+            if suffix == "target":
+                # No target given: the item stays at its current level
+                out[:, j] = -1
+                continue
+            raise ValueError(f"Roster is missing column '{column}'")
+        values = roster[column].astype(str).str.strip()
+        codes = pd.Categorical(values, categories=table.levels).codes
+        if suffix == "target":
+            # Blank targets also mean "stay at current"
+            blank = (values == "").to_numpy()
+            codes = np.where(blank, -1, codes)
+            bad = (codes < 0) & ~blank
+        else:
+            bad = codes < 0
+        if bad.any():
+            sample = values[bad].iloc[0]
+            raise ValueError(f"Unknown level '{sample}' in column '{column}'")
+        out[:, j] = codes
+    return out
+
+
+def _range_costs(roster, names, table):
+    """Per-player, per-item cost of every resource plus points."""
+    cur = _level_indices(roster, names, table, "current")
+    tgt = _level_indices(roster, names, table, "target")
+    tgt = np.maximum(np.where(tgt < 0, cur, tgt), cur)
+    return {
+        res: np.asarray(prefix)[tgt] - np.asarray(prefix)[cur]
+        for res, prefix in table.prefix.items()
+    }
+
+
+def evaluate_roster(roster):
+    """
+    Resources and KvK prep points every player in a roster needs.
+
+    Returns one row per player with the columns in `RESULT_COLUMNS`.
+    """
+    result = pd.DataFrame(index=roster.index)
+    if ID_COLUMN in roster:
+        result[ID_COLUMN] = roster[ID_COLUMN].to_numpy()
+    else:
+        result[ID_COLUMN] = np.arange(1, len(roster) + 1)
+
+    hero_costs = _range_costs(roster, hero_names(), HERO_TABLE)["shards"]
+    hero_points = np.zeros(len(roster), dtype=np.int64)
+    points_per_shard = game_tables().points_per_shard
+    start = 0
+    for category, heroes in categories.items():
+        shards = hero_costs[:, start:start + len(heroes)].sum(axis=1)
+        result[f"{category} Shards"] = shards
+        hero_points += shards * points_per_shard.get(category, 0)
+        start += len(heroes)
+
+    charm = _range_costs(roster, charm_names(), CHARM_TABLE)
+    result["Designs"] = charm["designs"].sum(axis=1)
+    result["Guides"] = charm["guides"].sum(axis=1)
+
+    gear = _range_costs(roster, gov_gear_items, GEAR_TABLE)
+    result["Threads"] = gear["threads"].sum(axis=1)
+    result["Satins"] = gear["satins"].sum(axis=1)
+    result["Papers"] = gear["papers"].sum(axis=1)
+
+    result["Hero Points"] = hero_points
+    result["Charm Points"] = charm["points"].sum(axis=1)
+    result["Gear Points"] = gear["points"].sum(axis=1)
+    result["KvK Prep Points"] = result["Hero Points"] + result["Charm Points"] + result["Gear Points"]
+    return result[RESULT_COLUMNS]
@@ -0,0 +1,259 @@
+"""Reproducible benchmarks for the KvK Helper.
+
+    python bench.py                          # run and write bench_results.json
+    python bench.py --save-baseline          # also store the run as the baseline
+    python bench.py --baseline bench_baseline.json --tolerance 0.25
+
+Measures cold start, full-script and per-calculator rerun time through Streamlit's AppTest,
+cost-query throughput, optimizer runtime over a grid of budgets from zero to
+maxed, and peak memory. Every metric is a time (lower is better) or a
+throughput (higher is better); when a baseline is given, any metric that
+is worse than the baseline by more than the tolerance is reported and the
+script exits non-zero so it can gate a deploy.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from engine import (
+    CHARM_TABLE, GEAR_TABLE, charm_names, charm_priority, gov_gear_items,
+    items_needed, materials_needed, max_levels_global, max_rarity_from_resources,
+)
+from optimizer import _solve_chain, optimal_charm_levels, optimal_gear_rarities
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(HERE, "app.py")
+
+# Metrics where a bigger number is better; everything else is a duration
+HIGHER_IS_BETTER = ("_per_sec",)
+
+
+def _timed(func, repeat):
+    """Median wall time of `repeat` calls, in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+# --------------------------
+# App reruns
+# --------------------------
+_COLD_START = """
+import time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+AppTest.from_file({path!r}, default_timeout=60).run()
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def bench_cold_start(repeat):
+    """First run of the app in a fresh interpreter, imports included."""
+    import subprocess
+
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _COLD_START.format(path=APP_PATH)],
+            capture_output=True, text=True, check=True, cwd=HERE,
+        )
+        samples.append(float(out.stdout.split()[-1]))
+    return {"cold_start_ms": statistics.median(samples)}
+
+
+def bench_reruns(repeat):
+    """Full-script run plus a rerun triggered from inside each calculator."""
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+
+    def full_run():
+        AppTest.from_file(APP_PATH, default_timeout=60).run()
+
+    results["rerun_full_ms"] = _timed(full_run, repeat)
+
+    # Calculator to open and one widget in it to touch before rerunning
+    touches = {
+        "heroes": ("Hero Calculator", lambda at, i: at.select_slider(key="Jabel_current").set_value(
+            ["0-0", "1-0"][i % 2])),
+        "charms": ("Charm Calculator", lambda at, i: at.select_slider(key="Infantry_Charm I_current").set_value(
+            ["0", "5"][i % 2])),
+        "gov_gear": ("Gov Gear Calculator", lambda at, i: at.select_slider(key="Cap_current").set_value(
+            ["None", "Epic"][i % 2])),
+    }
+    for tab, (calculator, touch) in touches.items():
+        at = AppTest.from_file(APP_PATH, default_timeout=60).run()
+        at.radio(key="active_tab").set_value(calculator).run()
+        samples = []
+        for i in range(repeat):
+            touch(at, i)
+            start = time.perf_counter()
+            at.run()
+            samples.append((time.perf_counter() - start) * 1000)
+        results[f"rerun_{tab}_ms"] = statistics.median(samples)
+    return results
+
+
+# --------------------------
+# Query throughput
+# --------------------------
+def bench_queries(n):
+    rng = random.Random(0)
+    charm_pairs = []
+    for _ in range(n):
+        a = rng.randint(0, CHARM_TABLE.max_index)
+        charm_pairs.append((str(a), str(rng.randint(a, CHARM_TABLE.max_index))))
+    gear_pairs = []
+    for _ in range(n):
+        a = rng.randint(0, GEAR_TABLE.max_index)
+        gear_pairs.append((GEAR_TABLE.levels[a], GEAR_TABLE.levels[rng.randint(a, GEAR_TABLE.max_index)]))
+
+    start = time.perf_counter()
+    for cur, tgt in charm_pairs:
+        items_needed(cur, tgt)
+    charm_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for cur, tgt in gear_pairs:
+        materials_needed(cur, tgt)
+    gear_seconds = time.perf_counter() - start
+
+    return {
+        "items_needed_per_sec": n / charm_seconds,
+        "materials_needed_per_sec": n / gear_seconds,
+    }
+
+
+# --------------------------
+# Optimizers
+# --------------------------
+def _budget_grid(table, steps):
+    """Budgets from zero up to enough to max every item, per resource."""
+    items = 18 if table is CHARM_TABLE else len(gov_gear_items)
+    maxed = [table.prefix[res][-1] * items for res in table.resources]
+    return [tuple(int(m * i / (steps - 1)) for m in maxed) for i in range(steps)]
+
+
+def bench_optimizers(steps):
+    results = {}
+    charm_start = {name: "0" for name in charm_names()}
+    gear_start = {item: GEAR_TABLE.levels[0] for item in gov_gear_items}
+
+    solvers = {
+        "charms_greedy": lambda b: max_levels_global(charm_start, b[0], b[1], charm_priority),
+        "charms_exact": lambda b: optimal_charm_levels(charm_start, b[0], b[1], charm_priority),
+        "gear_greedy": lambda b: max_rarity_from_resources(gear_start, *b),
+        "gear_exact": lambda b: optimal_gear_rarities(gear_start, *b),
+    }
+    for name, solve in solvers.items():
+        table = CHARM_TABLE if name.startswith("charms") else GEAR_TABLE
+        samples = []
+        for budget in _budget_grid(table, steps):
+            # Measure the solve itself, not a memoized answer
+            _solve_chain.cache_clear()
+            start = time.perf_counter()
+            solve(budget)
+            samples.append((time.perf_counter() - start) * 1000)
+        results[f"{name}_median_ms"] = statistics.median(samples)
+        results[f"{name}_max_ms"] = max(samples)
+    return results
+
+
+# --------------------------
+# Driver
+# --------------------------
+def run(args):
+    results = {}
+    results.update(bench_queries(args.queries))
+    results.update(bench_optimizers(args.grid))
+    if not args.skip_app:
+        results.update(bench_cold_start(args.repeat))
+        results.update(bench_reruns(args.repeat))
+
+    # Memory is measured in a separate pass since tracing slows everything down
+    tracemalloc.start()
+    bench_optimizers(args.grid)
+    if not args.skip_app:
+        bench_reruns(1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["peak_traced_mb"] = peak / 2 ** 20
+    try:
+        import resource
+
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+    except ImportError:
+        pass
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Metrics that regressed by more than `tolerance` against the baseline."""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        if name.endswith(HIGHER_IS_BETTER):
+            change = (old - value) / old
+        else:
+            change = (value - old) / old
+        if change > tolerance:
+            regressions.append((name, old, value, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the KvK Helper calculators.")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="where to write results")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown, as a fraction")
+    parser.add_argument("--repeat", type=int, default=5, help="reruns per tab")
+    parser.add_argument("--queries", type=int, default=200_000, help="cost queries per table")
+    parser.add_argument("--grid", type=int, default=21, help="budgets per optimizer, zero to maxed")
+    parser.add_argument("--skip-app", action="store_true", help="skip the AppTest rerun benchmarks")
+    args = parser.parse_args(argv)
+
+    metrics = run(args)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "metrics": metrics,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    for name, value in metrics.items():
+        print(f"{name:32s} {value:14,.3f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["metrics"]
+    regressions = compare(metrics, baseline, args.tolerance)
+    for name, old, new, change in regressions:
+        print(f"REGRESSION {name}: {old:,.3f} -> {new:,.3f} ({change:+.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
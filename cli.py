@@ -0,0 +1,303 @@
+"""Headless command-line runner for the KvK Helper calculators.
+
+Reads player states from JSON Lines or CSV (one player per line/row, using
+the same `<name>_current` / `<name>_target` keys as the app) and streams one
+result per player back out, without starting Streamlit.
+
+    python cli.py targets roster.csv
+    python cli.py charms roster.jsonl --workers 8 -o charms.jsonl
+    python cli.py gear roster.csv --format csv -o gear.csv
+
+The `charms` and `gear` commands run the resource-mode optimizers and read
+the player's budget from the `designs`/`guides` and `threads`/`satins`/
+`papers` fields. They are spread across a process pool, handing each worker
+chunks of players at a time.
+
+A record that isn't valid JSON, names an unknown level or has a budget that
+isn't a finite, non-negative number doesn't stop the run: it becomes an `{"error":
+...}` line in JSON Lines output (and is left out of CSV output), and the
+bad records are counted on stderr.
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from engine import (
+    categories, charm_names, charm_priority, gov_gear_items,
+    hero_points, items_needed, materials_needed, shards_needed,
+    CHARM_TABLE, GEAR_TABLE, HERO_TABLE,
+)
+from optimizer import optimal_charm_levels, optimal_gear_rarities
+
+ID_FIELD = "Player"
+
+
+# --------------------------
+# Input / output
+# --------------------------
+def iter_raw_records(stream, fmt):
+    """
+    Yield one unparsed record per player from an open text stream: the
+    JSON line itself, or the CSV row as a dict. `parse_record` turns each
+    into a player dict, so one bad line can be skipped without ending the
+    stream.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def parse_record(record):
+    """Player dict of a raw record; ValueError if it isn't a JSON object."""
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError as exc:
+            raise ValueError(f"Not valid JSON ({exc})") from None
+    if not isinstance(record, dict):
+        raise ValueError(f"Expected a JSON object, got {type(record).__name__}")
+    return record
+
+
+def iter_players(path, fmt=None):
+    """
+    Yield one unparsed record per player (see `iter_raw_records`) from a
+    JSON Lines or CSV file ("-" for stdin).
+    """
+    if fmt is None:
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+    stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        yield from iter_raw_records(stream, fmt)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def write_results(results, out, fmt):
+    """
+    Write result dicts as they arrive; CSV takes its header from the first
+    one. Error rows (see `run_record`) are written as JSON lines with their
+    record position, and left out of CSV output, whose columns they don't
+    fit. Returns (players written, [(position, message)] of bad records).
+    """
+    writer = None
+    count = 0
+    errors = []
+    for position, result in enumerate(results, 1):
+        if "error" in result:
+            errors.append((position, result["error"]))
+            if fmt != "csv":
+                out.write(json.dumps({"record": position, **result}, ensure_ascii=False) + "\n")
+            continue
+        if fmt == "csv":
+            if writer is None:
+                writer = csv.DictWriter(out, fieldnames=list(result))
+                writer.writeheader()
+            writer.writerow(result)
+        else:
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        count += 1
+    return count, errors
+
+
+# --------------------------
+# Field validation
+# --------------------------
+# Shared by every reader of player records (this runner, the API, the
+# leaderboard and the progress history), so they accept and reject the
+# same input with the same message.
+def read_level(record, key, levels, default):
+    """
+    Level name in `record[key]`, or `default` if it is missing or blank.
+    ValueError unless it is one of `levels` (a table's `index`, or any
+    container of level names).
+    """
+    value = record.get(key)
+    if value is None:
+        return default
+    value = str(value).strip()
+    if value == "":
+        return default
+    if value not in levels:
+        raise ValueError(f"Unknown level '{value}' for '{key}'")
+    return value
+
+
+def read_amount(record, key):
+    """Whole number in `record[key]` (0 if missing); ValueError unless finite and >= 0."""
+    try:
+        value = float(record.get(key) or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{key}' must be a number") from None
+    except OverflowError:
+        # An integer too large for a float
+        raise ValueError(f"'{key}' must be a finite number") from None
+    if not math.isfinite(value):
+        raise ValueError(f"'{key}' must be a finite number")
+    value = int(value)
+    if value < 0:
+        raise ValueError(f"'{key}' must not be negative")
+    return value
+
+
+# --------------------------
+# Per-player calculations
+# --------------------------
+def plan_targets(record):
+    """Resources and points for every current→target pair, like the three tabs."""
+    result = {ID_FIELD: record.get(ID_FIELD, "")}
+    total_points = 0
+
+    for category, heroes in categories.items():
+        shards = 0
+        for hero in heroes:
+            cur = read_level(record, f"{hero}_current", HERO_TABLE.index, HERO_TABLE.levels[0])
+            shards += shards_needed(cur, read_level(record, f"{hero}_target", HERO_TABLE.index, cur))
+        result[f"{category} Shards"] = shards
+        total_points += hero_points(category, shards)
+
+    charm_totals = {"designs": 0, "guides": 0, "points": 0}
+    for name in charm_names():
+        cur = read_level(record, f"{name}_current", CHARM_TABLE.index, CHARM_TABLE.levels[0])
+        needed = items_needed(cur, read_level(record, f"{name}_target", CHARM_TABLE.index, cur))
+        for key in charm_totals:
+            charm_totals[key] += needed[key]
+
+    gear_totals = {"threads": 0, "satins": 0, "papers": 0, "points": 0}
+    for item in gov_gear_items:
+        cur = read_level(record, f"{item}_current", GEAR_TABLE.index, GEAR_TABLE.levels[0])
+        needed = materials_needed(cur, read_level(record, f"{item}_target", GEAR_TABLE.index, cur))
+        for key in gear_totals:
+            gear_totals[key] += needed[key]
+
+    result["Designs"] = charm_totals["designs"]
+    result["Guides"] = charm_totals["guides"]
+    result["Threads"] = gear_totals["threads"]
+    result["Satins"] = gear_totals["satins"]
+    result["Papers"] = gear_totals["papers"]
+    result["KvK Prep Points"] = total_points + charm_totals["points"] + gear_totals["points"]
+    return result
+
+
+def optimize_charms(record):
+    current = {
+        name: read_level(record, f"{name}_current", CHARM_TABLE.index, CHARM_TABLE.levels[0])
+        for name in charm_names()
+    }
+    final_levels, remaining, points = optimal_charm_levels(
+        current, read_amount(record, "designs"), read_amount(record, "guides"), charm_priority
+    )
+    result = {ID_FIELD: record.get(ID_FIELD, "")}
+    for name in charm_names():
+        result[f"{name}_final"] = final_levels[name]
+    result["designs_left"] = remaining["designs"]
+    result["guides_left"] = remaining["guides"]
+    result["KvK Prep Points"] = points
+    return result
+
+
+def optimize_gear(record):
+    current = {
+        item: read_level(record, f"{item}_current", GEAR_TABLE.index, GEAR_TABLE.levels[0])
+        for item in gov_gear_items
+    }
+    final_levels, remaining, points = optimal_gear_rarities(
+        current, read_amount(record, "threads"), read_amount(record, "satins"), read_amount(record, "papers")
+    )
+    result = {ID_FIELD: record.get(ID_FIELD, "")}
+    for item in gov_gear_items:
+        result[f"{item}_final"] = final_levels[item]
+    result["threads_left"] = remaining["threads"]
+    result["satins_left"] = remaining["satins"]
+    result["papers_left"] = remaining["papers"]
+    result["KvK Prep Points"] = points
+    return result
+
+
+COMMANDS = {
+    "targets": plan_targets,
+    "charms": optimize_charms,
+    "gear": optimize_gear,
+}
+
+
+def run_record(func, record):
+    """`func` of one raw record, or {ID_FIELD, "error"} if the record is bad."""
+    try:
+        record = parse_record(record)
+        return func(record)
+    except (ValueError, TypeError, AttributeError) as exc:
+        player = record.get(ID_FIELD, "") if isinstance(record, dict) else ""
+        return {ID_FIELD: player, "error": str(exc)}
+
+
+# --------------------------
+# Parallel execution
+# --------------------------
+def parallel_map(func, records, workers, chunksize):
+    """
+    Ordered, streaming map of `func` over `records` on a process pool.
+
+    Input is consumed a window at a time so arbitrarily long inputs run in
+    bounded memory; within a window, workers receive `chunksize` records
+    per task.
+    """
+    if workers <= 1:
+        yield from map(func, records)
+        return
+    window = workers * chunksize * 4
+    records = iter(records)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = list(islice(records, window))
+            if not batch:
+                break
+            yield from pool.map(func, batch, chunksize=chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the KvK Helper calculators without Streamlit.")
+    parser.add_argument("command", choices=sorted(COMMANDS), help="calculation to run for every player")
+    parser.add_argument("input", help="JSON Lines or CSV file of player states, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"], help="override the input format")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl", help="output format")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for the optimizers (default: all cores)")
+    parser.add_argument("--chunksize", type=int, default=64, help="players per task sent to a worker")
+    args = parser.parse_args(argv)
+
+    func = COMMANDS[args.command]
+    records = iter_players(args.input, args.input_format)
+    # Target mode is a handful of table lookups per player, cheaper than
+    # shipping the record to another process
+    workers = 1 if args.command == "targets" else args.workers
+    # Records are parsed and checked in the workers; a bad one becomes an
+    # error row instead of ending the run
+    results = parallel_map(partial(run_record, func), records, workers, max(args.chunksize, 1))
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        count, errors = write_results(results, out, args.format)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{count} players processed, {len(errors)} bad records", file=sys.stderr)
+    for position, message in errors[:5]:
+        print(f"  record {position}: {message}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
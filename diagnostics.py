@@ -0,0 +1,166 @@
+"""Opt-in per-rerun profiling for the Streamlit app.
+
+Enabled with the `?diagnostics=1` query parameter or the `KVK_DIAGNOSTICS=1`
+environment variable. When enabled, every instrumented section records its
+wall time in session state and emits one JSON log line on the
+`kvk.diagnostics` logger; `render_panel` shows the latest breakdown along
+with the widget count, session_state size and running optimizer jobs of
+the session. The process-wide job count, optimizer cache counters and
+cache clear button concern every session, so the panel only shows them to
+operators who set `KVK_ADMIN=1`.
+When disabled, `section` and `timed` only cost a flag check.
+"""
+
+import json
+import logging
+import os
+import pickle
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import streamlit as st
+
+import background
+
+logger = logging.getLogger("kvk.diagnostics")
+
+STATE_KEY = "_diagnostics_timings"
+
+
+def enabled():
+    if os.environ.get("KVK_DIAGNOSTICS", "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return st.query_params.get("diagnostics", "") in ("1", "true", "yes")
+    except Exception:
+        # No script context, e.g. when imported from a batch job
+        return False
+
+
+def admin():
+    """Whether the operator enabled the process-wide controls."""
+    return os.environ.get("KVK_ADMIN", "").lower() in ("1", "true", "yes")
+
+
+def session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx else None
+    except ImportError:
+        return None
+
+
+def _log(event, **fields):
+    if not logger.handlers:
+        # Timing lines go to stderr unless the host app configured a handler
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    fields["event"] = event
+    fields["session"] = session_id()
+    logger.info(json.dumps(fields))
+
+
+def record(name, ms):
+    timings = st.session_state.setdefault(STATE_KEY, {})
+    timings[name] = {"ms": ms, "at": time.time()}
+    _log("timing", section=name, ms=round(ms, 3))
+
+
+@contextmanager
+def section(name):
+    """Time the body of a `with` block as one named section."""
+    if not enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def timed(name):
+    """Decorator form of `section` for whole functions."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def widget_count():
+    """Widgets registered in the current run (or fragment run)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+    except ImportError:
+        return 0
+    if ctx is None:
+        return 0
+    # Newer Streamlit releases keep the per-run sets on ctx.shared
+    holder = getattr(ctx, "shared", ctx)
+    ids = getattr(holder, "widget_ids_this_run", ())
+    if hasattr(ids, "snapshot"):
+        ids = ids.snapshot()
+    return len(ids)
+
+
+def session_state_size():
+    """Number of keys and approximate pickled size of session_state."""
+    state = {k: v for k, v in st.session_state.items() if k != STATE_KEY}
+    size = 0
+    for value in state.values():
+        try:
+            size += len(pickle.dumps(value))
+        except Exception:
+            # Handles such as background job futures don't pickle
+            pass
+    return len(state), size
+
+
+def render_panel():
+    """Sidebar breakdown of the latest timing for every section."""
+    if not enabled():
+        return
+    widgets = widget_count()
+    keys, size = session_state_size()
+    _log("run", widgets=widgets, state_keys=keys, state_bytes=size)
+
+    timings = st.session_state.get(STATE_KEY, {})
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        # Sections nest (a tab contains its optimizer call), so these are
+        # not meant to add up
+        for name, t in sorted(timings.items(), key=lambda kv: -kv[1]["ms"]):
+            st.write(f"{name}: {t['ms']:.1f} ms")
+        st.write(f"Widgets rendered: {widgets}")
+        st.write(f"Session state: {keys} keys, {size / 1024:.1f} KiB")
+        st.write(f"Optimizer jobs running: {background.pending(session_id())}")
+        if admin():
+            st.write(f"Optimizer jobs running, all sessions: {background.pending()}")
+            render_cache_stats()
+
+
+def render_cache_stats():
+    """Counters of the optimizer cache every session in this process shares."""
+    from result_cache import OPTIMIZER_CACHE
+
+    cache = OPTIMIZER_CACHE.snapshot()
+    st.markdown("**Optimizer cache (all sessions)**")
+    st.write(
+        f"{cache['entries']:,} of {cache['max_entries']:,} entries, "
+        f"{cache['bytes'] / 2 ** 20:.2f} of {cache['max_bytes'] / 2 ** 20:.0f} MiB, "
+        f"TTL {cache['ttl'] / 3600:g} h"
+    )
+    st.write(
+        f"Hit rate {cache['hit_rate']:.0%}: {cache['hits']:,} hits, {cache['shared']:,} shared, "
+        f"{cache['misses']:,} misses, {cache['evictions']:,} evicted, {cache['expirations']:,} expired"
+    )
+    st.button("Clear optimizer cache", on_click=OPTIMIZER_CACHE.clear, key="diagnostics_clear_cache")
@@ -0,0 +1,347 @@
+"""Calculation engine for the KvK Helper.
+
+Everything in here is plain Python with no Streamlit dependency, so bots and
+batch jobs can import it directly. The cost tables come from the versioned
+game data files (see `gamedata`), compiled into index-based prefix-sum
+arrays; any current→target query is then a pair of list lookups instead of
+a loop over levels.
+"""
+
+import threading
+from bisect import bisect_right
+from contextvars import ContextVar
+from functools import wraps
+from types import MappingProxyType
+
+import gamedata
+from gamedata import GameDataError
+
+# --------------------------
+# Hero data
+# --------------------------
+categories = {
+    "Mythic": ["Jabel", "Zoe", "Marlin", "Amadeus", "Hilde", "Helga", "Saul"],
+    "Epic":   ["Diana", "Quinn", "Howard", "Chenko", "Gordon", "Amane", "Yeonwoo", "Fahd"],
+    "Rare":   ["Forrest", "Olive", "Seth", "Edwin"]
+}
+
+# Heroes that cannot draw on the general shard pool
+shared_pool_excluded = ("Helga", "Amadeus")
+
+# --------------------------
+# Charm data
+# --------------------------
+charm_categories = {
+    "Infantry": ["Charm I", "Charm II", "Charm III", "Charm IV", "Charm V", "Charm VI"],
+    "Archer": ["Charm I", "Charm II", "Charm III", "Charm IV", "Charm V", "Charm VI"],
+    "Cavalry": ["Charm I", "Charm II", "Charm III", "Charm IV", "Charm V", "Charm VI"],
+}
+
+charm_priority = ["Infantry", "Archer", "Cavalry"]
+
+# --------------------------
+# Gov gear data
+# --------------------------
+gov_gear_items = ["Cap", "Watch", "Coat", "Trousers", "Belt", "Weapon"]
+
+
+# --------------------------
+# Compiled tables
+# --------------------------
+class CostTable:
+    """
+    An ordered chain of levels compiled into prefix sums.
+
+    `steps[res][i]` is the cost of going from level i to level i + 1 and
+    `prefix[res][i]` is the total cost of reaching level i from level 0, so
+    the cost of any current→target range is `prefix[t] - prefix[c]`.
+
+    Tables are shared by every session and worker thread on their game
+    version, so they hold tuples and read-only mappings and never change.
+    """
+
+    def __init__(self, chain):
+        self.levels = tuple(chain["levels"])
+        self.index = MappingProxyType({name: i for i, name in enumerate(self.levels)})
+        self.resources = tuple(chain["resources"])
+        self.max_index = len(self.levels) - 1
+        self.steps = MappingProxyType({res: tuple(values) for res, values in chain["steps"].items()})
+        self.prefix = MappingProxyType({res: tuple(values) for res, values in chain["prefix"].items()})
+
+    def idx(self, level):
+        """Index of a level given either its name or its position."""
+        if isinstance(level, int):
+            return level
+        return self.index[level]
+
+    def cost(self, current, target):
+        """Resources and points needed to go from current to target."""
+        c = self.idx(current)
+        t = self.idx(target)
+        if t < c:
+            t = c
+        return {res: prefix[t] - prefix[c] for res, prefix in self.prefix.items()}
+
+
+class GameTables:
+    """Every table of one game version, built once and never changed."""
+
+    def __init__(self, data):
+        heroes, charms, gear = data["heroes"], data["charms"], data["gov_gear"]
+        self.version = data["version"]
+        # Shards needed to reach each hero level from the one before it
+        self.step_costs = MappingProxyType(dict(heroes["step_costs"]))
+        self.levels_ordered = tuple(heroes["levels"])
+        self.points_per_shard = MappingProxyType(dict(heroes["points_per_shard"]))
+        # Charm levels, designs/guides per level-up and points per level reached
+        self.levels = tuple(charms["levels"])
+        self.level_requirements = MappingProxyType(dict(charms["level_requirements"]))
+        self.points_per_level = MappingProxyType(dict(charms["points_per_level"]))
+        # Gov gear rarities, materials per upgrade and points per rarity reached
+        self.rarities = tuple(gear["rarities"])
+        self.gov_gear_requirements = MappingProxyType(dict(gear["requirements"]))
+        self.points_per_rarity = MappingProxyType(dict(gear["points_per_rarity"]))
+        self.hero_table = CostTable(heroes["table"])
+        self.charm_table = CostTable(charms["table"])
+        self.gear_table = CostTable(gear["table"])
+        # Cumulative total shards for each level, by name
+        self.cumulative_cost = MappingProxyType(dict(zip(self.levels_ordered, self.hero_table.prefix["shards"])))
+
+
+# --------------------------
+# Game versions
+# --------------------------
+# Each version is loaded once into its own `GameTables`. Which one a
+# calculation reads is the active version of the calling thread (the app
+# sets it per session, background jobs inherit it from their submitter);
+# it defaults to `DEFAULT_VERSION`, picked by the operator through
+# `KVK_GAME_VERSION` (the latest data file otherwise).
+_loaded = {}
+_load_lock = threading.Lock()
+_active_version = ContextVar("kvk_game_version", default=None)
+
+
+def game_tables(version=None):
+    """
+    Tables of `version`, or of the active version, loaded on first use.
+
+    An unknown version or invalid data raises `GameDataError`.
+    """
+    version = version or active_version()
+    tables = _loaded.get(version)
+    if tables is None:
+        with _load_lock:
+            tables = _loaded.get(version)
+            if tables is None:
+                data = gamedata.load(version)
+                missing = [c for c in categories if c not in data["heroes"]["points_per_shard"]]
+                if missing:
+                    raise GameDataError(
+                        f"Game data {version}: heroes.points_per_shard is missing {', '.join(missing)}"
+                    )
+                tables = _loaded[version] = GameTables(data)
+    return tables
+
+
+def active_version():
+    """Game version the calling thread calculates with."""
+    return _active_version.get() or DEFAULT_VERSION
+
+
+def use_game_version(version):
+    """
+    Make `version` the active game version of the calling thread (and of
+    background jobs it submits) and return its tables. Other sessions and
+    threads keep their own. Raises `GameDataError`, leaving the active
+    version unchanged, if the version can't be loaded.
+    """
+    tables = game_tables(version)
+    _active_version.set(tables.version)
+    return tables
+
+
+def per_version(build):
+    """
+    Decorator for tables derived from the game data: `build(tables)` runs
+    once per version, and the decorated function returns the result for
+    `version` (the active one by default).
+    """
+    results = {}
+    lock = threading.Lock()
+
+    @wraps(build)
+    def get(version=None):
+        tables = game_tables(version)
+        result = results.get(tables.version)
+        if result is None:
+            with lock:
+                result = results.get(tables.version)
+                if result is None:
+                    result = results[tables.version] = build(tables)
+        return result
+
+    return get
+
+
+DEFAULT_VERSION = gamedata.default_version()
+game_tables(DEFAULT_VERSION)
+
+
+# --------------------------
+# Game data
+# --------------------------
+# Stand-ins for the active version's `CostTable`s, so modules can import
+# them by name and every lookup reads the calling thread's version. The
+# other tables are on `game_tables()`, and code that keys a cache on a table
+# takes the real one from there as well.
+class _ActiveTable:
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(getattr(game_tables(), self._name), attr)
+
+    def __repr__(self):
+        return f"<active {self._name}>"
+
+
+HERO_TABLE = _ActiveTable("hero_table")
+CHARM_TABLE = _ActiveTable("charm_table")
+GEAR_TABLE = _ActiveTable("gear_table")
+
+
+# --------------------------
+# Roster naming
+# --------------------------
+# Per-player records (roster files, CLI input) use the same
+# `<name>_current` / `<name>_target` keys as the app's session state.
+def hero_names():
+    return [hero for heroes in categories.values() for hero in heroes]
+
+
+def charm_names():
+    return [f"{cat}_{charm}" for cat, charms in charm_categories.items() for charm in charms]
+
+
+# --------------------------
+# Hero queries
+# --------------------------
+def get_level_from_total_shards(total_shards):
+    """Highest level reachable with a total number of shards."""
+    table = game_tables().hero_table
+    i = bisect_right(table.prefix["shards"], total_shards) - 1
+    return table.levels[max(i, 0)]
+
+
+def shards_needed(current, target):
+    table = game_tables().hero_table
+    prefix = table.prefix["shards"]
+    return max(prefix[table.idx(target)] - prefix[table.idx(current)], 0)
+
+
+def hero_points(category, shards):
+    return shards * game_tables().points_per_shard.get(category, 0)
+
+
+# --------------------------
+# Charm queries
+# --------------------------
+def items_needed(current, target):
+    """Designs, guides and points to take a charm from current to target."""
+    c = int(current)
+    t = max(int(target), c)
+    prefix = game_tables().charm_table.prefix
+    return {
+        "designs": prefix["designs"][t] - prefix["designs"][c],
+        "guides": prefix["guides"][t] - prefix["guides"][c],
+        "points": prefix["points"][t] - prefix["points"][c],
+    }
+
+
+def max_levels_global(current_levels_all, total_designs, total_guides, charm_categories_priority):
+    """
+    Allocate resources across all charms to maximize points:
+    - Always upgrade the globally lowest-level charms first
+    - Tie-breaker: category priority (Infantry > Archer > Cavalry)
+    """
+    table = game_tables().charm_table
+    steps_d = table.steps["designs"]
+    steps_g = table.steps["guides"]
+    steps_p = table.steps["points"]
+    max_level = table.max_index
+
+    # Work on integer levels in priority order and convert back at the end
+    keys = [f"{cat}_{charm}" for cat in charm_categories_priority for charm in charm_categories[cat]]
+    cur = [int(current_levels_all[key]) for key in keys]
+    designs = total_designs
+    guides = total_guides
+    total_points = 0
+
+    upgrade_possible = True
+    while upgrade_possible:
+        upgrade_possible = False
+        min_level = min(cur)
+        if min_level >= max_level:
+            break
+        for i, lvl in enumerate(cur):
+            if lvl != min_level:
+                continue
+            if designs >= steps_d[lvl] and guides >= steps_g[lvl]:
+                cur[i] = lvl + 1
+                designs -= steps_d[lvl]
+                guides -= steps_g[lvl]
+                total_points += steps_p[lvl]
+                upgrade_possible = True
+
+    final_levels = current_levels_all.copy()
+    for key, lvl in zip(keys, cur):
+        final_levels[key] = str(lvl)
+    return final_levels, {"designs": designs, "guides": guides}, total_points
+
+
+# --------------------------
+# Gov gear queries
+# --------------------------
+def materials_needed(current, target):
+    """Threads, satins, papers and points to take an item from current to target."""
+    return game_tables().gear_table.cost(current, target)
+
+
+def max_rarity_from_resources(current, threads, satins, papers):
+    """Greedy allocation: upgrade the item that gives most points per resource."""
+    table = game_tables().gear_table
+    steps = table.steps
+    max_index = table.max_index
+    # Combined resource count per step, as the greedy ratio uses it
+    step_total = [t + s + p for t, s, p in zip(steps["threads"], steps["satins"], steps["papers"])]
+
+    items = list(current)
+    idx = [table.index[current[item]] for item in items]
+    left = [threads, satins, papers]
+    total_points = 0
+
+    while True:
+        best = -1
+        best_value = 0
+        for i, lvl in enumerate(idx):
+            if lvl >= max_index:
+                continue
+            if (left[0] >= steps["threads"][lvl] and
+                    left[1] >= steps["satins"][lvl] and
+                    left[2] >= steps["papers"][lvl]):
+                value = steps["points"][lvl] / (step_total[lvl] or 1)
+                if value > best_value:
+                    best_value = value
+                    best = i
+        if best < 0:
+            break
+        lvl = idx[best]
+        left[0] -= steps["threads"][lvl]
+        left[1] -= steps["satins"][lvl]
+        left[2] -= steps["papers"][lvl]
+        total_points += steps["points"][lvl]
+        idx[best] = lvl + 1
+
+    final_levels = {item: table.levels[i] for item, i in zip(items, idx)}
+    resources_left = {"threads": left[0], "satins": left[1], "papers": left[2]}
+    return final_levels, resources_left, total_points
@@ -0,0 +1,140 @@
+"""Monte Carlo forecast of when the targets are reached from daily income.
+
+Each resource's daily income is drawn from a normal distribution (mean and
+spread per day, clipped at zero and rounded to whole units) for every trial
+and day at once, and a cumulative sum along the days gives a trials × days
+array of what has come in by each day. Targets are paid for in order
+(heroes, then charms, then gov gear, as listed in their tabs), so a target
+is reached on the first day the cumulative income covers it and everything
+before it that draws on the same resources.
+
+Every row of the cumulative array is non-decreasing, so offsetting each row
+past the end of the previous one turns the whole array into one sorted
+vector, and a single `searchsorted` finds the crossing day of every
+(trial, target) pair. Nothing loops over days or trials in Python.
+"""
+
+from engine import (
+    categories, charm_names, game_tables, gov_gear_items, items_needed, materials_needed,
+)
+from planner import RESOURCES
+
+PERCENTILES = (10, 50, 90)
+DEFAULT_TRIALS = 10_000
+DEFAULT_DAYS = 365
+
+
+def target_costs(current, target):
+    """
+    Resources still needed by every item with a target above its current
+    level, in the order they are paid for.
+
+    Returns a list of {"name", "kind", "cost": {resource: amount}}.
+    """
+    targets = []
+    cumulative_cost = game_tables().cumulative_cost
+    for category, heroes in categories.items():
+        for hero in heroes:
+            cur = current.get(hero)
+            shards = cumulative_cost[target.get(hero, cur)] - cumulative_cost[cur]
+            if shards > 0:
+                targets.append({"name": hero, "kind": f"{category} Hero", "cost": {f"{category.lower()}_shards": shards}})
+    for name in charm_names():
+        cost = items_needed(current[name], target.get(name, current[name]))
+        cost = {res: cost[res] for res in ("designs", "guides") if cost[res] > 0}
+        if cost:
+            targets.append({"name": name, "kind": "Charm", "cost": cost})
+    for item in gov_gear_items:
+        cost = materials_needed(current[item], target.get(item, current[item]))
+        cost = {res: cost[res] for res in ("threads", "satins", "papers") if cost[res] > 0}
+        if cost:
+            targets.append({"name": item, "kind": "Gov Gear", "cost": cost})
+    return targets
+
+
+def _crossing_days(rng, mean, spread, stock, thresholds, income, cum):
+    """
+    (trials × thresholds) first day on which the cumulative income plus
+    `stock` reaches each threshold; day 0 is today, `days + 1` is never.
+
+    `income` (float32, trials × days) and `cum` (int64, trials × days + 1)
+    are scratch buffers, reused across resources.
+    """
+    import numpy as np
+
+    trials, days = income.shape
+    if spread > 0:
+        rng.standard_normal(dtype=np.float32, out=income)
+        income *= spread
+        income += mean
+        np.maximum(income, 0, out=income)
+        np.rint(income, out=income)
+    else:
+        income.fill(round(mean))
+    cum[:, 0] = 0
+    np.cumsum(income, axis=1, dtype=np.int64, out=cum[:, 1:])
+    cum += stock
+
+    # Shift every row above the one before it, so the flattened array is
+    # sorted and one search covers all trials; thresholds past the largest
+    # total land on the next row's start and read as never
+    span = int(cum[:, -1].max()) + 1
+    offsets = np.arange(trials, dtype=np.int64) * span
+    cum += offsets[:, None]
+    queries = np.minimum(np.asarray(thresholds, dtype=np.int64), span)[None, :] + offsets[:, None]
+    positions = np.searchsorted(cum.ravel(), queries, side="left")
+    return positions - (np.arange(trials, dtype=np.int64) * (days + 1))[:, None]
+
+
+def forecast(targets, income, stock=None, trials=DEFAULT_TRIALS, days=DEFAULT_DAYS, seed=None):
+    """
+    Days until each target is reached, over `trials` simulated incomes.
+
+    `targets` is the output of `target_costs`. `income` maps keys of
+    `RESOURCES` to a daily (mean, spread) and `stock` to what is on hand
+    today. Returns a dict with, per target and for "all" of them together,
+    the day each of `PERCENTILES` is reached by (None if not within `days`)
+    and the "chance" of finishing within `days`, plus "finished": the share
+    of trials with every target done by each day from 0 to `days`.
+    """
+    # Only needed for a forecast; keeps NumPy off the app's startup path
+    import numpy as np
+
+    stock = stock or {}
+    rng = np.random.default_rng(seed)
+    trials = max(int(trials), 1)
+    days = max(int(days), 1)
+    reached = np.zeros((trials, len(targets)), dtype=np.int64)
+    income_buffer = np.empty((trials, days), dtype=np.float32)
+    cum_buffer = np.empty((trials, days + 1), dtype=np.int64)
+    for res in RESOURCES:
+        users = [i for i, target in enumerate(targets) if target["cost"].get(res)]
+        if not users:
+            continue
+        # Paid in order: each target needs everything before it as well
+        thresholds = np.cumsum([targets[i]["cost"][res] for i in users])
+        mean, spread = income.get(res, (0, 0))
+        crossing = _crossing_days(
+            rng, max(mean, 0), max(spread, 0), int(stock.get(res, 0)), thresholds, income_buffer, cum_buffer
+        )
+        np.maximum(reached[:, users], crossing, out=crossing)
+        reached[:, users] = crossing
+
+    done = reached.max(axis=1) if targets else np.zeros(trials, dtype=np.int64)
+    columns = np.column_stack([reached, done])
+    # "higher" keeps percentiles on whole days that some trial hit
+    values = np.percentile(columns, PERCENTILES, axis=0, method="higher")
+    chances = np.mean(columns <= days, axis=0)
+    summaries = [
+        {
+            "percentiles": {p: (int(v) if v <= days else None) for p, v in zip(PERCENTILES, values[:, i])},
+            "chance": float(chances[i]),
+        }
+        for i in range(len(targets) + 1)
+    ]
+
+    out = {"days": days, "trials": trials}
+    out["targets"] = [dict(target, **summary) for target, summary in zip(targets, summaries)]
+    out["all"] = summaries[-1]
+    out["finished"] = np.cumsum(np.bincount(np.minimum(done, days + 1), minlength=days + 2)[:days + 1]) / trials
+    return out
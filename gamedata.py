@@ -0,0 +1,303 @@
+"""Versioned game data: cost and points tables, one JSON file per game patch.
+
+Each patch is `gamedata/<version>.json` with three sections:
+
+    heroes    levels, step_costs (shards to reach each level from the one
+              before it; the first level's entry is the recruit cost) and
+              points_per_shard per hero category
+    charms    levels ("0", "1", ...), level_requirements ("l→l+1": designs
+              and guides) and points_per_level
+    gov_gear  rarities, requirements ("a→b": threads, satins, papers) and
+              points_per_rarity
+
+A file is validated once (unique levels, hero levels in star-tier order,
+every transition present, no stray keys, whole non-negative amounts, so
+no prefix sum can drop along a chain) and compiled into per-chain tuples
+of step costs and prefix sums. The compiled tables are pickled under
+`gamedata/.cache`, keyed by the file's SHA-256, so later starts skip
+parsing and validation until the file changes. The data directory can be
+moved with `KVK_GAMEDATA_DIR`, and `KVK_GAME_VERSION` picks the default
+version (the latest one otherwise).
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+
+GAMEDATA_DIR = os.environ.get(
+    "KVK_GAMEDATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "gamedata"),
+)
+
+# Bump whenever the compiled layout or the validation changes, so stale
+# caches are ignored
+FORMAT = 2
+
+HERO_RESOURCES = ("shards",)
+CHARM_RESOURCES = ("designs", "guides")
+GEAR_RESOURCES = ("threads", "satins", "papers")
+
+
+class GameDataError(ValueError):
+    """A game data file is missing or does not describe valid tables."""
+
+
+# --------------------------
+# Versions
+# --------------------------
+def _version_key(version):
+    """Sort key that orders "1.10" after "1.9"."""
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"[.\-]", version)]
+
+
+def available_versions(path=None):
+    """Versions with a data file, oldest first."""
+    path = path or GAMEDATA_DIR
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return []
+    return sorted((name[:-5] for name in names if name.endswith(".json")), key=_version_key)
+
+
+def default_version(path=None):
+    """`KVK_GAME_VERSION` if set, otherwise the latest version."""
+    versions = available_versions(path)
+    version = os.environ.get("KVK_GAME_VERSION")
+    if version:
+        return version
+    if not versions:
+        raise GameDataError(f"No game data files in {path or GAMEDATA_DIR}")
+    return versions[-1]
+
+
+# --------------------------
+# Validation
+# --------------------------
+def _section(data, name):
+    section = data.get(name)
+    if not isinstance(section, dict):
+        raise GameDataError(f"Missing '{name}' section")
+    return section
+
+
+def _levels(section, where, key):
+    levels = section.get(key)
+    if not isinstance(levels, list) or len(levels) < 2:
+        raise GameDataError(f"{where}.{key} must list at least two levels")
+    seen = set()
+    for level in levels:
+        if not isinstance(level, str) or not level:
+            raise GameDataError(f"{where}.{key} has a level that is not a name: {level!r}")
+        if level in seen:
+            raise GameDataError(f"{where}.{key} lists '{level}' twice")
+        seen.add(level)
+    return levels
+
+
+def _amount(value, where):
+    # bool is an int subclass, but true/false is never a cost
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise GameDataError(f"{where} must be a whole number >= 0, not {value!r}")
+    return value
+
+
+def _entries(section, where, key, expected):
+    """`section[key]` checked to have exactly the `expected` keys."""
+    mapping = section.get(key)
+    if not isinstance(mapping, dict):
+        raise GameDataError(f"Missing {where}.{key}")
+    missing = [name for name in expected if name not in mapping]
+    if missing:
+        raise GameDataError(f"{where}.{key} is missing {', '.join(repr(m) for m in missing)}")
+    extra = [name for name in mapping if name not in expected]
+    if extra:
+        raise GameDataError(f"{where}.{key} has unknown entries {', '.join(repr(e) for e in extra)}")
+    return mapping
+
+
+def _costs(value, where, resources):
+    if not isinstance(value, dict) or set(value) != set(resources):
+        raise GameDataError(f"{where} must give exactly {', '.join(resources)}")
+    return {res: _amount(value[res], f"{where}.{res}") for res in resources}
+
+
+def _transitions(levels):
+    return [f"{a}→{b}" for a, b in zip(levels, levels[1:])]
+
+
+def _star_tier(level):
+    """(stars, tier) of a hero level such as "2-3", or None."""
+    match = re.fullmatch(r"(\d+)-(\d+)", level)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def validate(data):
+    """Raise `GameDataError` unless `data` is a well-formed game data file."""
+    if not isinstance(data, dict):
+        raise GameDataError("Game data must be a JSON object")
+
+    heroes = _section(data, "heroes")
+    hero_levels = _levels(heroes, "heroes", "levels")
+    # After the unrecruited level come "stars-tier" levels, lowest first
+    order = [_star_tier(level) for level in hero_levels[1:]]
+    for level, key in zip(hero_levels[1:], order):
+        if key is None:
+            raise GameDataError(f"heroes.levels has '{level}', expected \"stars-tier\" such as \"1-0\"")
+    for level, before, after in zip(hero_levels[2:], order, order[1:]):
+        if after <= before:
+            raise GameDataError(f"heroes.levels lists '{level}' out of order")
+    for level, value in _entries(heroes, "heroes", "step_costs", hero_levels).items():
+        _amount(value, f"heroes.step_costs['{level}']")
+    per_shard = heroes.get("points_per_shard")
+    if not isinstance(per_shard, dict) or not per_shard:
+        raise GameDataError("Missing heroes.points_per_shard")
+    for category, value in per_shard.items():
+        _amount(value, f"heroes.points_per_shard['{category}']")
+
+    charms = _section(data, "charms")
+    charm_levels = _levels(charms, "charms", "levels")
+    # Charm levels are plain numbers counting up from 0
+    if charm_levels != [str(i) for i in range(len(charm_levels))]:
+        raise GameDataError("charms.levels must count up from \"0\" one level at a time")
+    for key, value in _entries(charms, "charms", "level_requirements", _transitions(charm_levels)).items():
+        _costs(value, f"charms.level_requirements['{key}']", CHARM_RESOURCES)
+    for level, value in _entries(charms, "charms", "points_per_level", charm_levels[1:]).items():
+        _amount(value, f"charms.points_per_level['{level}']")
+
+    gear = _section(data, "gov_gear")
+    rarities = _levels(gear, "gov_gear", "rarities")
+    for key, value in _entries(gear, "gov_gear", "requirements", _transitions(rarities)).items():
+        _costs(value, f"gov_gear.requirements['{key}']", GEAR_RESOURCES)
+    for rarity, value in _entries(gear, "gov_gear", "points_per_rarity", rarities[1:]).items():
+        _amount(value, f"gov_gear.points_per_rarity['{rarity}']")
+
+
+# --------------------------
+# Compiling
+# --------------------------
+def _chain(levels, resources, step_rows, step_points, base=None):
+    """
+    Levels, per-step costs and prefix sums of one chain, as tuples.
+
+    `base` adds a fixed amount per resource to every prefix (the hero
+    recruit cost).
+    """
+    steps = {res: tuple(row[res] for row in step_rows) for res in resources}
+    steps["points"] = tuple(step_points)
+    prefix = {}
+    for res, values in steps.items():
+        running = (base or {}).get(res, 0)
+        out = [running]
+        for value in values:
+            running += value
+            out.append(running)
+        prefix[res] = tuple(out)
+    return {"levels": tuple(levels), "resources": tuple(resources), "steps": steps, "prefix": prefix}
+
+
+def compile_tables(data):
+    """Compiled tables of validated data, plus the name-keyed dicts."""
+    heroes, charms, gear = data["heroes"], data["charms"], data["gov_gear"]
+    hero_levels = heroes["levels"]
+    step_costs = heroes["step_costs"]
+    charm_levels = charms["levels"]
+    charm_points = {int(level): value for level, value in charms["points_per_level"].items()}
+    rarities = gear["rarities"]
+
+    return {
+        "heroes": {
+            "levels": list(hero_levels),
+            "step_costs": dict(step_costs),
+            "points_per_shard": dict(heroes["points_per_shard"]),
+            "table": _chain(
+                hero_levels,
+                HERO_RESOURCES,
+                [{"shards": step_costs[level]} for level in hero_levels[1:]],
+                [0] * (len(hero_levels) - 1),
+                # Recruiting carries a cost of its own, folded into every prefix
+                base={"shards": step_costs[hero_levels[0]]},
+            ),
+        },
+        "charms": {
+            "levels": list(charm_levels),
+            "level_requirements": dict(charms["level_requirements"]),
+            "points_per_level": charm_points,
+            "table": _chain(
+                charm_levels,
+                CHARM_RESOURCES,
+                [charms["level_requirements"][key] for key in _transitions(charm_levels)],
+                [charm_points[lvl] for lvl in range(1, len(charm_levels))],
+            ),
+        },
+        "gov_gear": {
+            "rarities": list(rarities),
+            "requirements": dict(gear["requirements"]),
+            "points_per_rarity": dict(gear["points_per_rarity"]),
+            "table": _chain(
+                rarities,
+                GEAR_RESOURCES,
+                [gear["requirements"][key] for key in _transitions(rarities)],
+                [gear["points_per_rarity"][rarity] for rarity in rarities[1:]],
+            ),
+        },
+    }
+
+
+# --------------------------
+# Loading
+# --------------------------
+def _cache_path(path, version, digest):
+    return os.path.join(path, ".cache", f"{version}-{digest[:16]}.pickle")
+
+
+def _write_cache(cache, compiled):
+    """Store compiled tables atomically; a read-only data directory is fine."""
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        tmp = f"{cache}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(compiled, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError:
+        pass
+
+
+def load(version, path=None):
+    """
+    Compiled tables of one game version, from the cache when the file is
+    unchanged. Raises `GameDataError` for an unknown version or bad data.
+    """
+    path = path or GAMEDATA_DIR
+    if not version or os.sep in version or version.startswith("."):
+        raise GameDataError(f"Invalid game version {version!r}")
+    try:
+        with open(os.path.join(path, f"{version}.json"), "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        raise GameDataError(f"Unknown game version '{version}'") from None
+
+    digest = hashlib.sha256(raw + f"\0{FORMAT}".encode()).hexdigest()
+    cache = _cache_path(path, version, digest)
+    try:
+        with open(cache, "rb") as f:
+            compiled = pickle.load(f)
+        if compiled.get("sha256") == digest:
+            return compiled
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+
+    try:
+        data = json.loads(raw.decode("utf-8"))
+    except ValueError as exc:
+        raise GameDataError(f"Game data {version}: not valid JSON ({exc})") from None
+    try:
+        validate(data)
+    except GameDataError as exc:
+        raise GameDataError(f"Game data {version}: {exc}") from None
+    compiled = compile_tables(data)
+    compiled.update(version=version, sha256=digest, description=data.get("description", ""))
+    _write_cache(cache, compiled)
+    return compiled
@@ -0,0 +1,88 @@
+"""Gov gear budget sweeps: the exact optimum over a whole grid of budgets.
+
+Since every gov gear item follows the same chain, a plan is fully described
+by the sorted multiset of final rarities, and with six items there are at
+most C(24, 6) = 134,596 of them. They are enumerated once per set of current
+rarities as NumPy arrays of (threads, satins, papers, points). A papers
+slice of the sweep drops every plan that needs more papers, bins the rest
+onto the threads × satins grid at the first budget that affords them, and
+a running maximum along both axes then gives every cell the best plan any
+smaller budget can afford, so the whole grid costs one pass over the plans
+instead of one optimizer call per cell.
+"""
+
+from functools import lru_cache
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from engine import game_tables
+
+
+@lru_cache(maxsize=8)
+def _plans(table, starts):
+    """
+    Every reachable multiset of final levels for sorted start levels on a
+    version's gov gear `table`.
+
+    Returns (ends, threads, satins, papers, points), with `ends` a
+    (plans × items) array of sorted final level indices and the rest the
+    cost and points of each plan relative to the starts.
+    """
+    n = len(starts)
+    levels = range(table.max_index + 1)
+    ends = np.array(list(combinations_with_replacement(levels, n)), dtype=np.int16).reshape(-1, n)
+    # The k-th lowest item can only end at or above the k-th lowest start
+    ends = ends[(ends >= np.array(starts)).all(axis=1)]
+    out = [ends]
+    for res in ("threads", "satins", "papers", "points"):
+        prefix = np.asarray(table.prefix[res], dtype=np.int64)
+        out.append(prefix[ends].sum(axis=1) - prefix[list(starts)].sum())
+    return tuple(out)
+
+
+def sweep(current, threads_grid, satins_grid, papers):
+    """
+    Best plan for every (satins, threads) budget pair at a fixed `papers`.
+
+    `threads_grid` and `satins_grid` are increasing budget values. Returns a
+    dict with "points" (satins × threads array of optimal points) and
+    "plan" (index of the chosen plan per cell, for `final_rarities`).
+    """
+    items = list(current)
+    table = game_tables().gear_table
+    starts = tuple(sorted(table.index[current[item]] for item in items))
+    ends, threads, satins, papers_cost, points = _plans(table, starts)
+
+    threads_grid = np.asarray(threads_grid, dtype=np.int64)
+    satins_grid = np.asarray(satins_grid, dtype=np.int64)
+    keep = (papers_cost <= papers) & (threads <= threads_grid[-1]) & (satins <= satins_grid[-1])
+    plan_ids = np.flatnonzero(keep)
+
+    # First grid column / row whose budget covers each plan
+    col = np.searchsorted(threads_grid, threads[plan_ids], side="left")
+    row = np.searchsorted(satins_grid, satins[plan_ids], side="left")
+
+    # Pack points and plan index into one key so a single max picks both.
+    # The empty plan costs nothing, so every cell ends up with some plan.
+    scale = len(points)
+    keys = points[plan_ids] * scale + plan_ids
+    grid = np.full((len(satins_grid), len(threads_grid)), -1, dtype=np.int64)
+    np.maximum.at(grid, (row, col), keys)
+    np.maximum.accumulate(grid, axis=0, out=grid)
+    np.maximum.accumulate(grid, axis=1, out=grid)
+    return {"points": grid // scale, "plan": grid % scale, "starts": starts, "table": table}
+
+
+def _ranks(table, current):
+    """Position of each item among the sorted starts."""
+    # Same rule as the optimizers: higher current rarity, higher final one
+    items = list(current)
+    order = sorted(items, key=lambda item: table.index[current[item]])
+    return {item: rank for rank, item in enumerate(order)}
+
+
+def rarity_grid(current, result, item):
+    """Final rarity index of one item for every cell of a sweep."""
+    ends = _plans(result["table"], result["starts"])[0]
+    return ends[result["plan"], _ranks(result["table"], current)[item]]
@@ -0,0 +1,289 @@
+"""Append-only history of player progress, stored column by column.
+
+Each snapshot records when it was taken, the KvK season, the player, the
+current level index of every hero, charm and gov gear item and the KvK
+prep points those levels are worth. Every column is its own flat binary
+file of fixed-width values under the history directory, with `schema.json`
+naming the column files and `players.txt` listing player IDs once each
+(snapshots store the line number). Recording a snapshot appends one value
+to every column file.
+
+Reads memory-map the column files, so loading the history costs nothing
+up front and an aggregate only pages in the columns it touches. That is
+typically the player, time and points columns, never the per-item levels.
+The history lives next to the app unless `KVK_HISTORY_DIR` points
+elsewhere.
+
+Items added to the game data later get a new column, back-filled with the
+lowest level for earlier snapshots. A snapshot cut short by a crash is
+dropped: the row count is the length of the shortest column, and the next
+append trims the longer ones back to it first.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from engine import categories, charm_names, gov_gear_items, per_version
+from cli import ID_FIELD, read_level
+
+HISTORY_DIR = os.environ.get(
+    "KVK_HISTORY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "history"),
+)
+
+DAY = 24 * 60 * 60
+POINT_COLUMNS = ("hero_points", "charm_points", "gear_points")
+
+_lock = threading.Lock()
+
+
+@per_version
+def _item_groups(tables):
+    """(column, names, table, points per level index) for heroes, charms and gear."""
+    hero_table, charm_table, gear_table = tables.hero_table, tables.charm_table, tables.gear_table
+    hero_points = []
+    hero_items = []
+    for category, heroes in categories.items():
+        for hero in heroes:
+            hero_items.append(hero)
+            hero_points.append([s * tables.points_per_shard.get(category, 0) for s in hero_table.prefix["shards"]])
+    return [
+        ("hero_points", hero_items, hero_table, np.array(hero_points, dtype=np.int64)),
+        ("charm_points", charm_names(), charm_table, np.array(charm_table.prefix["points"], dtype=np.int64)),
+        ("gear_points", gov_gear_items, gear_table, np.array(gear_table.prefix["points"], dtype=np.int64)),
+    ]
+
+
+# Column name -> dtype, in schema order
+COLUMNS = {"time": "<i8", "season": "<u2", "player": "<u4"}
+COLUMNS.update((name, "<i8") for name in POINT_COLUMNS)
+COLUMNS.update((f"level:{name}", "u1") for _, names, _, _ in _item_groups() for name in names)
+
+
+# --------------------------
+# Files
+# --------------------------
+def _schema_path(path):
+    return os.path.join(path, "schema.json")
+
+
+def _players_path(path):
+    return os.path.join(path, "players.txt")
+
+
+def _load_schema(path):
+    """{column: file name} of the history at `path`; call with `_lock` held."""
+    try:
+        with open(_schema_path(path), encoding="utf-8") as f:
+            files = json.load(f)["files"]
+    except FileNotFoundError:
+        os.makedirs(path, exist_ok=True)
+        files = {}
+
+    missing = [name for name in COLUMNS if name not in files]
+    if missing:
+        rows = _row_count(path, files)
+        for name in missing:
+            files[name] = f"c{len(files)}.bin"
+            # Earlier snapshots predate this column: lowest level, zero points
+            with open(os.path.join(path, files[name]), "wb") as f:
+                f.write(np.zeros(rows, dtype=COLUMNS[name]).tobytes())
+        tmp = _schema_path(path) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": files}, f, indent=1)
+        os.replace(tmp, _schema_path(path))
+    return files
+
+
+def _row_count(path, files):
+    """Complete snapshots: the length of the shortest column."""
+    counts = [
+        os.path.getsize(os.path.join(path, file)) // np.dtype(COLUMNS[name]).itemsize
+        for name, file in files.items()
+        if name in COLUMNS
+    ]
+    return min(counts) if counts else 0
+
+
+def _player_ids(path):
+    try:
+        with open(_players_path(path), encoding="utf-8") as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+
+# --------------------------
+# Recording
+# --------------------------
+def record_snapshots(states, season, when=None, path=None):
+    """
+    Append one snapshot per (player ID, state) pair, where a state is any
+    mapping with `<name>_current` levels (`st.session_state`, a roster row).
+    Returns the number of snapshots recorded.
+    """
+    path = path or HISTORY_DIR
+    when = int(time.time() if when is None else when)
+    states = [(str(player_id).strip(), state) for player_id, state in states]
+    if not states:
+        return 0
+    for player_id, _ in states:
+        # players.txt is read back with splitlines, which also splits on
+        # \r, \x0b, \x1c, \u2028 and the like
+        if len(player_id.splitlines()) != 1:
+            raise ValueError("Player ID must be a non-empty single line")
+
+    columns = {
+        "time": np.full(len(states), when, dtype=COLUMNS["time"]),
+        "season": np.full(len(states), int(season), dtype=COLUMNS["season"]),
+    }
+    for points_column, names, table, points in _item_groups():
+        levels = np.array(
+            [
+                [table.index[read_level(state, f"{name}_current", table.index, table.levels[0])] for name in names]
+                for _, state in states
+            ],
+            dtype=np.intp,
+        ).reshape(len(states), len(names))
+        for i, name in enumerate(names):
+            columns[f"level:{name}"] = levels[:, i].astype(COLUMNS[f"level:{name}"])
+        if points.ndim == 2:
+            # Heroes: one points table per hero, since categories differ
+            columns[points_column] = points[np.arange(len(names)), levels].sum(axis=1)
+        else:
+            columns[points_column] = points[levels].sum(axis=1)
+
+    with _lock:
+        files = _load_schema(path)
+        known = _player_ids(path)
+        index = {player_id: i for i, player_id in enumerate(known)}
+        new = []
+        for player_id, _ in states:
+            if player_id not in index:
+                index[player_id] = len(known) + len(new)
+                new.append(player_id)
+        if new:
+            with open(_players_path(path), "a", encoding="utf-8") as f:
+                f.write("".join(f"{player_id}\n" for player_id in new))
+        columns["player"] = np.array([index[player_id] for player_id, _ in states], dtype=COLUMNS["player"])
+
+        rows = _row_count(path, files)
+        for name, file in files.items():
+            if name not in COLUMNS:
+                continue
+            with open(os.path.join(path, file), "ab") as f:
+                # Drop the tail of a snapshot a crash left half written
+                f.truncate(rows * np.dtype(COLUMNS[name]).itemsize)
+                f.write(np.ascontiguousarray(columns[name], dtype=COLUMNS[name]).tobytes())
+    return len(states)
+
+
+def record_snapshot(player_id, state, season, when=None, path=None):
+    """Append one snapshot of `state` for `player_id`."""
+    return record_snapshots([(player_id, state)], season, when, path)
+
+
+def record_roster(records, season, when=None, path=None):
+    """Append one snapshot per roster row, keyed by its player ID column."""
+    return record_snapshots(((record.get(ID_FIELD, ""), record) for record in records), season, when, path)
+
+
+# --------------------------
+# Reading
+# --------------------------
+def load_columns(names=None, path=None):
+    """
+    Read-only memory-mapped arrays for the given columns (all by default),
+    plus the player ID list under "players".
+    """
+    path = path or HISTORY_DIR
+    with _lock:
+        if not os.path.exists(_schema_path(path)):
+            files, rows = {}, 0
+        else:
+            files = _load_schema(path)
+            rows = _row_count(path, files)
+        players = _player_ids(path)
+    out = {"players": players}
+    for name in names or COLUMNS:
+        dtype = np.dtype(COLUMNS[name])
+        if rows == 0:
+            out[name] = np.zeros(0, dtype=dtype)
+        else:
+            out[name] = np.memmap(os.path.join(path, files[name]), dtype=dtype, mode="r", shape=(rows,))
+    return out
+
+
+def player_history(player_id, season=None, path=None):
+    """
+    Snapshots of one player, oldest first: "time", "season", the per-tab
+    points columns and their "total".
+    """
+    cols = load_columns(["time", "season", "player", *POINT_COLUMNS], path)
+    try:
+        player = cols["players"].index(str(player_id).strip())
+    except ValueError:
+        rows = np.zeros(0, dtype=np.intp)
+    else:
+        mask = cols["player"] == player
+        if season is not None:
+            mask &= cols["season"] == season
+        rows = np.flatnonzero(mask)
+    rows = rows[np.argsort(cols["time"][rows], kind="stable")]
+    out = {name: np.asarray(cols[name][rows]) for name in ("time", "season", *POINT_COLUMNS)}
+    out["total"] = sum(out[name] for name in POINT_COLUMNS)
+    return out
+
+
+def alliance_progress(season=None, path=None):
+    """
+    Alliance totals per day, from every player's latest snapshot on or
+    before that day.
+
+    Returns "day" (start of each day with at least one snapshot, in epoch
+    seconds), "players" (how many had a snapshot by then), the per-tab
+    points columns and their "total".
+    """
+    cols = load_columns(["time", "season", "player", *POINT_COLUMNS], path)
+    when = np.asarray(cols["time"])
+    rows = np.arange(len(when)) if season is None else np.flatnonzero(cols["season"] == season)
+    if len(rows) == 0:
+        return {name: np.zeros(0, dtype=np.int64) for name in ("day", "players", *POINT_COLUMNS, "total")}
+    when = when[rows]
+    if np.any(when[1:] < when[:-1]):
+        # Snapshots recorded with an explicit, earlier time
+        order = np.argsort(when, kind="stable")
+        rows, when = rows[order], when[order]
+
+    # Dense day numbers for the days that have snapshots; player numbers
+    # are already dense
+    day = when // DAY - when[0] // DAY
+    present = np.bincount(day) > 0
+    day_idx = np.cumsum(present)[day] - 1
+    days = (np.flatnonzero(present) + when[0] // DAY) * DAY
+    player = np.asarray(cols["player"])[rows].astype(np.intp)
+
+    # Latest snapshot per (player, day): rows are in time order, so each
+    # cell's first occurrence in the reversed rows is its latest snapshot
+    cells, first = np.unique((player * len(days) + day_idx)[::-1], return_index=True)
+    latest = np.full((len(cols["players"]), len(days)), -1, dtype=np.intp)
+    latest.flat[cells] = rows[::-1][first]
+    latest = latest[(latest >= 0).any(axis=1)]
+    # Carry each player's latest snapshot forward to the days without one
+    seen = np.where(latest >= 0, np.arange(len(days)), -1)
+    np.maximum.accumulate(seen, axis=1, out=seen)
+    started = seen >= 0
+    filled = np.take_along_axis(latest, np.maximum(seen, 0), axis=1)
+    filled[~started] = -1
+
+    out = {"day": days, "players": started.sum(axis=0)}
+    for name in POINT_COLUMNS:
+        # Index -1 picks an appended zero for players who hadn't started yet
+        values = np.append(np.asarray(cols[name]), 0)
+        out[name] = values[filled].sum(axis=0)
+    out["total"] = sum(out[name] for name in POINT_COLUMNS)
+    return out
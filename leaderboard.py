@@ -0,0 +1,175 @@
+"""Alliance leaderboard over a stream of player exports.
+
+    python leaderboard.py kingdom.jsonl --top 25
+    python leaderboard.py roster.csv --top 10 --format csv
+
+Every player record (same `<name>_current` / `<name>_target` fields as the
+CLI and roster files) is scored for the KvK prep points its targets are
+worth, split into hero, charm and gov gear categories. Records flow through
+a chain of generators into a `Leaderboard`, which keeps the best K players
+in a min-heap and running totals for everything else. Memory stays at K
+rows however long the export is, so a whole kingdom never has to be loaded
+at once.
+"""
+
+import argparse
+import csv
+import heapq
+import io
+import sys
+import time
+
+from engine import categories, charm_categories, gov_gear_items, per_version
+from cli import ID_FIELD, iter_players, iter_raw_records, parse_record, read_level
+
+
+@per_version
+def _scorers(tables):
+    """(current key, target key, level index, points prefix, column) per item."""
+    hero, charm, gear = tables.hero_table, tables.charm_table, tables.gear_table
+    items = []
+    for category, heroes in categories.items():
+        prefix = [s * tables.points_per_shard.get(category, 0) for s in hero.prefix["shards"]]
+        for name in heroes:
+            items.append((name, hero, prefix, f"{category} Heroes"))
+    for category, charms in charm_categories.items():
+        for name in charms:
+            items.append((f"{category}_{name}", charm, charm.prefix["points"], f"{category} Charms"))
+    for item in gov_gear_items:
+        items.append((item, gear, gear.prefix["points"], "Gov Gear"))
+    return [(f"{name}_current", f"{name}_target", table.index, prefix, column) for name, table, prefix, column in items]
+
+
+CATEGORY_COLUMNS = list(dict.fromkeys(column for *_, column in _scorers()))
+TOTAL_COLUMN = "KvK Prep Points"
+MAX_ERRORS = 20
+
+
+def score(record, scorers=None):
+    """
+    Points the player's targets are worth, per category and in total, on
+    `scorers` (`_scorers()` of the active game version by default).
+    """
+    row = {ID_FIELD: record.get(ID_FIELD, "")}
+    row.update((column, 0) for column in CATEGORY_COLUMNS)
+    for cur_key, tgt_key, index, prefix, column in scorers or _scorers():
+        # Well-formed level names hit the index directly; blank, padded or
+        # missing values go through the careful path
+        try:
+            cur = index[record[cur_key]]
+        except (KeyError, TypeError):
+            level = read_level(record, cur_key, index, None)
+            cur = 0 if level is None else index[level]
+        try:
+            tgt = index[record[tgt_key]]
+        except (KeyError, TypeError):
+            level = read_level(record, tgt_key, index, None)
+            tgt = cur if level is None else index[level]
+        if tgt > cur:
+            row[column] += prefix[tgt] - prefix[cur]
+    row[TOTAL_COLUMN] = sum(row[column] for column in CATEGORY_COLUMNS)
+    return row
+
+
+class Leaderboard:
+    """Top `k` players by total points, plus alliance-wide totals."""
+
+    def __init__(self, k=10):
+        self.k = k
+        # (points, -arrival, row): the smallest kept entry is at heap[0], and
+        # on equal points the later arrival is the one dropped
+        self.heap = []
+        self.players = 0
+        self.totals = dict.fromkeys(CATEGORY_COLUMNS + [TOTAL_COLUMN], 0)
+        self.skipped = 0
+        # (record position, message) of the first few skipped records
+        self.errors = []
+
+    def add(self, row):
+        self.players += 1
+        for column in self.totals:
+            self.totals[column] += row[column]
+        entry = (row[TOTAL_COLUMN], -self.players, row)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def skip(self, position, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((position, message))
+
+    def top(self):
+        """The kept rows, best first, each with its "Rank"."""
+        ranked = sorted(self.heap, key=lambda entry: entry[:2], reverse=True)
+        return [dict(row, Rank=rank) for rank, (_, _, row) in enumerate(ranked, 1)]
+
+    def summary(self):
+        """Alliance totals and per-player averages for every category."""
+        return {
+            "players": self.players,
+            "totals": dict(self.totals),
+            "averages": {
+                column: total / self.players if self.players else 0.0 for column, total in self.totals.items()
+            },
+        }
+
+
+def build_leaderboard(records, k=10):
+    """
+    Leaderboard of a record stream (player dicts or raw records from
+    `iter_raw_records`), consumed one record at a time. Records that don't
+    parse, aren't objects or have unknown levels are skipped and counted.
+    """
+    board = Leaderboard(k)
+    # One version's tables for the whole stream
+    scorers = _scorers()
+    for position, record in enumerate(records, 1):
+        try:
+            row = score(parse_record(record), scorers)
+        except (ValueError, TypeError, AttributeError) as exc:
+            board.skip(position, str(exc))
+        else:
+            board.add(row)
+    return board
+
+
+def leaderboard_from_upload(data, filename, k=10):
+    """Leaderboard of an uploaded JSON Lines or CSV export (bytes)."""
+    fmt = "csv" if filename.lower().endswith(".csv") else "jsonl"
+    stream = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", newline="")
+    return build_leaderboard(iter_raw_records(stream, fmt), k)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank an alliance export by potential KvK prep points.")
+    parser.add_argument("input", help="JSON Lines or CSV file of player states, or - for stdin")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"], help="override the input format")
+    parser.add_argument("--top", type=int, default=10, help="players to rank")
+    parser.add_argument("--format", choices=["table", "csv"], default="table", help="output format")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    board = build_leaderboard(iter_players(args.input, args.input_format), max(args.top, 1))
+    elapsed = time.perf_counter() - start
+
+    columns = ["Rank", ID_FIELD, TOTAL_COLUMN] + CATEGORY_COLUMNS
+    if args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(board.top())
+    else:
+        for row in board.top():
+            print(f"{row['Rank']:>4}  {str(row[ID_FIELD])[:24]:24s} {row[TOTAL_COLUMN]:>16,}")
+        summary = board.summary()
+        print(f"\nAlliance total: {summary['totals'][TOTAL_COLUMN]:,} points over {summary['players']:,} players")
+        for column in CATEGORY_COLUMNS:
+            print(f"  {column:18s} {summary['totals'][column]:>18,}")
+    print(f"{board.players:,} players ranked in {elapsed:.2f} s, {board.skipped:,} skipped", file=sys.stderr)
+    for position, message in board.errors[:5]:
+        print(f"  record {position}: {message}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
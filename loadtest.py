@@ -0,0 +1,143 @@
+"""Load test for the JSON HTTP API.
+
+    python loadtest.py --spawn                     # start a local instance and hit it
+    python loadtest.py --port 8765 --requests 20000 --concurrency 64
+
+Each client keeps one keep-alive connection open and sends a mix of the
+three calculation endpoints. `--distinct` controls how many different
+player states are drawn from, so the cache hit rate can be dialled from
+"every request identical" to "every request new". Reports throughput,
+latency percentiles, status codes and the server's own /stats counters.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from engine import CHARM_TABLE, GEAR_TABLE, HERO_TABLE, charm_names, gov_gear_items, hero_names
+
+ENDPOINTS = ("/targets", "/charms/optimize", "/gear/optimize")
+
+
+def random_record(rng):
+    record = {"Player": f"p{rng.randrange(10 ** 6)}"}
+    for names, table in ((hero_names(), HERO_TABLE), (charm_names(), CHARM_TABLE), (gov_gear_items, GEAR_TABLE)):
+        for name in names:
+            cur = rng.randint(0, table.max_index)
+            record[f"{name}_current"] = table.levels[cur]
+            record[f"{name}_target"] = table.levels[rng.randint(cur, table.max_index)]
+    for key, top in (("designs", 5000), ("guides", 5000), ("threads", 3000), ("satins", 300000), ("papers", 3000)):
+        record[key] = rng.randrange(top)
+    return record
+
+
+async def _request(reader, writer, host, path, payload):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _get_json(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    return json.loads(raw.split(b"\r\n\r\n", 1)[1])
+
+
+def spawn_server(host, port, timeout=10):
+    """Start `api.py` in a separate process and wait until it accepts connections."""
+    api = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api.py")
+    process = subprocess.Popen([sys.executable, api, "--host", host, "--port", str(port)])
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return process
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                process.wait()
+                raise RuntimeError(f"API server did not start on {host}:{port}")
+            time.sleep(0.1)
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    pool = [random_record(rng) for _ in range(args.distinct)]
+    jobs = [(rng.choice(ENDPOINTS), rng.choice(pool)) for _ in range(args.requests)]
+    latencies = []
+    statuses = {}
+    queue = iter(jobs)
+
+    async def client():
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        try:
+            for path, payload in queue:
+                start = time.perf_counter()
+                status = await _request(reader, writer, args.host, path, payload)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pct = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)]
+    print(f"{len(latencies):,} requests in {elapsed:.2f} s ({len(latencies) / elapsed:,.0f} req/s)")
+    print(f"latency ms: median {statistics.median(latencies):.2f}, p95 {pct(0.95):.2f}, "
+          f"p99 {pct(0.99):.2f}, max {latencies[-1]:.2f}")
+    print(f"status codes: {dict(sorted(statuses.items()))}")
+    print(f"server stats: {await _get_json(args.host, args.port, '/stats')}")
+    return 0 if set(statuses) <= {200, 503} else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the KvK Helper JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--spawn", action="store_true", help="start a local API process for the run")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32, help="open keep-alive connections")
+    parser.add_argument("--distinct", type=int, default=200, help="different player states to draw from")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    # The server gets a process of its own, so the load generator's event
+    # loop and GIL don't skew what is measured
+    server = spawn_server(args.host, args.port) if args.spawn else None
+    try:
+        return asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,431 @@
+"""Exact resource-mode optimizers.
+
+Every charm shares one upgrade chain, and so does every gov gear item, so a
+plan can be described by how many items take each step (x[l] = number of
+items going l→l+1) rather than by one target level per item. The counts
+only have to respect the chain: an item can take step l if it started at l
+or took step l-1, so x[l] <= x[l-1] + (items starting at l). Cost and points are linear in the
+counts, which leaves a small integer program that a depth-first
+branch-and-bound solves exactly in a few milliseconds. The bound at each
+node is a fractional knapsack over the concave hull of every open chain,
+taken separately per resource.
+"""
+
+import threading
+import time
+from bisect import bisect_right
+from functools import lru_cache
+from math import gcd
+
+from engine import charm_categories, game_tables, max_levels_global, max_rarity_from_resources
+
+
+# --------------------------
+# Generic chain solver
+# --------------------------
+def _hull_segments(cost_prefix, points_prefix, start):
+    """
+    Upper concave hull of the chain from `start`, as (slope, cost, points,
+    end level) segments.
+
+    Taking the segments in order with a fractional last one is the best any
+    relaxation of a single chain can do on one resource, and the slopes come
+    out in decreasing order.
+    """
+    segments = []
+    cur = start
+    end = len(cost_prefix) - 1
+    while cur < end:
+        best = None
+        best_slope = None
+        for t in range(cur + 1, end + 1):
+            dc = cost_prefix[t] - cost_prefix[cur]
+            dp = points_prefix[t] - points_prefix[cur]
+            slope = float("inf") if dc == 0 else dp / dc
+            if best is None or slope >= best_slope:
+                best = t
+                best_slope = slope
+        segments.append((best_slope, cost_prefix[best] - cost_prefix[cur], points_prefix[best] - points_prefix[cur], best))
+        cur = best
+    return segments
+
+
+@lru_cache(maxsize=None)
+def _bound_segments(table, res):
+    """
+    Hull segments of every start level on one resource, best slope first.
+
+    `result[l]` only keeps the segments of chains starting at l or later,
+    which are the only ones still open once the search reaches step l.
+    """
+    n = table.max_index
+    segments = []
+    for start in range(n):
+        for slope, cost, points, _ in _hull_segments(table.prefix[res], table.prefix["points"], start):
+            segments.append((slope, start, cost, points))
+    segments.sort(key=lambda seg: -seg[0])
+    return [[(s, c, p) for _, s, c, p in segments if s >= l] for l in range(n)]
+
+
+@lru_cache(maxsize=4096)
+def _solve_chain(table, start_counts, budget):
+    """
+    Maximize points over step counts for items on one chain.
+
+    `start_counts[j]` is the number of items currently at level j and
+    `budget` is one amount per resource in `table.resources`. Returns the
+    step counts and the points they earn. `table` is a version's own
+    `CostTable`, so answers for different game versions never share a key.
+    """
+    n = table.max_index
+    points = table.steps["points"]
+    costs = [table.steps[res] for res in table.resources]
+    segments = [_bound_segments(table, res) for res in table.resources]
+    # Every total is a multiple of this, so bounds can be rounded down to it
+    grain = 0
+    for p in points:
+        grain = gcd(grain, p)
+
+    x = [0] * n
+    best = [0, x[:]]
+
+    def can_prune(l, x_prev, remaining, limit):
+        """True if no completion from here can add more than `limit` points."""
+        here = x_prev + start_counts[l]
+        limit += grain - 1e-6
+        for per_level, cap in zip(segments, remaining):
+            total = 0.0
+            for s, c, p in per_level[l]:
+                k = here if s == l else start_counts[s]
+                if not k:
+                    continue
+                if c == 0 or k * c <= cap:
+                    cap -= k * c
+                    total += k * p
+                    if total >= limit:
+                        break
+                else:
+                    total += p * cap / c
+                    break
+            if total < limit:
+                return True
+        return False
+
+    def search(l, x_prev, remaining, pts):
+        if l == n:
+            if pts > best[0]:
+                best[0] = pts
+                best[1] = x[:]
+            return
+        if can_prune(l, x_prev, remaining, best[0] - pts):
+            return
+        hi = x_prev + start_counts[l]
+        for cost, cap in zip(costs, remaining):
+            if cost[l]:
+                hi = min(hi, cap // cost[l])
+        for v in range(hi, -1, -1):
+            x[l] = v
+            search(
+                l + 1,
+                v,
+                tuple(cap - v * cost[l] for cost, cap in zip(costs, remaining)),
+                pts + v * points[l],
+            )
+        x[l] = 0
+
+    search(0, 0, tuple(budget), 0)
+    return tuple(best[1]), best[0]
+
+
+def _assign_levels(current, step_counts):
+    """
+    Turn step counts back into one final level per item.
+
+    `current` is a list of current level indices in tie-break order. The
+    items with the highest current levels get the highest final levels,
+    which always gives every item a final level at or above its current one.
+    """
+    n = len(step_counts)
+    # reached[l] = number of items that finish at level l or above
+    reached = [len(current)] + [
+        sum(1 for c in current if c >= l + 1) + step_counts[l] for l in range(n)
+    ]
+    order = sorted(range(len(current)), key=lambda i: -current[i])
+    final = list(current)
+    for rank, i in enumerate(order):
+        lvl = 0
+        while lvl < n and reached[lvl + 1] > rank:
+            lvl += 1
+        final[i] = lvl
+    return final
+
+
+def _start_counts(table, current):
+    counts = [0] * (table.max_index + 1)
+    for lvl in current:
+        counts[lvl] += 1
+    return tuple(counts)
+
+
+def _spent(table, current, final):
+    return {
+        res: sum(prefix[f] - prefix[c] for c, f in zip(current, final))
+        for res, prefix in table.prefix.items()
+    }
+
+
+# --------------------------
+# Charms
+# --------------------------
+def _charm_current(current_levels_all, charm_categories_priority):
+    """Charm keys in tie-break order and their current levels as ints."""
+    keys = [f"{cat}_{charm}" for cat in charm_categories_priority for charm in charm_categories[cat]]
+    return keys, [int(current_levels_all[key]) for key in keys]
+
+
+def optimal_charm_levels(current_levels_all, total_designs, total_guides, charm_categories_priority):
+    """
+    Points-maximizing charm levels for a designs/guides budget.
+
+    Drop-in replacement for `max_levels_global`: same arguments, same
+    (final_levels, resources_left, total_points) result.
+    """
+    keys, current = _charm_current(current_levels_all, charm_categories_priority)
+    table = game_tables().charm_table
+
+    step_counts, total_points = _solve_chain(
+        table, _start_counts(table, current), (max(total_designs, 0), max(total_guides, 0))
+    )
+    final = _assign_levels(current, step_counts)
+    spent = _spent(table, current, final)
+
+    final_levels = current_levels_all.copy()
+    for key, lvl in zip(keys, final):
+        final_levels[key] = str(lvl)
+    resources_left = {
+        "designs": total_designs - spent["designs"],
+        "guides": total_guides - spent["guides"],
+    }
+    return final_levels, resources_left, total_points
+
+
+def compare_charm_optimizers(current_levels_all, total_designs, total_guides, charm_categories_priority,
+                             exact=optimal_charm_levels):
+    """
+    Run an exact charm optimizer (the search by default, or
+    `frontier_charm_levels`) and the greedy, and report points and runtime.
+    """
+    report = {}
+    for name, solver in (("exact", exact), ("greedy", max_levels_global)):
+        start = time.perf_counter()
+        final_levels, remaining, total_points = solver(
+            current_levels_all, total_designs, total_guides, charm_categories_priority
+        )
+        report[name] = {
+            "final_levels": final_levels,
+            "remaining": remaining,
+            "points": total_points,
+            "seconds": time.perf_counter() - start,
+        }
+    report["gain"] = report["exact"]["points"] - report["greedy"]["points"]
+    return report
+
+
+# --------------------------
+# Gov gear
+# --------------------------
+def optimal_gear_rarities(current, threads, satins, papers):
+    """
+    Points-maximizing rarities for a threads/satins/papers budget.
+
+    Drop-in replacement for `max_rarity_from_resources`. Results are
+    memoized on the multiset of current rarities and the budget, so
+    repeated reruns with unchanged inputs cost a dict lookup.
+    """
+    items = list(current)
+    table = game_tables().gear_table
+    cur = [table.index[current[item]] for item in items]
+
+    step_counts, total_points = _solve_chain(
+        table, _start_counts(table, cur), (max(threads, 0), max(satins, 0), max(papers, 0))
+    )
+    final = _assign_levels(cur, step_counts)
+    spent = _spent(table, cur, final)
+
+    final_levels = {item: table.levels[lvl] for item, lvl in zip(items, final)}
+    resources_left = {
+        "threads": threads - spent["threads"],
+        "satins": satins - spent["satins"],
+        "papers": papers - spent["papers"],
+    }
+    return final_levels, resources_left, total_points
+
+
+def compare_gear_optimizers(current, threads, satins, papers):
+    """Run the exact and greedy gov gear optimizers and report points and runtime."""
+    report = {}
+    for name, solver in (("exact", optimal_gear_rarities), ("greedy", max_rarity_from_resources)):
+        start = time.perf_counter()
+        final_levels, remaining, total_points = solver(current, threads, satins, papers)
+        report[name] = {
+            "final_levels": final_levels,
+            "remaining": remaining,
+            "points": total_points,
+            "seconds": time.perf_counter() - start,
+        }
+    report["gain"] = report["exact"]["points"] - report["greedy"]["points"]
+    return report
+
+
+# --------------------------
+# Charm Pareto frontier
+# --------------------------
+def _prune_dominated(states):
+    """
+    Drop every (designs, guides, points, ref) state that another state
+    beats or matches on all three. Sweeping in order of designs, a staircase
+    of (guides, best points) seen so far answers each dominance check with
+    one bisect.
+    """
+    states.sort(key=lambda s: (s[0], s[1], -s[2]))
+    stair_g = []
+    stair_p = []
+    kept = []
+    for state in states:
+        g, p = state[1], state[2]
+        i = bisect_right(stair_g, g)
+        if i > 0 and stair_p[i - 1] >= p:
+            continue
+        kept.append(state)
+        j = i
+        while j < len(stair_g) and stair_p[j] <= p:
+            j += 1
+        stair_g[i:j] = [g]
+        stair_p[i:j] = [p]
+    return kept
+
+
+def _build_charm_frontier(table, start_counts):
+    """
+    Every Pareto-optimal (designs, guides) → points plan for a multiset of
+    current charm levels, best points first.
+
+    Uses the same step-count formulation as `_solve_chain`, but keeps every
+    non-dominated state per chain state instead of one budget's best.
+    """
+    n = table.max_index
+    d_steps = table.steps["designs"]
+    g_steps = table.steps["guides"]
+    p_steps = table.steps["points"]
+
+    # x_prev -> states; each state's last field links back to its parent
+    layer = {0: [(0, 0, 0, None)]}
+    for l in range(n):
+        grown = {}
+        for x_prev, states in layer.items():
+            for v in range(x_prev + start_counts[l] + 1):
+                dd, gg, pp = v * d_steps[l], v * g_steps[l], v * p_steps[l]
+                bucket = grown.setdefault(v, [])
+                for s in states:
+                    bucket.append((s[0] + dd, s[1] + gg, s[2] + pp, (s, v)))
+        layer = {x: _prune_dominated(states) for x, states in grown.items()}
+
+    final = _prune_dominated([s for states in layer.values() for s in states])
+    final.sort(key=lambda s: -s[2])
+
+    frontier = {"designs": [], "guides": [], "points": [], "steps": []}
+    for designs, guides, points, ref in final:
+        steps = []
+        while ref is not None:
+            ref, v = ref
+            steps.append(v)
+            ref = ref[3]
+        frontier["designs"].append(designs)
+        frontier["guides"].append(guides)
+        frontier["points"].append(points)
+        frontier["steps"].append(tuple(reversed(steps)))
+    return frontier
+
+
+# Frontiers by (charm table, multiset of current levels), least recently
+# used first. Builds can run on background threads, so updates take a lock.
+_frontier_cache = {}
+_frontier_lock = threading.Lock()
+FRONTIER_CACHE_SIZE = 16
+
+
+def charm_frontier(current_levels_all, charm_categories_priority):
+    """
+    Pareto frontier for the current charm levels.
+
+    Cached on the multiset of levels, so every player (and every rerun)
+    with the same levels shares one frontier.
+    """
+    _, current = _charm_current(current_levels_all, charm_categories_priority)
+    table = game_tables().charm_table
+    key = (table, _start_counts(table, current))
+    with _frontier_lock:
+        frontier = _frontier_cache.pop(key, None)
+    if frontier is None:
+        frontier = _build_charm_frontier(*key)
+    with _frontier_lock:
+        _frontier_cache[key] = frontier
+        while len(_frontier_cache) > FRONTIER_CACHE_SIZE:
+            _frontier_cache.pop(next(iter(_frontier_cache)))
+    return frontier
+
+
+def frontier_is_cached(current_levels_all, charm_categories_priority):
+    _, current = _charm_current(current_levels_all, charm_categories_priority)
+    table = game_tables().charm_table
+    return (table, _start_counts(table, current)) in _frontier_cache
+
+
+def frontier_charm_levels(current_levels_all, total_designs, total_guides, charm_categories_priority):
+    """
+    Same result as `optimal_charm_levels`, answered by a scan of the cached
+    frontier instead of a fresh search.
+    """
+    frontier = charm_frontier(current_levels_all, charm_categories_priority)
+    keys, current = _charm_current(current_levels_all, charm_categories_priority)
+
+    # Best points first, so the first affordable plan is the optimum
+    best = None
+    for i, (d, g) in enumerate(zip(frontier["designs"], frontier["guides"])):
+        if d <= total_designs and g <= total_guides:
+            best = i
+            break
+    if best is None:
+        return current_levels_all.copy(), {"designs": total_designs, "guides": total_guides}, 0
+
+    final = _assign_levels(current, frontier["steps"][best])
+    final_levels = current_levels_all.copy()
+    for key, lvl in zip(keys, final):
+        final_levels[key] = str(lvl)
+    resources_left = {
+        "designs": total_designs - frontier["designs"][best],
+        "guides": total_guides - frontier["guides"][best],
+    }
+    return final_levels, resources_left, frontier["points"][best]
+
+
+def frontier_curve(frontier, axis, fixed):
+    """
+    Max points as one budget grows while the other stays at `fixed`.
+
+    `axis` is "designs" or "guides". Returns (budget, points) breakpoints;
+    past the last one, more of that resource earns nothing.
+    """
+    other = "guides" if axis == "designs" else "designs"
+    usable = sorted(
+        (a, p) for a, o, p in zip(frontier[axis], frontier[other], frontier["points"]) if o <= fixed
+    )
+    curve = [(0, 0)]
+    for amount, points in usable:
+        if points <= curve[-1][1]:
+            continue
+        if amount == curve[-1][0]:
+            curve[-1] = (amount, points)
+        else:
+            curve.append((amount, points))
+    return curve
@@ -0,0 +1,246 @@
+"""Reverse planner: the cheapest upgrades that reach a KvK prep points goal.
+
+Every hero, charm and gov gear item is a chain of level-ups with a points
+gain and a resource cost per step. Resources are made comparable with
+user-supplied exchange weights, so each step has a single weighted cost.
+Each chain is convexified into its best-ratio segments (the same hull the
+optimizers use for their bounds), and a heap hands out the segment with the
+most points per unit of cost across all chains until the goal is in reach.
+The last stretch is covered by whichever single chain can do it most
+cheaply, step by step, and a local search then trades levels between pairs
+of items while that lowers the cost.
+
+The heap order is also the optimal fractional plan, so its cost is a lower
+bound that every plan reports alongside its own cost.
+"""
+
+import heapq
+from bisect import bisect_left
+from functools import lru_cache
+
+from engine import categories, charm_names, game_tables, gov_gear_items, per_version
+from optimizer import _hull_segments
+
+RESOURCES = {
+    "mythic_shards": "Mythic Shards",
+    "epic_shards": "Epic Shards",
+    "rare_shards": "Rare Shards",
+    "designs": "Designs",
+    "guides": "Guides",
+    "threads": "Threads",
+    "satins": "Satins",
+    "papers": "Papers",
+}
+
+# How much one unit of each resource is worth; satins are handed out in
+# roughly a hundred times the quantity of threads and papers
+DEFAULT_WEIGHTS = {res: 1.0 for res in RESOURCES}
+DEFAULT_WEIGHTS["satins"] = 0.01
+
+
+# --------------------------
+# Upgrade chains
+# --------------------------
+@per_version
+def kinds(tables):
+    """
+    (kind, table, {resource: prefix}, points prefix, item names) per chain
+    type, for the active game version (or `version`).
+    """
+    hero, charm, gear = tables.hero_table, tables.charm_table, tables.gear_table
+    out = []
+    shards = hero.prefix["shards"]
+    for category, heroes in categories.items():
+        pps = tables.points_per_shard.get(category, 0)
+        # Points are earned per shard consumed, so they follow the shard prefix
+        points = [s * pps for s in shards]
+        out.append((f"{category} Hero", hero, {f"{category.lower()}_shards": shards}, points, heroes))
+    charm_res = {res: charm.prefix[res] for res in charm.resources}
+    out.append(("Charm", charm, charm_res, charm.prefix["points"], charm_names()))
+    gear_res = {res: gear.prefix[res] for res in gear.resources}
+    out.append(("Gov Gear", gear, gear_res, gear.prefix["points"], gov_gear_items))
+    return out
+
+
+@lru_cache(maxsize=None)
+def _weighted_cost(version, kind_index, weights):
+    _, table, resources, _, _ = kinds(version)[kind_index]
+    weights = dict(weights)
+    return [
+        sum(weights.get(res, 0) * prefix[i] for res, prefix in resources.items())
+        for i in range(table.max_index + 1)
+    ]
+
+
+@lru_cache(maxsize=4096)
+def _segments(version, kind_index, start, weights):
+    """Hull segments of one chain type from `start`; identical items share them."""
+    points = kinds(version)[kind_index][3]
+    return _hull_segments(_weighted_cost(version, kind_index, weights), points, start)
+
+
+def weights_key(weights):
+    """Hashable weights, with defaults filled in and negatives clamped to zero."""
+    merged = dict(DEFAULT_WEIGHTS)
+    if weights:
+        merged.update({res: float(w) for res, w in weights.items() if res in RESOURCES})
+    # Negative weights would reward spending, which has no useful answer
+    return tuple(sorted((res, max(w, 0.0)) for res, w in merged.items()))
+
+
+def max_goal(current):
+    """KvK prep points gained by maxing everything from `current`."""
+    total = 0
+    for _, table, _, points, names in kinds():
+        for name in names:
+            total += points[-1] - points[table.idx(current.get(name, table.levels[0]))]
+    return total
+
+
+# --------------------------
+# Planning
+# --------------------------
+def plan_for_goal(current, goal, weights=None):
+    """
+    Cheapest set of upgrades that earns at least `goal` KvK prep points.
+
+    `current` maps hero, charm (e.g. "Infantry_Charm I") and gov gear names
+    to their current level; anything missing starts at the lowest level.
+    `weights` maps keys of `RESOURCES` to the cost of one unit, defaulting
+    to `DEFAULT_WEIGHTS`. Returns a dict with the "points" and weighted
+    "cost" of the plan, the fractional "lower_bound" on that cost, the
+    total "resources" spent, one "upgrades" entry per item that changes,
+    and whether the goal is "reachable" at all.
+    """
+    weights = weights_key(weights)
+    goal = max(int(goal), 0)
+    # Every lookup below reads this one version's tables
+    version = game_tables().version
+
+    chains = []
+    for k, (kind, table, _, _, names) in enumerate(kinds(version)):
+        for name in names:
+            start = table.idx(current.get(name, table.levels[0]))
+            chains.append({"name": name, "kind": k, "start": start, "pos": start})
+
+    # One heap entry per chain: its next segment, best points per cost first
+    heap = []
+    for i, chain in enumerate(chains):
+        segments = _segments(version, chain["kind"], chain["start"], weights)
+        if segments:
+            heapq.heappush(heap, (-segments[0][0], i, 0))
+
+    gained = 0
+    spent = 0.0
+    lower_bound = 0.0
+    while heap and gained < goal:
+        neg_slope, i, s = heapq.heappop(heap)
+        chain = chains[i]
+        slope, cost, points, end = _segments(version, chain["kind"], chain["start"], weights)[s]
+        if gained + points >= goal:
+            # The fractional plan stops partway through this segment
+            lower_bound = spent + ((goal - gained) / slope if slope else 0.0)
+            _finish(version, chains, goal - gained, weights)
+            _improve(version, chains, goal, weights)
+            break
+        gained += points
+        spent += cost
+        chain["pos"] = end
+        segments = _segments(version, chain["kind"], chain["start"], weights)
+        if s + 1 < len(segments):
+            heapq.heappush(heap, (-segments[s + 1][0], i, s + 1))
+    else:
+        lower_bound = spent
+
+    return _summarize(version, chains, goal, weights, lower_bound)
+
+
+def _cheapest_cover(version, chains, deficit, weights, skip=None):
+    """(cost, chain, level) of the cheapest single-chain run adding `deficit` points."""
+    best = None
+    for chain in chains:
+        if chain is skip:
+            continue
+        points = kinds(version)[chain["kind"]][3]
+        t = bisect_left(points, points[chain["pos"]] + deficit, lo=chain["pos"])
+        if t >= len(points):
+            continue
+        cost_prefix = _weighted_cost(version, chain["kind"], weights)
+        cost = cost_prefix[t] - cost_prefix[chain["pos"]]
+        if best is None or cost < best[0]:
+            best = (cost, chain, t)
+    return best
+
+
+def _finish(version, chains, deficit, weights):
+    # The chain whose segment was popped can always cover the deficit
+    _, chain, t = _cheapest_cover(version, chains, deficit, weights)
+    chain["pos"] = t
+
+
+def _improve(version, chains, goal, weights, rounds=50):
+    """
+    Lower one item's target and re-cover the shortfall on another item,
+    taking the best saving each round until none is left.
+    """
+    chain_kinds = kinds(version)
+    for _ in range(rounds):
+        gained = sum(chain_kinds[c["kind"]][3][c["pos"]] - chain_kinds[c["kind"]][3][c["start"]] for c in chains)
+        best = None
+        for chain in chains:
+            points = chain_kinds[chain["kind"]][3]
+            cost_prefix = _weighted_cost(version, chain["kind"], weights)
+            for t in range(chain["start"], chain["pos"]):
+                saved = cost_prefix[chain["pos"]] - cost_prefix[t]
+                deficit = goal - gained + points[chain["pos"]] - points[t]
+                if deficit <= 0:
+                    move = (-saved, chain, t, None, None)
+                else:
+                    cover = _cheapest_cover(version, chains, deficit, weights, skip=chain)
+                    if cover is None:
+                        continue
+                    move = (cover[0] - saved, chain, t, cover[1], cover[2])
+                if move[0] < -1e-9 and (best is None or move[0] < best[0]):
+                    best = move
+        if best is None:
+            return
+        _, chain, t, other, u = best
+        chain["pos"] = t
+        if other is not None:
+            other["pos"] = u
+
+
+def _summarize(version, chains, goal, weights, lower_bound):
+    resources = {res: 0 for res in RESOURCES}
+    upgrades = []
+    points_total = 0
+    cost_total = 0.0
+    for chain in chains:
+        if chain["pos"] == chain["start"]:
+            continue
+        kind, table, prefixes, points, _ = kinds(version)[chain["kind"]]
+        start, end = chain["start"], chain["pos"]
+        cost_prefix = _weighted_cost(version, chain["kind"], weights)
+        entry = {
+            "name": chain["name"],
+            "kind": kind,
+            "current": table.levels[start],
+            "target": table.levels[end],
+            "points": points[end] - points[start],
+            "cost": cost_prefix[end] - cost_prefix[start],
+        }
+        for res, prefix in prefixes.items():
+            entry[res] = prefix[end] - prefix[start]
+            resources[res] += entry[res]
+        upgrades.append(entry)
+        points_total += entry["points"]
+        cost_total += entry["cost"]
+    return {
+        "goal": goal,
+        "reachable": points_total >= goal,
+        "points": points_total,
+        "cost": cost_total,
+        "lower_bound": min(lower_bound, cost_total),
+        "resources": resources,
+        "upgrades": upgrades,
+    }
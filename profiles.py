@@ -0,0 +1,147 @@
+"""Persistent player profiles in an embedded SQLite database.
+
+A profile is the set of widget values the app keeps in session state (the
+`<name>_current` / `<name>_target` sliders plus the mode toggles and budget
+inputs listed by `profile_keys`), stored one row per key so a save is a
+single bulk upsert and a load is one range scan of the primary key.
+
+Each process keeps one connection per database file and serializes access
+to it with a lock, since Streamlit runs every session on its own thread.
+The database lives next to the app unless `KVK_PROFILE_DB` points elsewhere.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from engine import categories, charm_names, gov_gear_items, hero_names
+from planner import RESOURCES
+
+DB_PATH = os.environ.get(
+    "KVK_PROFILE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles.db"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    player_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profile_values (
+    player_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (player_id, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS profiles_updated ON profiles (updated_at);
+"""
+
+_connections = {}
+_lock = threading.Lock()
+
+
+def profile_keys():
+    """Every session-state key a profile saves and restores."""
+    keys = []
+    for category in categories:
+        keys += [f"{category}_mode", f"{category}_shared", f"{category}_pool_objective"]
+    for hero in hero_names():
+        keys += [
+            f"{hero}_current", f"{hero}_target", f"{hero}_use_shared",
+            f"{hero}_personal_shards", f"{hero}_pool_target",
+        ]
+    for name in charm_names() + gov_gear_items:
+        keys += [f"{name}_current", f"{name}_target"]
+    keys += ["charms_resource_mode", "charms_total_designs", "charms_total_guides"]
+    keys += ["gear_resource_mode", "gear_total_threads", "gear_total_satins", "gear_total_papers"]
+    keys += ["planner_goal"]
+    keys += [f"planner_weight_{res}" for res in RESOURCES]
+    return keys
+
+
+PROFILE_KEYS = frozenset(profile_keys())
+
+
+# --------------------------
+# Connection pool
+# --------------------------
+def _connection(path):
+    """The process-wide connection for `path`; call with `_lock` held."""
+    conn = _connections.get(path)
+    if conn is None:
+        # Autocommit mode, with explicit BEGIN/COMMIT around each write
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _connections[path] = conn
+    return conn
+
+
+def close_all():
+    """Close every pooled connection, e.g. before deleting the database file."""
+    with _lock:
+        for conn in _connections.values():
+            conn.close()
+        _connections.clear()
+
+
+# --------------------------
+# Profiles
+# --------------------------
+def save_profile(player_id, state, path=None):
+    """
+    Store every profile key present in `state` (e.g. `st.session_state`)
+    under `player_id`, in one transaction. Returns the number of values saved.
+    """
+    player_id = str(player_id).strip()
+    if not player_id:
+        raise ValueError("Player ID must not be empty")
+    rows = [
+        (player_id, key, json.dumps(state[key]))
+        for key in profile_keys()
+        if key in state
+    ]
+    with _lock:
+        conn = _connection(path or DB_PATH)
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT INTO profile_values (player_id, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (player_id, key) DO UPDATE SET value = excluded.value",
+                rows,
+            )
+            conn.execute(
+                "INSERT INTO profiles (player_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT (player_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (player_id, time.time()),
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return len(rows)
+
+
+def load_profile(player_id, path=None):
+    """Saved widget values for `player_id`, or None if there is no such profile."""
+    with _lock:
+        conn = _connection(path or DB_PATH)
+        rows = conn.execute(
+            "SELECT key, value FROM profile_values WHERE player_id = ?",
+            (str(player_id).strip(),),
+        ).fetchall()
+    if not rows:
+        return None
+    # Keys from an older app version that no longer has the widget are dropped
+    return {key: json.loads(value) for key, value in rows if key in PROFILE_KEYS}
+
+
+def list_profiles(path=None):
+    """Stored player IDs, most recently saved first."""
+    with _lock:
+        conn = _connection(path or DB_PATH)
+        rows = conn.execute("SELECT player_id FROM profiles ORDER BY updated_at DESC").fetchall()
+    return [row[0] for row in rows]
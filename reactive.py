@@ -0,0 +1,217 @@
+"""Memoized derived values that recompute only when their inputs change.
+
+A `Graph` holds named nodes. Each node declares the source keys it reads
+(session-state keys in the app, with a default for keys not set yet) and the
+other nodes it is derived from. `get` re-checks a node's inputs against the
+ones its cached value was computed from and only calls the node's function
+when something differs. Every node also carries a version that only moves
+when its value actually changes, so a recompute that lands on the same value
+(a new target that costs the same shards, say) stops there instead of
+invalidating everything downstream.
+
+`calculator_graph` builds the graph behind the hero, charm and gov gear tabs:
+per-hero shards, per-charm items, per-item materials, category totals and
+grand totals. The widgets and the summary tables read the same nodes.
+"""
+
+from engine import (
+    CHARM_TABLE, GEAR_TABLE, HERO_TABLE,
+    categories, charm_categories, gov_gear_items, hero_points, shared_pool_excluded, shards_needed,
+    get_level_from_total_shards,
+)
+from shard_pool import OBJECTIVES as POOL_OBJECTIVES, allocate_shared_pool
+
+
+class Graph:
+    """Named derived values over a mapping of inputs."""
+
+    def __init__(self):
+        self.nodes = {}
+        # name -> (inputs seen, value, version)
+        self.memo = {}
+        self.stats = {"hits": 0, "recomputes": 0}
+
+    def add(self, name, func, inputs=None, deps=()):
+        """
+        Register `func(*input values, *dep values)` as node `name`.
+
+        `inputs` maps source keys to the default used while a key is unset;
+        `deps` names the nodes this one is derived from.
+        """
+        self.nodes[name] = (func, dict(inputs or {}), tuple(deps))
+
+    def get(self, name, source):
+        """Value of node `name` for the inputs currently in `source`."""
+        func, inputs, deps = self.nodes[name]
+        values = tuple(source.get(key, default) for key, default in inputs.items())
+        dep_values = [self.get(dep, source) for dep in deps]
+        seen = (values, tuple(self.memo[dep][2] for dep in deps))
+        memo = self.memo.get(name)
+        if memo is not None and memo[0] == seen:
+            self.stats["hits"] += 1
+            return memo[1]
+        self.stats["recomputes"] += 1
+        value = func(*values, *dep_values)
+        if memo is None:
+            version = 0
+        else:
+            version = memo[2] + (value != memo[1])
+        self.memo[name] = (seen, value, version)
+        return value
+
+
+# --------------------------
+# Calculator nodes
+# --------------------------
+def _clamped(table, current, target):
+    """Target level name, never below the current level."""
+    if target is None or table.idx(target) < table.idx(current):
+        return current
+    return target
+
+
+def _pool_node(category):
+    heroes = [hero for hero in categories[category] if hero not in shared_pool_excluded]
+    inputs = {
+        f"{category}_mode": False,
+        f"{category}_shared": 0,
+        f"{category}_pool_objective": next(iter(POOL_OBJECTIVES)),
+    }
+    for hero in heroes:
+        inputs[f"{hero}_current"] = HERO_TABLE.levels[0]
+        inputs[f"{hero}_use_shared"] = False
+        inputs[f"{hero}_personal_shards"] = 0
+        inputs[f"{hero}_pool_target"] = None
+
+    def split(mode, shared, objective, *per_hero):
+        """The category's general pool split, or None outside shard mode."""
+        if not mode:
+            return None
+        pool_heroes = []
+        for i, hero in enumerate(heroes):
+            current, use_shared, personal, pool_target = per_hero[4 * i:4 * i + 4]
+            if use_shared:
+                pool_heroes.append({
+                    "hero": hero,
+                    "current": current,
+                    "personal": personal,
+                    "target": _clamped(HERO_TABLE, current, pool_target) if objective == "targets" else None,
+                })
+        return allocate_shared_pool(pool_heroes, shared, objective)
+
+    return split, inputs
+
+
+def _hero_node(category, hero):
+    inputs = {
+        f"{hero}_current": HERO_TABLE.levels[0],
+        f"{hero}_target": None,
+        f"{category}_mode": False,
+        f"{hero}_personal_shards": 0,
+    }
+
+    def row(current, target, mode, personal, split):
+        if mode:
+            # Everything the hero gets: its own shards plus its share of the pool
+            alloc = split["allocation"].get(hero, {}) if split else {}
+            added = personal + alloc.get("pool", 0)
+            target = get_level_from_total_shards(HERO_TABLE.prefix["shards"][HERO_TABLE.idx(current)] + added)
+            shards = added
+        else:
+            target = _clamped(HERO_TABLE, current, target)
+            shards = shards_needed(current, target)
+        return {
+            "Hero": hero,
+            "Category": category,
+            "Current Level": current,
+            "Target Level": target,
+            "Shards Needed": shards,
+            "KvK Prep Points": hero_points(category, shards),
+        }
+
+    return row, inputs
+
+
+def _charm_node(category, charm):
+    key = f"{category}_{charm}"
+
+    def row(current, target):
+        target = _clamped(CHARM_TABLE, current, target)
+        cost = CHARM_TABLE.cost(current, target)
+        return {
+            "Category": category,
+            "Charm": charm,
+            "Current Level": current,
+            "Target Level": target,
+            "Designs Needed": cost["designs"],
+            "Guides Needed": cost["guides"],
+            "Points": cost["points"],
+        }
+
+    return row, {f"{key}_current": CHARM_TABLE.levels[0], f"{key}_target": None}
+
+
+def _gear_node(item):
+    def row(current, target):
+        target = _clamped(GEAR_TABLE, current, target)
+        cost = GEAR_TABLE.cost(current, target)
+        return {
+            "Item": item,
+            "Current": current,
+            "Target": target,
+            "Threads Needed": cost["threads"],
+            "Satins Needed": cost["satins"],
+            "Papers Needed": cost["papers"],
+            "Points": cost["points"],
+        }
+
+    return row, {f"{item}_current": GEAR_TABLE.levels[0], f"{item}_target": None}
+
+
+def _rows(*rows):
+    return list(rows)
+
+
+def _total(column):
+    return lambda *rows: sum(row[column] for row in rows)
+
+
+def calculator_graph():
+    """
+    Graph of every target-mode result of the hero, charm and gov gear tabs.
+
+    Nodes: "pool:<category>", "hero:<hero>", "hero_rows", "hero_total:<category>",
+    "hero_total"; "charm:<category>_<charm>", "charm_rows",
+    "charm_total:<category>", "charm_total"; "gear:<item>", "gear_rows",
+    "gear_total"; and "total" over all three tabs.
+    """
+    graph = Graph()
+
+    for category, heroes in categories.items():
+        graph.add(f"pool:{category}", *_pool_node(category))
+        for hero in heroes:
+            func, inputs = _hero_node(category, hero)
+            graph.add(f"hero:{hero}", func, inputs, deps=[f"pool:{category}"])
+        graph.add(f"hero_total:{category}", _total("KvK Prep Points"), deps=[f"hero:{hero}" for hero in heroes])
+    hero_nodes = [f"hero:{hero}" for heroes in categories.values() for hero in heroes]
+    graph.add("hero_rows", _rows, deps=hero_nodes)
+    graph.add("hero_total", lambda *totals: sum(totals), deps=[f"hero_total:{c}" for c in categories])
+
+    for category, charms in charm_categories.items():
+        for charm in charms:
+            graph.add(f"charm:{category}_{charm}", *_charm_node(category, charm))
+        graph.add(
+            f"charm_total:{category}", _total("Points"), deps=[f"charm:{category}_{charm}" for charm in charms]
+        )
+    charm_nodes = [f"charm:{category}_{charm}" for category, charms in charm_categories.items() for charm in charms]
+    graph.add("charm_rows", _rows, deps=charm_nodes)
+    graph.add("charm_total", lambda *totals: sum(totals), deps=[f"charm_total:{c}" for c in charm_categories])
+
+    for item in gov_gear_items:
+        graph.add(f"gear:{item}", *_gear_node(item))
+    gear_nodes = [f"gear:{item}" for item in gov_gear_items]
+    graph.add("gear_rows", _rows, deps=gear_nodes)
+    graph.add("gear_total", _total("Points"), deps=gear_nodes)
+
+    graph.add("total", lambda *totals: sum(totals), deps=["hero_total", "charm_total", "gear_total"])
+    return graph
@@ -0,0 +1,157 @@
+"""Process-wide cache of optimizer results, shared by every session.
+
+Players at the same milestone ask the optimizers the same question, so each
+answer is kept under a canonical hash of the call: the function plus its
+arguments, with dicts compared by their sorted items. The cache is bounded
+three ways: entries older than the TTL are dropped on lookup, and the least
+recently used ones are evicted once the entry count or the estimated memory
+goes over its cap. Concurrent misses for one key share a single
+computation.
+
+Cached values are handed to every caller as-is, so they must be treated as
+read-only. Sizes are estimated from the pickled value. The limits default
+to the `KVK_CACHE_ENTRIES`, `KVK_CACHE_MB` and `KVK_CACHE_TTL` environment
+variables.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import engine
+
+
+def _canonical(value):
+    """JSON-friendly form of an argument that two equal inputs share."""
+    if isinstance(value, dict):
+        items = sorted(value.items(), key=lambda kv: repr(kv[0]))
+        return {"__dict__": [[_canonical(k), _canonical(v)] for k, v in items]}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if callable(value):
+        return f"{value.__module__}.{value.__qualname__}"
+    return value
+
+
+def canonical_key(func, *args, **kwargs):
+    """Hash of a call that ignores dict ordering and argument identity."""
+    payload = json.dumps(
+        [_canonical(func), _canonical(args), _canonical(kwargs)], sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU + TTL cache with an entry cap and a memory cap."""
+
+    def __init__(self, max_entries=4096, max_bytes=64 * 2 ** 20, ttl=6 * 60 * 60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (value, size in bytes, expiry on the monotonic clock)
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0, "expirations": 0}
+
+    def get_or_compute(self, key, func, *args, **kwargs):
+        """Cached value for `key`, computing `func(*args, **kwargs)` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[0]
+                self._drop(key)
+                self.stats["expirations"] += 1
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["shared"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = func(*args, **kwargs)
+        except BaseException as exc:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(exc)
+            raise
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            del self._inflight[key]
+            if size <= self.max_bytes:
+                self._store(key, value, size)
+        future.set_result(value)
+        return value
+
+    def _store(self, key, value, size):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, size, time.monotonic() + self.ttl)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def snapshot(self):
+        """Counters plus current size, for the admin view."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["shared"]
+            return dict(
+                self.stats,
+                entries=len(self._entries),
+                bytes=self.bytes,
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
+                ttl=self.ttl,
+                hit_rate=(self.stats["hits"] + self.stats["shared"]) / lookups if lookups else 0.0,
+            )
+
+
+OPTIMIZER_CACHE = ResultCache(
+    max_entries=int(os.environ.get("KVK_CACHE_ENTRIES", 4096)),
+    max_bytes=int(float(os.environ.get("KVK_CACHE_MB", 64)) * 2 ** 20),
+    ttl=float(os.environ.get("KVK_CACHE_TTL", 6 * 60 * 60)),
+)
+
+
+def timed_cached_call(func, *args, **kwargs):
+    """
+    `func(*args, **kwargs)` through the shared optimizer cache, plus how
+    this call went: {"seconds": its wall time, "cached": True unless it ran
+    `func` itself}.
+    """
+    ran = []
+
+    def compute(*args, **kwargs):
+        ran.append(True)
+        return func(*args, **kwargs)
+
+    # The same call has a different answer under another game version. The
+    # active version belongs to this thread, so `func` runs on the same
+    # tables the key names
+    key = canonical_key(func, engine.active_version(), *args, **kwargs)
+    start = time.perf_counter()
+    value = OPTIMIZER_CACHE.get_or_compute(key, compute, *args, **kwargs)
+    return value, {"seconds": time.perf_counter() - start, "cached": not ran}
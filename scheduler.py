@@ -0,0 +1,213 @@
+"""KvK prep-day scheduler: which planned upgrades to do on which day.
+
+Each prep day scores one kind of upgrade (hero shards, charms or gov gear)
+and may carry personal point milestones. Upgrades only earn KvK prep
+points on a day that scores them, so the same plan can be worth very
+different amounts depending on when each level-up is done, and anything
+beyond what the days need can be held back for the next event.
+
+The planned level-ups of each category are laid out in a fixed order,
+lowest level first across items, which keeps every item's levels in
+sequence and puts the smallest steps first. A DP over (day, steps taken so
+far) then picks how many of the remaining steps each scoring day takes;
+every day is one NumPy pass over the steps × steps matrix of gains. Steps
+no day takes are held back.
+"""
+
+from bisect import bisect_right
+
+from engine import game_tables
+from planner import kinds
+
+CATEGORIES = {
+    "heroes": "Hero shards",
+    "charms": "Charms",
+    "gear": "Gov gear",
+}
+
+OBJECTIVES = {
+    "points": "Maximize event points",
+    "milestones": "Reach every milestone, hold back the rest",
+}
+
+# Three prep days, one per category; milestones are left to the player
+DEFAULT_CALENDAR = [
+    {"name": f"Day {day}", "category": category, "thresholds": []}
+    for day, category in enumerate(CATEGORIES, 1)
+]
+
+
+def _category(tables, table):
+    if table is tables.hero_table:
+        return "heroes"
+    if table is tables.charm_table:
+        return "charms"
+    if table is tables.gear_table:
+        return "gear"
+    raise ValueError("Unknown upgrade chain")
+
+
+def plan_steps(current, target, version=None):
+    """
+    Single level-ups from `current` to `target`, per category, in the order
+    the scheduler takes them.
+
+    Both map hero, charm ("Infantry_Charm I") and gov gear names to level
+    names; missing items stay at their current level. Each step is
+    (name, kind index into `kinds(version)`, level index before the step,
+    points).
+    """
+    tables = game_tables(version)
+    steps = {category: [] for category in CATEGORIES}
+    for k, (_, table, _, points, names) in enumerate(kinds(tables.version)):
+        for order, name in enumerate(names):
+            start = table.idx(current.get(name, table.levels[0]))
+            end = max(table.idx(target.get(name, start)), start)
+            steps[_category(tables, table)] += [(lvl, k, order, name, points[lvl + 1] - points[lvl]) for lvl in range(start, end)]
+    return {
+        category: [(name, k, lvl, gain) for lvl, k, _, name, gain in sorted(rows)]
+        for category, rows in steps.items()
+    }
+
+
+def _milestones(values):
+    """Sorted positive milestones; zero is always reached and counts for nothing."""
+    return sorted({int(v) for v in values if int(v) > 0})
+
+
+def _schedule_category(prefix, days, objective, weight):
+    """
+    Steps taken by each of `days` (lists of milestones) from a category's
+    points prefix, as (start, end) step ranges.
+    """
+    import numpy as np
+
+    n = len(prefix) - 1
+    prefix = np.asarray(prefix, dtype=np.int64)
+    # gain[k, j] = points of taking steps k..j-1 on one day
+    gain = prefix[None, :] - prefix[:, None]
+    allowed = np.triu(np.ones((n + 1, n + 1), dtype=bool))
+    unreachable = np.iinfo(np.int64).min // 4
+
+    # best[k] = best value of the days so far with k steps taken
+    best = np.full(n + 1, unreachable, dtype=np.int64)
+    best[0] = 0
+    choices = []
+    for milestones in days:
+        reached = np.searchsorted(np.asarray(milestones, dtype=np.int64), gain, side="right")
+        if objective == "milestones":
+            # Every milestone outweighs all points; fewer points spent is better
+            value = reached * weight - gain
+        else:
+            value = gain * weight + reached
+        total = np.where(allowed, best[:, None] + value, unreachable)
+        choice = total.argmax(axis=0)
+        best = total[choice, np.arange(n + 1)]
+        choices.append(choice)
+
+    # The first best end is the one that takes the fewest steps
+    end = int(best.argmax())
+    ranges = []
+    for choice in reversed(choices):
+        start = int(choice[end])
+        ranges.append((start, end))
+        end = start
+    return ranges[::-1]
+
+
+def _upgrades(steps, chain_kinds):
+    """One entry per item over consecutive steps, in the order first touched."""
+    merged = {}
+    for name, k, lvl, gain in steps:
+        entry = merged.get(name)
+        if entry is None:
+            merged[name] = entry = {"name": name, "kind": k, "start": lvl, "end": lvl + 1, "points": 0}
+        entry["start"] = min(entry["start"], lvl)
+        entry["end"] = max(entry["end"], lvl + 1)
+        entry["points"] += gain
+
+    upgrades = []
+    for entry in merged.values():
+        kind, table, prefixes, _, _ = chain_kinds[entry["kind"]]
+        start, end = entry["start"], entry["end"]
+        row = {
+            "name": entry["name"],
+            "kind": kind,
+            "current": table.levels[start],
+            "target": table.levels[end],
+            "points": entry["points"],
+        }
+        row.update((res, prefix[end] - prefix[start]) for res, prefix in prefixes.items())
+        upgrades.append(row)
+    return upgrades
+
+
+def schedule(current, target, calendar=None, objective="points"):
+    """
+    Assign the level-ups from `current` to `target` to prep days.
+
+    `calendar` is a list of days, each a dict with a "name", the
+    "category" it scores (a key of `CATEGORIES`, or None for a day none of
+    them score) and its point "thresholds"; it defaults to
+    `DEFAULT_CALENDAR`. `objective` is a key of `OBJECTIVES`: "points"
+    maximizes the event total and then the milestones reached, "milestones"
+    reaches as many milestones as possible with the fewest points and holds
+    back the rest.
+
+    Returns a dict with one entry per day under "days" ("name",
+    "category", "points", "milestones", "reached" and its "upgrades"),
+    the "held" upgrades, and the total "points", "reached" and
+    "milestones".
+    """
+    calendar = DEFAULT_CALENDAR if calendar is None else calendar
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{objective}'")
+    days = []
+    for day in calendar:
+        category = day.get("category")
+        if category is not None and category not in CATEGORIES:
+            raise ValueError(f"Unknown category '{category}' for {day.get('name', 'a prep day')}")
+        days.append({
+            "name": day.get("name", f"Day {len(days) + 1}"),
+            "category": category,
+            "milestones": _milestones(day.get("thresholds") or []),
+            "steps": [],
+        })
+
+    version = game_tables().version
+    chain_kinds = kinds(version)
+    steps = plan_steps(current, target, version)
+    held = []
+    for category, category_steps in steps.items():
+        scoring = [day for day in days if day["category"] == category]
+        if not scoring:
+            held += category_steps
+            continue
+        prefix = [0]
+        for *_, gain in category_steps:
+            prefix.append(prefix[-1] + gain)
+        milestone_count = sum(len(day["milestones"]) for day in scoring)
+        weight = prefix[-1] + 1 if objective == "milestones" else milestone_count + 1
+        ranges = _schedule_category(prefix, [day["milestones"] for day in scoring], objective, weight)
+        for day, (start, end) in zip(scoring, ranges):
+            day["steps"] = category_steps[start:end]
+        held += category_steps[ranges[-1][1]:]
+
+    out = []
+    for day in days:
+        points = sum(gain for *_, gain in day["steps"])
+        out.append({
+            "name": day["name"],
+            "category": day["category"],
+            "points": points,
+            "milestones": day["milestones"],
+            "reached": bisect_right(day["milestones"], points),
+            "upgrades": _upgrades(day["steps"], chain_kinds),
+        })
+    return {
+        "days": out,
+        "held": _upgrades(held, chain_kinds),
+        "points": sum(day["points"] for day in out),
+        "reached": sum(day["reached"] for day in out),
+        "milestones": sum(len(day["milestones"]) for day in out),
+    }
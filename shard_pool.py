@@ -0,0 +1,99 @@
+"""Splitting a category's general shard pool across its heroes.
+
+Shards only turn into KvK prep points when a level-up consumes them, so the
+useful question is which level each hero should stop at. Every hero
+contributes one option per reachable level (pool shards it costs, shards it
+consumes, whether it meets the hero's target), and a group knapsack over the
+pool size picks one option per hero. Each DP layer is a handful of NumPy
+shifts over a pool-sized array, which keeps pools of tens of thousands of
+shards interactive.
+"""
+
+from engine import HERO_TABLE, get_level_from_total_shards
+
+OBJECTIVES = {
+    "points": "Maximize KvK points",
+    "targets": "Reach as many target levels as possible",
+}
+
+
+def _options(current, personal, target):
+    """(pool cost, shards consumed, target hit) for every level a hero can stop at."""
+    prefix = HERO_TABLE.prefix["shards"]
+    cur = HERO_TABLE.idx(current)
+    base = prefix[cur]
+    # Level reachable on personal shards alone, which costs nothing from the pool
+    own = HERO_TABLE.idx(get_level_from_total_shards(base + personal))
+    tgt = HERO_TABLE.idx(target) if target is not None else None
+
+    options = []
+    for lvl in range(own, HERO_TABLE.max_index + 1):
+        consumed = prefix[lvl] - base
+        cost = max(consumed - personal, 0)
+        hit = tgt is not None and lvl >= tgt
+        options.append((lvl, cost, consumed, hit))
+    return options
+
+
+def allocate_shared_pool(heroes, pool, objective="points"):
+    """
+    Best split of `pool` general shards across `heroes`.
+
+    `heroes` is a list of dicts with "hero", "current" (level name),
+    "personal" (shards of its own) and, for the "targets" objective,
+    "target". Returns a dict with one {"pool", "level", "consumed", "hit"}
+    entry per hero under "allocation", plus "used" pool shards and the
+    number of "targets_hit".
+    """
+    # Only needed once a pool is split; keeps NumPy off the app's startup path
+    import numpy as np
+
+    pool = max(int(pool), 0)
+    # Shards beyond what would max every hero can never be used
+    prefix = HERO_TABLE.prefix["shards"]
+    needed = sum(max(prefix[-1] - prefix[HERO_TABLE.idx(h["current"])] - int(h.get("personal", 0)), 0) for h in heroes)
+    pool = min(pool, needed)
+    size = pool + 1
+    # Reaching a target must outweigh any number of extra shards consumed
+    hit_weight = HERO_TABLE.prefix["shards"][-1] * max(len(heroes), 1) + 1 if objective == "targets" else 0
+
+    per_hero = []
+    # best[s] = best value using at most s pool shards
+    best = np.zeros(size, dtype=np.int64)
+    choices = []
+    for hero in heroes:
+        options = [
+            opt for opt in _options(hero["current"], int(hero.get("personal", 0)), hero.get("target"))
+            if opt[1] <= pool
+        ]
+        per_hero.append(options)
+        new = np.full(size, -1, dtype=np.int64)
+        choice = np.zeros(size, dtype=np.int16)
+        for k, (_, cost, consumed, hit) in enumerate(options):
+            value = consumed + (hit_weight if hit else 0)
+            candidate = best[:size - cost] + value
+            better = candidate > new[cost:]
+            new[cost:][better] = candidate[better]
+            choice[cost:][better] = k
+        best = new
+        choices.append(choice)
+
+    allocation = {}
+    s = pool
+    used = 0
+    hits = 0
+    for hero, options, choice in zip(reversed(heroes), reversed(per_hero), reversed(choices)):
+        lvl, cost, consumed, hit = options[int(choice[s])]
+        allocation[hero["hero"]] = {
+            "pool": cost,
+            "level": HERO_TABLE.levels[lvl],
+            "consumed": consumed,
+            "hit": hit,
+        }
+        s -= cost
+        used += cost
+        hits += hit
+
+    # Report heroes in the order they were given
+    allocation = {hero["hero"]: allocation[hero["hero"]] for hero in heroes}
+    return {"allocation": allocation, "used": used, "targets_hit": hits}
@@ -0,0 +1,126 @@
+"""Next-best single-step upgrades across heroes, charms and gov gear.
+
+Every step of every chain (hero shards from `step_costs`, charm levels from
+`level_requirements`, gov gear from `gov_gear_requirements`) is compiled
+once per game version into its points yield and resource vector. An
+`UpgradeIndex` then keeps one heap entry per item for its next step,
+ordered by points per weighted resource, so the best next upgrade is at the
+top of the heap and moving one item to a new level is a single O(log n)
+push. Superseded entries are left in the heap and skipped when they
+surface.
+"""
+
+import heapq
+
+from engine import per_version
+from planner import kinds, weights_key
+
+
+@per_version
+def step_table(tables):
+    """step_table()[kind][level] = (points, {resource: amount}) of the step level→level+1."""
+    steps = []
+    for _, table, resources, points, _ in kinds(tables.version):
+        steps.append([
+            (points[lvl + 1] - points[lvl], {res: prefix[lvl + 1] - prefix[lvl] for res, prefix in resources.items()})
+            for lvl in range(table.max_index)
+        ])
+    return steps
+
+
+# Item name -> index into `kinds()`; the names are the same in every version
+ITEMS = {name: k for k, (_, _, _, _, names) in enumerate(kinds()) for name in names}
+
+
+class UpgradeIndex:
+    """
+    Heap of every item's next step, best points per weighted cost first,
+    on the tables of the game version active when it was built.
+    """
+
+    def __init__(self, current, weights=None):
+        self.kinds = kinds()
+        self.steps = step_table()
+        self.weights = dict(weights_key(weights))
+        self.levels = {}
+        self.version = {}
+        self.heap = []
+        for name, k in ITEMS.items():
+            table = self.kinds[k][1]
+            self.levels[name] = table.idx(current.get(name, table.levels[0]))
+            self.version[name] = 0
+            entry = self._entry(name, self.levels[name], 0)
+            if entry is not None:
+                self.heap.append(entry)
+        heapq.heapify(self.heap)
+
+    def _entry(self, name, level, version):
+        k = ITEMS[name]
+        if level >= self.kinds[k][1].max_index:
+            return None
+        points, cost = self.steps[k][level]
+        weighted = sum(self.weights[res] * amount for res, amount in cost.items())
+        ratio = points / weighted if weighted else float("inf")
+        return (-ratio, name, level, version)
+
+    def _live(self, entry):
+        return entry[3] == self.version[entry[1]]
+
+    def set_level(self, name, level):
+        """Move one item to `level` (name or index); returns True if it changed."""
+        table = self.kinds[ITEMS[name]][1]
+        level = table.idx(level)
+        if level == self.levels[name]:
+            return False
+        self.levels[name] = level
+        self.version[name] += 1
+        entry = self._entry(name, level, self.version[name])
+        if entry is not None:
+            heapq.heappush(self.heap, entry)
+        # Rebuild once stale entries outnumber live ones
+        if len(self.heap) > 2 * len(ITEMS):
+            self.heap = [e for e in self.heap if self._live(e)]
+            heapq.heapify(self.heap)
+        return True
+
+    def sync(self, current):
+        """Apply every level in `current` that differs; returns how many changed."""
+        return sum(self.set_level(name, level) for name, level in current.items() if name in ITEMS)
+
+    def best(self):
+        """The best next upgrade, or None once everything is maxed."""
+        while self.heap and not self._live(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self._describe(self.heap[0]) if self.heap else None
+
+    def ranked(self, count):
+        """
+        The next `count` upgrades, best first, as if each were made before
+        picking the next, leaving the index itself unchanged.
+        """
+        heap = [e for e in self.heap if self._live(e)]
+        heapq.heapify(heap)
+        out = []
+        while heap and len(out) < count:
+            entry = heapq.heappop(heap)
+            out.append(self._describe(entry))
+            following = self._entry(entry[1], entry[2] + 1, entry[3])
+            if following is not None:
+                heapq.heappush(heap, following)
+        return out
+
+    def _describe(self, entry):
+        neg_ratio, name, level, _ = entry
+        k = ITEMS[name]
+        kind, table = self.kinds[k][0], self.kinds[k][1]
+        points, cost = self.steps[k][level]
+        upgrade = {
+            "name": name,
+            "kind": kind,
+            "from": table.levels[level],
+            "to": table.levels[level + 1],
+            "points": points,
+            "points_per_cost": -neg_ratio,
+        }
+        upgrade.update(cost)
+        return upgrade
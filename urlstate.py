@@ -0,0 +1,208 @@
+"""Compact, shareable encoding of the whole calculator state.
+
+Every input the app keeps in session state is written to a bit stream in a
+fixed order: levels take just enough bits for their table (5 for the 32
+hero levels, 4 for the 12 charm levels, 5 for the 19 rarities), toggles take
+one bit, and budgets use a variable-width code that spends one bit on a zero
+and about `2 * log2(n)` bits otherwise. The stream is then base64url
+encoded, so a whole plan fits in a `?s=` query parameter of one to two
+hundred characters and a session can be rebuilt from the link alone.
+
+The stream starts with the encoding version and the game data version the
+link was made under; levels are indexes into that version's tables, so a
+link is only decoded under the same game data version.
+"""
+
+import base64
+
+import engine
+from engine import (
+    CHARM_TABLE, GEAR_TABLE, HERO_TABLE,
+    categories, charm_names, gov_gear_items, hero_names,
+)
+from planner import DEFAULT_WEIGHTS, RESOURCES
+from shard_pool import OBJECTIVES as POOL_OBJECTIVES
+
+VERSION = 2
+VERSION_BITS = 4
+# Budgets are whole numbers; weights are stored in hundredths
+WEIGHT_SCALE = 100
+
+
+def _fields():
+    """(key, kind, table or choices) for every encoded input, in stream order."""
+    fields = []
+    for category in categories:
+        fields += [
+            (f"{category}_mode", "bool", None),
+            (f"{category}_shared", "uint", None),
+            (f"{category}_pool_objective", "choice", list(POOL_OBJECTIVES)),
+        ]
+    for hero in hero_names():
+        fields += [
+            (f"{hero}_current", "level", HERO_TABLE),
+            (f"{hero}_target", "level", HERO_TABLE),
+            (f"{hero}_use_shared", "bool", None),
+            (f"{hero}_personal_shards", "uint", None),
+            (f"{hero}_pool_target", "level", HERO_TABLE),
+        ]
+    for names, table in ((charm_names(), CHARM_TABLE), (gov_gear_items, GEAR_TABLE)):
+        for name in names:
+            fields += [(f"{name}_current", "level", table), (f"{name}_target", "level", table)]
+    fields += [
+        ("charms_resource_mode", "bool", None),
+        ("charms_total_designs", "uint", None),
+        ("charms_total_guides", "uint", None),
+        ("charms_show_frontier", "bool", None),
+        ("gear_resource_mode", "bool", None),
+        ("gear_total_threads", "uint", None),
+        ("gear_total_satins", "uint", None),
+        ("gear_total_papers", "uint", None),
+        ("planner_goal", "uint", None),
+    ]
+    fields += [(f"planner_weight_{res}", "weight", None) for res in RESOURCES]
+    return fields
+
+
+FIELDS = _fields()
+_TABLES = {key: spec for key, kind, spec in FIELDS if kind == "level" and key.endswith("_current")}
+
+
+def _width(options):
+    return max(len(options) - 1, 1).bit_length()
+
+
+# --------------------------
+# Bit stream
+# --------------------------
+class _Writer:
+    def __init__(self):
+        self.value = 0
+        self.bits = 0
+
+    def write(self, value, width):
+        self.value |= value << self.bits
+        self.bits += width
+
+    def write_uint(self, value):
+        # Zero flag, then the bit length in 6 bits and the bits below the leading one
+        if value == 0:
+            self.write(0, 1)
+            return
+        length = value.bit_length()
+        self.write(1, 1)
+        self.write(length - 1, 6)
+        self.write(value & ((1 << (length - 1)) - 1), length - 1)
+
+    def write_text(self, text):
+        data = text.encode("utf-8")
+        self.write_uint(len(data))
+        for byte in data:
+            self.write(byte, 8)
+
+    def to_bytes(self):
+        return self.value.to_bytes((self.bits + 7) // 8, "little")
+
+
+class _Reader:
+    def __init__(self, data):
+        self.value = int.from_bytes(data, "little")
+        self.bits = len(data) * 8
+        self.pos = 0
+
+    def read(self, width):
+        if self.pos + width > self.bits:
+            raise ValueError("State token is truncated")
+        out = (self.value >> self.pos) & ((1 << width) - 1)
+        self.pos += width
+        return out
+
+    def read_uint(self):
+        if not self.read(1):
+            return 0
+        length = self.read(6) + 1
+        return (1 << (length - 1)) | self.read(length - 1)
+
+    def read_text(self):
+        data = bytes(self.read(8) for _ in range(self.read_uint()))
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError as exc:
+            raise ValueError("State token has an invalid game version") from exc
+
+
+# --------------------------
+# Encoding
+# --------------------------
+def encode_state(state):
+    """Token for every encoded input in `state` (e.g. `st.session_state`)."""
+    writer = _Writer()
+    writer.write(VERSION, VERSION_BITS)
+    writer.write_text(engine.active_version())
+    for key, kind, spec in FIELDS:
+        value = state.get(key)
+        if kind == "bool":
+            writer.write(1 if value else 0, 1)
+        elif kind == "uint":
+            writer.write_uint(max(int(value or 0), 0))
+        elif kind == "weight":
+            weight = DEFAULT_WEIGHTS[key[len("planner_weight_"):]] if value is None else value
+            writer.write_uint(max(round(float(weight) * WEIGHT_SCALE), 0))
+        elif kind == "choice":
+            writer.write(spec.index(value) if value in spec else 0, _width(spec))
+        else:
+            if value is None and key.endswith("_target"):
+                # An unset target means "stay at the current level"
+                value = state.get(key[:-len("_target")] + "_current")
+            writer.write(spec.index.get(str(value), 0) if value is not None else 0, _width(spec.levels))
+    return base64.urlsafe_b64encode(writer.to_bytes()).decode("ascii").rstrip("=")
+
+
+def decode_state(token):
+    """
+    Session-state values encoded in `token`.
+
+    Raises ValueError for tokens that are malformed, were written by
+    another version of the encoding or under another game data version.
+    """
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("State token is not valid base64") from exc
+    reader = _Reader(data)
+    if reader.read(VERSION_BITS) != VERSION:
+        raise ValueError("State token is from an unsupported version")
+    game_version = reader.read_text()
+    if game_version != engine.active_version():
+        raise ValueError(
+            f"State token was made for game data version '{game_version}', not '{engine.active_version()}'"
+        )
+
+    state = {}
+    for key, kind, spec in FIELDS:
+        if kind == "bool":
+            state[key] = bool(reader.read(1))
+        elif kind == "uint":
+            state[key] = reader.read_uint()
+        elif kind == "weight":
+            state[key] = reader.read_uint() / WEIGHT_SCALE
+        elif kind == "choice":
+            index = reader.read(_width(spec))
+            if index >= len(spec):
+                raise ValueError(f"State token has an invalid value for '{key}'")
+            state[key] = spec[index]
+        else:
+            index = reader.read(_width(spec.levels))
+            if index > spec.max_index:
+                raise ValueError(f"State token has an invalid level for '{key}'")
+            state[key] = spec.levels[index]
+
+    # Target sliders only offer levels from the current one up
+    for key in list(state):
+        for suffix in ("_target", "_pool_target"):
+            if key.endswith(suffix):
+                current = key[:-len(suffix)] + "_current"
+                table = _TABLES.get(current)
+                if table is not None and table.index[state[key]] < table.index[state[current]]:
+                    state[key] = state[current]
+    return state